@@ -1,7 +1,17 @@
 from django.contrib import admin
 from django.contrib.admin import AdminSite
 from django.contrib.auth.models import User, Group
-from .models import PDFDocument, PDFSummary, ConversationThread, Question, Answer, PDFChunk
+from django.core.paginator import Paginator
+from django.db import connection
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+from .archive import restore_thread
+from .jobs import enqueue, start_worker
+from .search import search_chunks
+from .models import PDFDocument, PDFSummary, ConversationThread, Question, Answer, PDFChunk, RequestProfile, ArchivedThread, MaintenanceJob
 
 # Custom admin site with restricted access
 class EasyLearningAdminSite(AdminSite):
@@ -18,13 +28,134 @@ class EasyLearningAdminSite(AdminSite):
 # Create custom admin site instance
 admin_site = EasyLearningAdminSite(name='easylearning_admin')
 
+
+def estimate_row_count(model):
+    """Cheap upper-bound estimate of a table's row count, or None if unavailable"""
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            # Uses the rowid b-tree; only overestimates after deletes
+            cursor.execute(f'SELECT MAX(rowid) FROM {table}')
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+        else:
+            return None
+        row = cursor.fetchone()
+    return max(row[0] or 0, 0) if row else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for very large changelists.
+    
+    Unfiltered lists use a table size estimate instead of COUNT(*), and
+    filtered lists are only counted up to ``count_limit`` rows.
+    """
+    count_limit = 10000
+    
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_row_count(queryset.model)
+            if estimate is not None and estimate > self.count_limit:
+                return estimate
+        return queryset.order_by()[:self.count_limit].count()
+
+
+class InputFilter(admin.SimpleListFilter):
+    """List filter rendered as a text box instead of a link for every value"""
+    template = 'admin/easylearning/input_filter.html'
+    
+    def lookups(self, request, model_admin):
+        return ()
+    
+    def has_output(self):
+        return True
+    
+    def choices(self, changelist):
+        yield {
+            'value': self.value() or '',
+            'reset_url': changelist.get_query_string(remove=[self.parameter_name]),
+            # Keep the other active filters and the search when the box is submitted
+            'hidden_params': [(k, v) for k, v in changelist.params.items() if k != self.parameter_name],
+        }
+
+
+class DocumentTitleFilter(InputFilter):
+    title = 'document title'
+    parameter_name = 'document'
+    document_lookup = 'pdf_document'
+    
+    def queryset(self, request, queryset):
+        if self.value():
+            documents = PDFDocument.objects.filter(title__icontains=self.value()).values('pk')
+            return queryset.filter(**{f'{self.document_lookup}__in': documents})
+
+
+class ThreadDocumentTitleFilter(DocumentTitleFilter):
+    document_lookup = 'thread__pdf_document'
+
+
+class AskedByFilter(InputFilter):
+    title = 'asked by (username)'
+    parameter_name = 'asked_by'
+    
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(asked_by__in=User.objects.filter(username__iexact=self.value()).values('pk'))
+
 # Register models with custom admin site
 @admin.register(PDFDocument)
 class PDFDocumentAdmin(admin.ModelAdmin):
-    list_display = ('title', 'uploaded_by', 'uploaded_at', 'file')
+    list_display = ('title', 'uploaded_by', 'uploaded_at', 'page_count', 'chunk_count', 'thread_count', 'file')
     list_filter = ('uploaded_at', 'uploaded_by')
     search_fields = ('title', 'uploaded_by__username')
-    readonly_fields = ('uploaded_at',)
+    readonly_fields = ('uploaded_at', 'chunk_version', 'thread_count', 'chunk_count', 'page_count', 'text_chars',
+                       'extraction')
+    exclude = ('extraction_report',)
+    actions = ['reextract', 'rechunk', 'resummarise', 'reindex', 'warm_caches']
+    
+    def extraction(self, obj):
+        report = obj.extraction_report
+        if not report:
+            return '-'
+        lines = [f"{report.get('pages_extracted', 0)} of {report.get('page_total', 0)} pages extracted "
+                 f"in {report.get('elapsed_seconds', 0)}s"]
+        if report.get('error'):
+            lines.append(f"Error: {report['error']}")
+        lines.extend(f"Page {skip['page']} skipped: {skip['reason']}" for skip in report.get('skipped', []))
+        return format_html('<pre style="white-space: pre-wrap;">{}</pre>', '\n'.join(lines))
+    extraction.short_description = 'Last extraction'
+    
+    def queue_jobs(self, request, queryset, kind):
+        jobs = enqueue(list(queryset), kind, user=request.user)
+        skipped = queryset.count() - len(jobs)
+        url = reverse(f'{self.admin_site.name}:easylearning_maintenancejob_changelist')
+        self.message_user(request, format_html(
+            'Queued {} job(s){}. <a href="{}">Follow their progress</a>.',
+            len(jobs), f', {skipped} already pending' if skipped else '', url,
+        ))
+    
+    @admin.action(description='Re-extract text (summary and chunks) in the background')
+    def reextract(self, request, queryset):
+        self.queue_jobs(request, queryset, 'extract')
+    
+    @admin.action(description='Re-chunk in the background')
+    def rechunk(self, request, queryset):
+        self.queue_jobs(request, queryset, 'rechunk')
+    
+    @admin.action(description='Re-summarise in the background')
+    def resummarise(self, request, queryset):
+        self.queue_jobs(request, queryset, 'resummarise')
+    
+    @admin.action(description='Rebuild search index in the background')
+    def reindex(self, request, queryset):
+        self.queue_jobs(request, queryset, 'reindex')
+    
+    @admin.action(description='Pre-warm caches in the background')
+    def warm_caches(self, request, queryset):
+        self.queue_jobs(request, queryset, 'warm')
     
     def has_add_permission(self, request):
         return request.user.is_superuser
@@ -38,6 +169,7 @@ class PDFDocumentAdmin(admin.ModelAdmin):
 @admin.register(PDFSummary)
 class PDFSummaryAdmin(admin.ModelAdmin):
     list_display = ('pdf_document', 'generated_at')
+    list_select_related = ('pdf_document',)
     list_filter = ('generated_at',)
     search_fields = ('pdf_document__title',)
     readonly_fields = ('generated_at',)
@@ -53,10 +185,11 @@ class PDFSummaryAdmin(admin.ModelAdmin):
 
 @admin.register(ConversationThread)
 class ConversationThreadAdmin(admin.ModelAdmin):
-    list_display = ('title', 'pdf_document', 'created_at', 'updated_at')
+    list_display = ('title', 'pdf_document', 'question_count', 'answered_count', 'last_question_at', 'created_at', 'updated_at')
+    list_select_related = ('pdf_document',)
     list_filter = ('created_at', 'updated_at')
     search_fields = ('title', 'pdf_document__title')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('created_at', 'updated_at', 'question_count', 'answered_count', 'last_question_at')
     
     def has_add_permission(self, request):
         return request.user.is_superuser
@@ -70,9 +203,14 @@ class ConversationThreadAdmin(admin.ModelAdmin):
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
     list_display = ('question_text', 'language', 'thread', 'asked_by', 'asked_at')
-    list_filter = ('language', 'asked_at', 'asked_by')
+    list_select_related = ('thread__pdf_document', 'asked_by')
+    list_filter = ('language', 'asked_at', AskedByFilter, ThreadDocumentTitleFilter)
     search_fields = ('question_text', 'thread__title', 'asked_by__username')
     readonly_fields = ('asked_at',)
+    autocomplete_fields = ('thread',)
+    raw_id_fields = ('asked_by',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     def has_add_permission(self, request):
         return request.user.is_superuser
@@ -86,9 +224,13 @@ class QuestionAdmin(admin.ModelAdmin):
 @admin.register(Answer)
 class AnswerAdmin(admin.ModelAdmin):
     list_display = ('question', 'language', 'is_from_pdf', 'confidence_score', 'generated_at')
+    list_select_related = ('question',)
     list_filter = ('language', 'is_from_pdf', 'confidence_score', 'generated_at')
     search_fields = ('answer_text', 'question__question_text')
     readonly_fields = ('generated_at',)
+    raw_id_fields = ('question',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     def has_add_permission(self, request):
         return request.user.is_superuser
@@ -102,8 +244,16 @@ class AnswerAdmin(admin.ModelAdmin):
 @admin.register(PDFChunk)
 class PDFChunkAdmin(admin.ModelAdmin):
     list_display = ('pdf_document', 'chunk_index', 'text_preview')
-    list_filter = ('pdf_document', 'chunk_index')
-    search_fields = ('chunk_text', 'pdf_document__title')
+    list_select_related = ('pdf_document',)
+    list_filter = (DocumentTitleFilter,)
+    search_fields = ('chunk_text',)
+    search_help_text = 'Matches chunks containing every word (full-text index)'
+    autocomplete_fields = ('pdf_document',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    def get_search_results(self, request, queryset, search_term):
+        return search_chunks(queryset, search_term), False
     
     def text_preview(self, obj):
         return obj.chunk_text[:100] + '...' if len(obj.chunk_text) > 100 else obj.chunk_text
@@ -118,6 +268,101 @@ class PDFChunkAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         return request.user.is_superuser
 
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('method', 'path', 'status_code', 'duration_ms', 'sql_query_count', 'sql_time_ms', 'user', 'created_at')
+    list_filter = ('method', 'status_code', 'created_at')
+    search_fields = ('path', 'user__username')
+    readonly_fields = ('path', 'method', 'status_code', 'user', 'duration_ms', 'sql_query_count',
+                       'sql_time_ms', 'download_link', 'summary', 'created_at')
+    exclude = ('profile_file', 'summary_text')
+    
+    def get_urls(self):
+        urls = [
+            path('<uuid:profile_id>/download/', self.admin_site.admin_view(self.download_view),
+                 name='easylearning_requestprofile_download'),
+        ]
+        return urls + super().get_urls()
+    
+    def download_view(self, request, profile_id):
+        profile = get_object_or_404(RequestProfile, id=profile_id)
+        if not self.has_view_permission(request, profile) or not profile.profile_file:
+            raise Http404
+        return FileResponse(profile.profile_file.open('rb'), as_attachment=True,
+                            filename=f'{profile.id}.prof')
+    
+    def download_link(self, obj):
+        if not obj.profile_file:
+            return '-'
+        url = reverse(f'{self.admin_site.name}:easylearning_requestprofile_download', args=[obj.id])
+        return format_html('<a href="{}">Download {}.prof</a>', url, obj.id)
+    download_link.short_description = 'Profile (.prof)'
+    
+    def summary(self, obj):
+        return format_html('<pre style="white-space: pre; overflow-x: auto;">{}</pre>', obj.summary_text)
+    summary.short_description = 'Ranked summary'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+@admin.register(ArchivedThread)
+class ArchivedThreadAdmin(admin.ModelAdmin):
+    list_display = ('thread', 'question_count', 'archived_at')
+    list_filter = ('archived_at',)
+    search_fields = ('thread__title',)
+    exclude = ('payload',)
+    readonly_fields = ('thread', 'question_count', 'archived_at')
+    actions = ['restore_threads']
+    
+    @admin.action(description='Restore selected threads')
+    def restore_threads(self, request, queryset):
+        restored = sum(restore_thread(archive.thread) for archive in queryset.select_related('thread'))
+        self.message_user(request, f"Restored {restored} questions.")
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+@admin.register(MaintenanceJob)
+class MaintenanceJobAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'pdf_document', 'status', 'progress_bar', 'message', 'created_by', 'created_at', 'finished_at')
+    list_select_related = ('pdf_document', 'created_by')
+    list_filter = ('status', 'kind', 'created_at')
+    search_fields = ('pdf_document__title', 'message')
+    readonly_fields = ('pdf_document', 'kind', 'status', 'progress_bar', 'message', 'created_by',
+                       'created_at', 'started_at', 'finished_at')
+    exclude = ('progress',)
+    
+    def progress_bar(self, obj):
+        return format_html('<progress value="{}" max="100" title="{}%"></progress>', obj.progress, obj.progress)
+    progress_bar.short_description = 'Progress'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return request.user.is_superuser
+    
+    def changelist_view(self, request, extra_context=None):
+        # Jobs queued before a restart would otherwise wait for the next enqueue
+        if MaintenanceJob.objects.filter(status='queued').exists():
+            start_worker()
+        return super().changelist_view(request, extra_context)
+
 # Register with custom admin site
 admin_site.register(PDFDocument, PDFDocumentAdmin)
 admin_site.register(PDFSummary, PDFSummaryAdmin)
@@ -125,6 +370,9 @@ admin_site.register(ConversationThread, ConversationThreadAdmin)
 admin_site.register(Question, QuestionAdmin)
 admin_site.register(Answer, AnswerAdmin)
 admin_site.register(PDFChunk, PDFChunkAdmin)
+admin_site.register(RequestProfile, RequestProfileAdmin)
+admin_site.register(ArchivedThread, ArchivedThreadAdmin)
+admin_site.register(MaintenanceJob, MaintenanceJobAdmin)
 
 # Register User and Group models for superuser management
 admin_site.register(User)
@@ -0,0 +1,246 @@
+"""
+Admission control for answer generation.
+
+Every question passes through two gates:
+
+* ``check_rate()``: a token bucket per user (or client address, for
+  anonymous callers) and a global bucket cap the request rate, rejecting
+  with 429 / 503 and a Retry-After header when empty;
+* ``answer_slot()``: at most QA_MAX_CONCURRENT answers are computed at once.
+  Further computations wait, up to QA_QUEUE_TIMEOUT seconds, in a queue of
+  at most QA_MAX_WAITING entries, and are rejected with 503 once the queue
+  is full or the wait times out. Requests that share an in-flight answer
+  (see ``coalescing``) do not take a slot.
+
+Buckets, slots and queue places live in the shared cache so the limits hold
+across worker processes. Slots and queue places are cache keys claimed with
+``cache.add()`` and expire on their own if a worker dies holding one. If the
+cache is unavailable requests are let through rather than rejected; a bucket
+too contended to lock in time rejects with 503, reason ``lock_timeout`` and a
+short Retry-After instead, since contention is when the limits matter most.
+A caller turned away by the global bucket gets its own token back.
+"""
+import logging
+import math
+import random
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+
+from . import instrumentation
+
+logger = logging.getLogger(__name__)
+
+BUCKET_PREFIX = 'easylearning:qa:bucket'
+SLOT_PREFIX = 'easylearning:qa:slot'
+WAITER_PREFIX = 'easylearning:qa:waiter'
+
+# How long to wait for a bucket's lock, unless QA_ADMISSION_LOCK_WAIT is set:
+# a database round trip per attempt needs longer than an in-memory or Redis
+# cache. LOCK_RETRY_AFTER is the Retry-After (seconds) sent when it cannot be
+# taken in time.
+LOCK_WAIT = 0.05
+DATABASE_LOCK_WAIT = 0.5
+LOCK_RETRY_AFTER = 1.0
+
+
+class Contended(Exception):
+    """A bucket's lock could not be taken in time"""
+
+
+class Rejected(Exception):
+    """The request was not admitted; carries the HTTP status and Retry-After seconds"""
+
+    def __init__(self, status, retry_after, reason):
+        self.status = status
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+        super().__init__(reason)
+
+    @property
+    def message(self):
+        if self.status == 429:
+            return f"You are asking questions too quickly. Please try again in {self.retry_after} seconds."
+        return f"The server is busy answering other questions. Please try again in {self.retry_after} seconds."
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _cache():
+    return caches[_setting('QA_ADMISSION_CACHE', 'shared')]
+
+
+def client_identity(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    return f"addr:{request.META.get('REMOTE_ADDR', 'unknown')}"
+
+
+def _lock_wait(cache):
+    wait = _setting('QA_ADMISSION_LOCK_WAIT', None)
+    if wait is not None:
+        return wait
+    return DATABASE_LOCK_WAIT if isinstance(cache, DatabaseCache) else LOCK_WAIT
+
+
+@contextmanager
+def _bucket_lock(cache, key):
+    """Hold the bucket's lock for the body of the block, or raise Contended"""
+    lock = f'{key}:lock'
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + _lock_wait(cache)
+    while not cache.add(lock, token, timeout=2):
+        if time.monotonic() >= deadline:
+            logger.debug("Bucket %s is contended", key)
+            raise Contended(key)
+        time.sleep(0.002)
+    try:
+        yield
+    finally:
+        # Leave the lock alone if it expired and another worker holds it now
+        _release(cache, lock, token)
+
+
+def _bucket_timeout(rate, burst):
+    # A full bucket is the same as no bucket, so let the key expire then
+    return math.ceil(burst / rate) + 1
+
+
+def take_token(cache, key, rate, burst):
+    """
+    Take one token from a bucket; returns 0 on success, else seconds until one is available.
+    
+    Raises Contended when the bucket's lock cannot be taken in time.
+    """
+    with _bucket_lock(cache, key):
+        now = time.time()
+        tokens, stamp = cache.get(key) or (burst, now)
+        tokens = min(burst, tokens + (now - stamp) * rate)
+        if tokens < 1:
+            cache.set(key, (tokens, now), timeout=_bucket_timeout(rate, burst))
+            return (1 - tokens) / rate
+        cache.set(key, (tokens - 1, now), timeout=_bucket_timeout(rate, burst))
+        return 0
+
+
+def give_back_token(cache, key, rate, burst):
+    """Return a token taken by ``take_token`` for a request that was not admitted after all"""
+    try:
+        with _bucket_lock(cache, key):
+            now = time.time()
+            tokens, stamp = cache.get(key) or (burst, now)
+            tokens = min(burst, tokens + (now - stamp) * rate + 1)
+            cache.set(key, (tokens, now), timeout=_bucket_timeout(rate, burst))
+    except Contended:
+        # The token refills at the bucket's rate instead
+        pass
+
+
+def _claim(cache, prefix, count, token, timeout):
+    """Claim one of ``count`` keys under ``prefix``; returns the key or None"""
+    start = random.randrange(count) if count else 0
+    for i in range(count):
+        key = f'{prefix}:{(start + i) % count}'
+        if cache.add(key, token, timeout=timeout):
+            return key
+    return None
+
+
+def _release(cache, key, token):
+    if key is not None and cache.get(key) == token:
+        cache.delete(key)
+
+
+def _reject(status, retry_after, reason):
+    instrumentation.increment('easylearning_admission_rejections_total', reason=reason)
+    raise Rejected(status, retry_after, reason)
+
+
+def check_rate(request):
+    """Take a token from the caller's bucket and the global bucket, or raise Rejected"""
+    if not _setting('QA_ADMISSION_ENABLED', True):
+        return
+    user_bucket = (f'{BUCKET_PREFIX}:{client_identity(request)}',
+                   _setting('QA_USER_RATE', 0.5), _setting('QA_USER_BURST', 5))
+    global_bucket = (f'{BUCKET_PREFIX}:global', _setting('QA_GLOBAL_RATE', 10.0), _setting('QA_GLOBAL_BURST', 20))
+    try:
+        cache = _cache()
+        user_retry = take_token(cache, *user_bucket)
+        global_retry = 0
+        if not user_retry:
+            try:
+                global_retry = take_token(cache, *global_bucket)
+            except Contended:
+                give_back_token(cache, *user_bucket)
+                raise
+            if global_retry:
+                # Not admitted, so the caller keeps its token
+                give_back_token(cache, *user_bucket)
+    except Contended:
+        _reject(503, LOCK_RETRY_AFTER, 'lock_timeout')
+    except Exception:
+        logger.warning("Admission control unavailable; admitting request", exc_info=True)
+        return
+    if user_retry:
+        _reject(429, user_retry, 'user_rate')
+    if global_retry:
+        _reject(503, global_retry, 'global_rate')
+
+
+def _acquire_slot(cache, token):
+    max_concurrent = _setting('QA_MAX_CONCURRENT', 4)
+    slot_timeout = _setting('QA_SLOT_TIMEOUT', 120)
+    slot = _claim(cache, SLOT_PREFIX, max_concurrent, token, slot_timeout)
+    if slot is not None:
+        return slot
+
+    queue_timeout = _setting('QA_QUEUE_TIMEOUT', 5.0)
+    waiter = _claim(cache, WAITER_PREFIX, _setting('QA_MAX_WAITING', 16), token, math.ceil(queue_timeout) + 1)
+    if waiter is None:
+        _reject(503, queue_timeout, 'queue_full')
+    try:
+        start = time.monotonic()
+        delay = 0.01
+        while slot is None:
+            if time.monotonic() - start >= queue_timeout:
+                _reject(503, queue_timeout, 'queue_timeout')
+            time.sleep(delay)
+            delay = min(delay * 2, 0.2)
+            slot = _claim(cache, SLOT_PREFIX, max_concurrent, token, slot_timeout)
+        instrumentation.observe(instrumentation.STAGE_METRIC, time.monotonic() - start, stage='admission_wait')
+        return slot
+    finally:
+        _release(cache, waiter, token)
+
+
+@contextmanager
+def answer_slot():
+    """Hold one of the answer-generation slots for the body of the block, or raise Rejected"""
+    if not _setting('QA_ADMISSION_ENABLED', True):
+        yield
+        return
+
+    cache = _cache()
+    token = uuid.uuid4().hex
+    try:
+        slot = _acquire_slot(cache, token)
+    except Rejected:
+        raise
+    except Exception:
+        logger.warning("Admission control unavailable; admitting request", exc_info=True)
+        slot = None
+
+    try:
+        yield
+    finally:
+        try:
+            _release(cache, slot, token)
+        except Exception:
+            logger.warning("Could not release answer slot %s", slot, exc_info=True)
@@ -0,0 +1,508 @@
+"""
+Question answering over a document's chunks.
+
+Questions are analysed into a type, entities and keywords, chunks are scored
+against the analysis, the best are stitched into an answer, and the answer is
+translated into the requested language (see ``translation``, loaded on first
+use).
+
+The most common questions (an overview, the main characters, a chapter, the
+setting) are answered once per chunk version at ingestion, in every language
+(``canonical_answers``); questions that map to one of them are answered from
+the stored row.
+"""
+import logging
+import re
+
+from django.conf import settings
+
+from . import instrumentation
+from .chunkstore import get_chunk_store
+from .models import CanonicalAnswer, SectionSummary
+
+logger = logging.getLogger(__name__)
+
+
+def analyze_question(question):
+    """Analyze the question to understand its type and extract key information"""
+    question_lower = question.lower().strip()
+    
+    # Question type classification
+    question_types = {
+        'summary': ['summary', 'brief', 'overview', 'general', 'about', 'what is this'],
+        'chapter_specific': ['chapter', 'section', 'part'],
+        'character': ['character', 'who', 'person', 'name', 'protagonist', 'hero', 'villain'],
+        'plot': ['plot', 'story', 'narrative', 'what happens', 'events', 'action'],
+        'setting': ['where', 'place', 'location', 'world', 'realm', 'setting'],
+        'time': ['when', 'time', 'period', 'era', 'century', 'year'],
+        'comparison': ['compare', 'difference', 'similar', 'versus', 'vs', 'better', 'worse'],
+        'definition': ['what is', 'define', 'meaning', 'explain', 'describe'],
+        'list': ['list', 'all', 'every', 'each', 'names', 'types', 'kinds'],
+        'how': ['how', 'method', 'process', 'way', 'technique'],
+        'why': ['why', 'reason', 'cause', 'because', 'purpose'],
+        'quantity': ['how many', 'count', 'number', 'amount', 'size', 'length', 'longest', 'shortest']
+    }
+    
+    # Determine question type
+    detected_types = []
+    for qtype, keywords in question_types.items():
+        if any(keyword in question_lower for keyword in keywords):
+            detected_types.append(qtype)
+    
+    # Extract specific entities
+    entities = {
+        'chapter_numbers': [],
+        'character_names': [],
+        'locations': [],
+        'dates': [],
+        'numbers': []
+    }
+    
+    import re
+    
+    # Extract chapter numbers
+    chapter_matches = re.findall(r'chapter\s+(\d+)', question_lower)
+    entities['chapter_numbers'] = [int(num) for num in chapter_matches]
+    
+    # Extract numbers
+    number_matches = re.findall(r'\b(\d+)\b', question_lower)
+    entities['numbers'] = [int(num) for num in number_matches]
+    
+    # Extract potential character names (words starting with capital letters)
+    name_matches = re.findall(r'\b[A-Z][a-z]+\b', question)
+    entities['character_names'] = name_matches
+    
+    # Extract potential locations
+    location_keywords = ['in', 'at', 'from', 'to', 'near', 'around']
+    words = question_lower.split()
+    for i, word in enumerate(words):
+        if word in location_keywords and i + 1 < len(words):
+            entities['locations'].append(words[i + 1])
+    
+    # Determine primary question type
+    primary_type = 'general'
+    if detected_types:
+        # Prioritize more specific types
+        priority_order = ['chapter_specific', 'character', 'quantity', 'comparison', 'definition', 'plot', 'setting', 'time', 'how', 'why', 'summary']
+        for ptype in priority_order:
+            if ptype in detected_types:
+                primary_type = ptype
+                break
+    
+    return {
+        'original_question': question,
+        'question_lower': question_lower,
+        'detected_types': detected_types,
+        'primary_type': primary_type,
+        'entities': entities,
+        'keywords': extract_keywords(question_lower)
+    }
+
+def extract_keywords(question_lower):
+    """Extract meaningful keywords from the question"""
+    # Remove common stop words
+    stop_words = {
+        'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 
+        'is', 'are', 'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 
+        'will', 'would', 'could', 'should', 'may', 'might', 'can', 'this', 'that', 'these', 
+        'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them', 
+        'my', 'your', 'his', 'her', 'its', 'our', 'their', 'mine', 'yours', 'his', 'hers', 
+        'ours', 'theirs'
+    }
+    
+    # Extract meaningful keywords
+    keywords = [word for word in question_lower.split() if word not in stop_words and len(word) > 2]
+    
+    # If no meaningful keywords, include shorter words
+    if not keywords:
+        keywords = [word for word in question_lower.split() if len(word) > 1]
+    
+    # For general questions, add common content words
+    general_words = ['give', 'me', 'tell', 'about', 'what', 'how', 'why', 'when', 'where', 'brief', 'detail', 'summary']
+    if any(word in question_lower for word in general_words):
+        keywords.extend(['story', 'content', 'information', 'text', 'document', 'pdf'])
+    
+    return keywords
+
+def score_chunk_for_question(chunk, question_analysis):
+    """Score a chunk based on question analysis"""
+    chunk_text_lower = chunk.chunk_text.lower()
+    score = 0
+    
+    # Basic keyword matching
+    for keyword in question_analysis['keywords']:
+        if keyword in chunk_text_lower:
+            score += 1
+    
+    # For general questions, give base score to all chunks
+    if question_analysis['primary_type'] == 'summary' or question_analysis['primary_type'] == 'general':
+        score += 1  # Base score for all chunks in general questions
+    
+    # For plot questions, give base score to story-related chunks
+    if question_analysis['primary_type'] == 'plot':
+        if any(word in chunk_text_lower for word in ['story', 'plot', 'narrative', 'events', 'action', 'happens']):
+            score += 2
+        else:
+            score += 1  # Base score for all chunks in plot questions
+    
+    # Question type specific scoring
+    primary_type = question_analysis['primary_type']
+    entities = question_analysis['entities']
+    
+    if primary_type == 'chapter_specific':
+        # High score for exact chapter matches
+        for chapter_num in entities['chapter_numbers']:
+            if f'chapter {chapter_num}' in chunk_text_lower or f'chapter {chapter_num}:' in chunk_text_lower:
+                score += 50
+        # Lower score for general chapter content
+        if 'chapter' in chunk_text_lower:
+            score += 10
+    
+    elif primary_type == 'character':
+        # High score for character name mentions
+        for name in entities['character_names']:
+            if name.lower() in chunk_text_lower:
+                score += 30
+        # Score for character-related content
+        if any(word in chunk_text_lower for word in ['character', 'person', 'protagonist', 'hero', 'villain', 'main']):
+            score += 15
+        # Score for character names in the story
+        if any(word in chunk_text_lower for word in ['haruto', 'akebane', 'kurogami']):
+            score += 20
+        # Base score for character questions
+        score += 1
+    
+    elif primary_type == 'quantity':
+        # Score for content about numbers, sizes, lengths
+        if any(word in chunk_text_lower for word in ['longest', 'shortest', 'biggest', 'smallest', 'number', 'count', 'size']):
+            score += 20
+        # Score for numerical content
+        if any(word in chunk_text_lower for word in ['pages', 'length', 'size', 'amount']):
+            score += 15
+    
+    elif primary_type == 'comparison':
+        # Score for comparative content
+        if any(word in chunk_text_lower for word in ['compare', 'difference', 'similar', 'versus', 'better', 'worse']):
+            score += 20
+    
+    elif primary_type == 'plot':
+        # Score for story/plot content
+        if any(word in chunk_text_lower for word in ['story', 'plot', 'narrative', 'events', 'action', 'happens']):
+            score += 15
+    
+    elif primary_type == 'setting':
+        # Score for location/setting content
+        if any(word in chunk_text_lower for word in ['place', 'location', 'world', 'realm', 'setting', 'where']):
+            score += 15
+    
+    elif primary_type == 'summary':
+        # Score for introductory/summary content
+        if any(word in chunk_text_lower for word in ['introduction', 'beginning', 'start', 'overview', 'summary']):
+            score += 20
+        # Score for main story elements
+        if any(word in chunk_text_lower for word in ['main', 'primary', 'central', 'key']):
+            score += 10
+    
+    # Exact phrase matching (high bonus)
+    if question_analysis['question_lower'] in chunk_text_lower:
+        score += 25
+    
+    # Context-specific scoring
+    if 'about' in question_analysis['question_lower']:
+        if any(word in chunk_text_lower for word in ['about', 'concerning', 'regarding']):
+            score += 10
+    
+    if 'happens' in question_analysis['question_lower']:
+        if any(word in chunk_text_lower for word in ['happens', 'occurs', 'events', 'action']):
+            score += 10
+    
+    return score
+
+def select_best_chunks(chunk_scores, question_analysis):
+    """Select the best chunks based on question type and content diversity"""
+    best_chunks = []
+    primary_type = question_analysis['primary_type']
+    
+    if primary_type == 'chapter_specific':
+        # For chapter questions, ensure we get the specific chapter
+        seen_chapters = set()
+        for chunk, score in chunk_scores:
+            chunk_text_lower = chunk.chunk_text.lower()
+            import re
+            chapter_match = re.search(r'chapter\s+(\d+)', chunk_text_lower)
+            if chapter_match:
+                chapter_num = chapter_match.group(1)
+                if chapter_num not in seen_chapters:
+                    best_chunks.append((chunk, score))
+                    seen_chapters.add(chapter_num)
+                if len(best_chunks) >= 2:
+                    break
+            elif len(best_chunks) < 2:
+                best_chunks.append((chunk, score))
+    
+    elif primary_type == 'summary':
+        # For summary questions, get more comprehensive content
+        for chunk, score in chunk_scores[:3]:  # Take top 3 for summaries
+            best_chunks.append((chunk, score))
+    
+    elif primary_type == 'character':
+        # For character questions, focus on character-specific content
+        for chunk, score in chunk_scores[:2]:
+            best_chunks.append((chunk, score))
+    
+    else:
+        # For other question types, take top 2 chunks
+        for chunk, score in chunk_scores[:2]:
+            best_chunks.append((chunk, score))
+    
+    return best_chunks
+
+def generate_answer_from_chunks(best_chunks, question_analysis):
+    """Generate a coherent answer from selected chunks"""
+    # Combine chunk content
+    answer_parts = []
+    for chunk, score in best_chunks:
+        clean_text = chunk.chunk_text.strip()
+        clean_text = ' '.join(clean_text.split())
+        answer_parts.append(clean_text)
+    
+    answer_text = ' '.join(answer_parts)
+    
+    # Limit answer length based on question type
+    max_length = 1000 if question_analysis['primary_type'] == 'summary' else 600
+    
+    if len(answer_text) > max_length:
+        # Try to find a good breaking point
+        sentences = answer_text.split('. ')
+        truncated_answer = ''
+        for sentence in sentences:
+            if len(truncated_answer + sentence) < max_length:
+                truncated_answer += sentence + '. '
+            else:
+                break
+        answer_text = truncated_answer.strip()
+        if not answer_text.endswith('.'):
+            answer_text += '...'
+    
+    return answer_text
+
+
+# Words a request for the whole document may use; any other keyword names a
+# topic, which is searched for in the chunks instead
+OVERVIEW_WORDS = frozenset({
+    'tell', 'give', 'what', 'about', 'summary', 'summarize', 'summarise', 'overview', 'brief', 'briefly',
+    'main', 'points', 'please', 'whole', 'book', 'story', 'content', 'information', 'text', 'document', 'pdf',
+})
+
+
+def question_words(question_analysis):
+    """The question's keywords without trailing punctuation"""
+    return {keyword.strip('?.!,') for keyword in question_analysis['keywords']}
+
+
+def stored_summary_answer(pdf_document, question_analysis):
+    """
+    Answer summary questions from the document's section summaries.
+    
+    A summary of a numbered chapter gets that chapter's summary, a summary
+    of the whole document the section summaries in order. Returns None for
+    other questions, for questions naming someone or something or asking
+    about a topic, and when nothing is stored.
+    """
+    chapters = question_analysis['entities']['chapter_numbers']
+    sections = SectionSummary.objects.filter(pdf_document=pdf_document)
+    if question_analysis['primary_type'] == 'chapter_specific':
+        if 'summary' not in question_analysis['detected_types'] or not chapters:
+            return None
+        return sections.filter(title=f'Chapter {chapters[0]}').values_list('summary_text', flat=True).first()
+    
+    # Capitalised words after the first suggest a question about a name
+    if question_analysis['primary_type'] != 'summary' or question_analysis['entities']['character_names'][1:]:
+        return None
+    if not question_words(question_analysis) <= OVERVIEW_WORDS:
+        return None
+    summaries = list(sections.order_by('position').values_list('title', 'summary_text'))
+    if len(summaries) <= 1:
+        return summaries[0][1] if summaries else None
+    parts = []
+    length = 0
+    for title, summary_text in summaries:
+        part = f"{title}: {summary_text}"
+        if parts and length + len(part) > 1000:
+            break
+        parts.append(part)
+        length += len(part) + 1
+    return ' '.join(parts)
+
+
+# Words a request for the cast may use besides "characters"; anything else
+# ("villain", "strongest", "dies") asks about someone in particular
+CAST_WORDS = frozenset({
+    'who', 'are', 'main', 'principal', 'key', 'all', 'list', 'name', 'characters',
+    'story', 'book', 'content', 'information', 'text', 'document', 'pdf',
+})
+# Words a question about where and when the story is set may use; anything
+# else ("where was the sword forged?") asks about something in particular
+SETTING_WORDS = frozenset({
+    'where', 'when', 'does', 'take', 'takes', 'place', 'set', 'setting', 'located', 'location', 'happen',
+    'story', 'book', 'content', 'information', 'text', 'document', 'pdf',
+})
+
+
+def canonical_kind(question_analysis):
+    """
+    The ``(kind, chapter)`` of the canonical answer a question maps to, or None.
+    
+    Requests for the summary of one numbered chapter map to that chapter;
+    questions asking only for an overview, the main characters or the
+    setting map to that answer. Questions that name someone or something,
+    or use any other keyword, never map.
+    """
+    primary_type = question_analysis['primary_type']
+    entities = question_analysis['entities']
+    # Capitalised words after the first suggest a question about a name
+    if entities['character_names'][1:]:
+        return None
+    if primary_type == 'chapter_specific':
+        if 'summary' not in question_analysis['detected_types']:
+            return None
+        chapters = set(entities['chapter_numbers'])
+        return ('chapter', chapters.pop()) if len(chapters) == 1 else None
+    words = question_words(question_analysis)
+    if primary_type == 'summary' and words <= OVERVIEW_WORDS:
+        return ('overview', 0)
+    if primary_type == 'character' and 'characters' in words and words <= CAST_WORDS:
+        return ('characters', 0)
+    if primary_type == 'setting' and words <= SETTING_WORDS:
+        return ('setting', 0)
+    return None
+
+
+def stored_canonical_answer(pdf_document, question_analysis, language):
+    """``(answer_text, confidence)`` stored for the current chunk version, or None"""
+    if not getattr(settings, 'CANONICAL_ANSWERS', True):
+        return None
+    mapped = canonical_kind(question_analysis)
+    if mapped is None:
+        return None
+    return CanonicalAnswer.objects.filter(
+        pdf_document=pdf_document, kind=mapped[0], chapter=mapped[1], language=language,
+        chunk_version=pdf_document.chunk_version,
+    ).values_list('answer_text', 'confidence_score').first()
+
+
+# Questions whose answers stand for every question mapped to the same kind
+CANONICAL_QUESTIONS = {
+    'overview': 'Give me an overview of the document',
+    'characters': 'Who are the main characters?',
+    'setting': 'Where does it take place?',
+    'chapter': 'Give me a summary of chapter {}',
+}
+
+
+def canonical_answers(pdf_document):
+    """
+    Compute the canonical answers of ``pdf_document`` in English.
+    
+    Yields ``(kind, chapter, answer_text, confidence)`` for the overview,
+    main characters and setting, and for every chapter named in the chunks or
+    the section summaries (at most CANONICAL_ANSWERS_MAX_CHAPTERS). Questions
+    the document does not answer are left out.
+    """
+    chunks = get_chunk_store(pdf_document)
+    if not len(chunks):
+        return
+    chapters = set()
+    for chunk in chunks:
+        chapters.update(int(number) for number in re.findall(r'chapter\s+(\d+)', chunk.chunk_text.lower()))
+    titles = SectionSummary.objects.filter(pdf_document=pdf_document).values_list('title', flat=True)
+    chapters.update(int(title.split()[1]) for title in titles if re.fullmatch(r'Chapter \d+', title))
+    limit = getattr(settings, 'CANONICAL_ANSWERS_MAX_CHAPTERS', 100)
+    
+    questions = [(kind, 0, CANONICAL_QUESTIONS[kind]) for kind in ('overview', 'characters', 'setting')]
+    questions += [('chapter', number, CANONICAL_QUESTIONS['chapter'].format(number)) for number in sorted(chapters)[:limit]]
+    for kind, chapter, question in questions:
+        answer_text, from_pdf, confidence = compose_answer(pdf_document, chunks, analyze_question(question))
+        if from_pdf:
+            yield kind, chapter, answer_text, confidence
+
+
+NOT_FOUND = "I cannot find specific information about this question in the PDF. The question may not be directly addressed in the document content."
+
+
+def compose_answer(pdf_document, chunks, question_analysis):
+    """The English ``(answer_text, is_from_pdf, confidence)`` for an analysed question"""
+    summary_text = stored_summary_answer(pdf_document, question_analysis)
+    if summary_text:
+        return summary_text, True, 0.9
+    
+    # Score all chunks based on question analysis
+    with instrumentation.timer('scoring'):
+        chunk_scores = []
+        for chunk in chunks:
+            score = score_chunk_for_question(chunk, question_analysis)
+            if score > 0:
+                chunk_scores.append((chunk, score))
+        
+        # Sort by score (highest first)
+        chunk_scores.sort(key=lambda x: x[1], reverse=True)
+    
+    logger.debug("Found %d relevant chunks", len(chunk_scores))
+    if not chunk_scores:
+        return NOT_FOUND, False, 0.0
+    
+    # Select best chunks based on question type
+    with instrumentation.timer('selection'):
+        best_chunks = select_best_chunks(chunk_scores, question_analysis)
+        
+        # Generate answer from selected chunks
+        answer_text = generate_answer_from_chunks(best_chunks, question_analysis)
+    
+    # Calculate confidence
+    max_score = max(score for _, score in best_chunks)
+    confidence = min(0.95, max_score / 50.0)  # Normalize based on max possible score
+    return answer_text, True, confidence
+
+
+def generate_answer(question, pdf_document, language='en'):
+    """Generate answer to question based on PDF content using dynamic analysis"""
+    from .translation import translate_answer
+    try:
+        # Analyze the question
+        with instrumentation.timer('question_analysis'):
+            question_analysis = analyze_question(question)
+        
+        logger.debug(
+            "Question: %r type=%s keywords=%s entities=%s language=%s",
+            question, question_analysis['primary_type'], question_analysis['keywords'],
+            question_analysis['entities'], language,
+        )
+        
+        stored = stored_canonical_answer(pdf_document, question_analysis, language)
+        if stored:
+            instrumentation.increment('easylearning_questions_answered_total', type=question_analysis['primary_type'])
+            instrumentation.increment('easylearning_canonical_answers_total', kind=canonical_kind(question_analysis)[0])
+            return stored[0], True, stored[1]
+        
+        # Search through the document's memory-mapped chunk store
+        chunks = get_chunk_store(pdf_document)
+        
+        if not len(chunks):
+            error_msg = "I cannot find any content in this PDF to answer your question."
+            return translate_answer(error_msg, language), False, 0.0
+        
+        answer_text, from_pdf, confidence = compose_answer(pdf_document, chunks, question_analysis)
+        instrumentation.increment('easylearning_questions_answered_total', type=question_analysis['primary_type'])
+        
+        # Translate the answer to the target language
+        with instrumentation.timer('translation', language=language):
+            translated_answer = translate_answer(answer_text, language)
+        
+        if from_pdf:
+            logger.debug("Generated answer with confidence %s: %.100s...", confidence, translated_answer)
+        return translated_answer, from_pdf, confidence
+            
+    except Exception as e:
+        logger.exception("Error generating answer")
+        error_msg = f"Error generating answer: {str(e)}"
+        return translate_answer(error_msg, language), False, 0.0
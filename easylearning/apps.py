@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class EasylearningConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'easylearning'
+
+    def ready(self):
+        # Register signal handlers and checks
+        from . import checks, chunkstore, search, signals  # noqa: F401
+        
+        from django.conf import settings
+        from . import jobs, warmup
+        if warmup.is_serving():
+            # Run maintenance jobs left queued by the previous process
+            jobs.start_worker()
+            if getattr(settings, 'WARM_CACHES_ON_STARTUP', False):
+                warmup.start_background_warmup()
@@ -0,0 +1,136 @@
+"""
+Archival of idle conversation threads.
+
+The questions and answers of a thread that has seen no activity for a while
+are moved into a single ArchivedThread row holding a compressed JSON
+document, which keeps the Question and Answer tables (and their indexes)
+small. The thread row stays in place with its counters, so document pages
+list it as before; opening the thread restores its rows.
+"""
+import json
+import logging
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ArchivedThread, ConversationThread, Question, Answer
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMAT = 1
+
+QUESTION_FIELDS = ('id', 'question_text', 'language', 'asked_at', 'asked_by_id')
+ANSWER_FIELDS = ('id', 'answer_text', 'language', 'is_from_pdf', 'confidence_score', 'generated_at')
+
+
+def idle_threads(days):
+    """Threads with live questions and no activity in the last ``days`` days"""
+    cutoff = timezone.now() - timedelta(days=days)
+    return ConversationThread.objects.filter(
+        Exists(Question.objects.filter(thread=OuterRef('pk'))),
+        updated_at__lt=cutoff,
+        archive__isnull=True,
+    )
+
+
+class TimestampJSONEncoder(DjangoJSONEncoder):
+    """Keep full microsecond precision so restored timestamps are unchanged"""
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _serialise(thread):
+    questions = []
+    for question in thread.questions.select_related('answer').order_by('asked_at'):
+        row = {field: getattr(question, field) for field in QUESTION_FIELDS}
+        try:
+            answer = question.answer
+        except Answer.DoesNotExist:
+            answer = None
+        row['answer'] = {field: getattr(answer, field) for field in ANSWER_FIELDS} if answer else None
+        questions.append(row)
+    return questions
+
+
+def archive_thread(thread):
+    """Move the questions and answers of ``thread`` into an archive; returns the number moved"""
+    with transaction.atomic():
+        questions = _serialise(thread)
+        if not questions:
+            return 0
+        ArchivedThread.objects.create(
+            thread=thread,
+            payload=json.dumps({'format': ARCHIVE_FORMAT, 'questions': questions},
+                               cls=TimestampJSONEncoder, separators=(',', ':')),
+            question_count=len(questions),
+        )
+        # The thread still owns these questions, so delete them without the
+        # signals that would uncount them, one query per table
+        Answer.objects.filter(question__thread=thread)._raw_delete(Answer.objects.db)
+        Question.objects.filter(thread=thread)._raw_delete(Question.objects.db)
+    return len(questions)
+
+
+def restore_thread(thread):
+    """
+    Move an archived thread's questions and answers back; returns the number restored.
+    
+    The thread counts as active again, so ``idle_threads`` passes it over
+    for another full idle period rather than archiving it while it is read.
+    """
+    with transaction.atomic():
+        archive = ArchivedThread.objects.filter(pk=thread.pk).first()
+        if archive is None:
+            return 0
+        deleted, _ = ArchivedThread.objects.filter(pk=archive.pk).delete()
+        if not deleted:
+            # Restored by a concurrent request
+            return 0
+        
+        data = json.loads(archive.payload)
+        if data.get('format') != ARCHIVE_FORMAT:
+            raise ValueError(f"Unknown thread archive format: {data.get('format')}")
+        
+        rows = data['questions']
+        user_ids = {row['asked_by_id'] for row in rows if row['asked_by_id'] is not None}
+        live_users = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+        
+        questions = []
+        answers = []
+        for row in rows:
+            question = Question(
+                id=row['id'], thread_id=thread.pk, question_text=row['question_text'],
+                language=row['language'],
+                asked_by_id=row['asked_by_id'] if row['asked_by_id'] in live_users else None,
+            )
+            question.asked_at = parse_datetime(row['asked_at'])
+            questions.append(question)
+            if row['answer']:
+                answer = Answer(question_id=row['id'], **{
+                    field: row['answer'][field] for field in ANSWER_FIELDS if field != 'generated_at'
+                })
+                answer.generated_at = parse_datetime(row['answer']['generated_at'])
+                answers.append(answer)
+        
+        # auto_now_add overrides the timestamps on insert, so write them back
+        asked_at = [question.asked_at for question in questions]
+        generated_at = [answer.generated_at for answer in answers]
+        Question.objects.bulk_create(questions, batch_size=500)
+        Answer.objects.bulk_create(answers, batch_size=500)
+        for obj, value in zip(questions, asked_at):
+            obj.asked_at = value
+        for obj, value in zip(answers, generated_at):
+            obj.generated_at = value
+        Question.objects.bulk_update(questions, ['asked_at'], batch_size=500)
+        Answer.objects.bulk_update(answers, ['generated_at'], batch_size=500)
+        ConversationThread.objects.filter(pk=thread.pk).update(updated_at=timezone.now())
+    
+    logger.info("Restored %d archived questions for thread %s", len(questions), thread.pk)
+    return len(questions)
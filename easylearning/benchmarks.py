@@ -0,0 +1,267 @@
+"""
+Micro-benchmarks for the ingestion and Q&A hot paths.
+
+Synthetic text PDFs are generated locally (see ``make_pdf``), so runs are
+repeatable and need no fixtures. Each benchmark is timed ``repeat`` times and
+the best run is kept; one further run is traced with ``tracemalloc`` to record
+the peak Python memory. Results can be saved as a JSON baseline, and
+``compare`` lists the metrics of a later run that regressed past a threshold.
+
+Used by ``manage.py benchmark``.
+"""
+import math
+import os
+import platform
+import random
+import sqlite3
+import tempfile
+import textwrap
+import time
+import tracemalloc
+
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from .answering import analyze_question, score_chunk_for_question
+from .chunkstore import StoredChunk
+from .extraction import extract_pages
+from .ingestion import save_chunks, split_into_chunks
+from .models import PDFDocument, Question
+from .summarisation import summarise
+from .translation import translate_answer
+
+BASELINE_FORMAT = 1
+
+VOCABULARY = (
+    'the', 'a', 'of', 'and', 'to', 'in', 'is', 'was', 'that', 'with', 'for', 'as', 'on', 'by', 'from',
+    'student', 'teacher', 'lesson', 'chapter', 'study', 'example', 'method', 'result', 'process', 'system',
+    'energy', 'water', 'plant', 'cell', 'history', 'empire', 'river', 'mountain', 'village', 'market',
+    'important', 'simple', 'ancient', 'modern', 'different', 'natural', 'careful', 'strong', 'early',
+    'explains', 'describes', 'shows', 'changes', 'grows', 'moves', 'builds', 'protects', 'learns', 'finds',
+)
+
+QUESTIONS = (
+    'What is this document about?',
+    'Summarize the main points of the chapter',
+    'Who was the teacher in the village?',
+    'When did the empire build the market?',
+    'Where does the river meet the mountain?',
+    'Why does the plant cell need water and energy?',
+    'How does the process change the result?',
+    'Explain the difference between the ancient and modern methods',
+)
+
+TRANSLATION_SAMPLES = (
+    'I cannot find specific information about this question in the PDF. '
+    'The question may not be directly addressed in the document content.',
+    'I cannot find any content in this PDF to answer your question.',
+)
+
+# Metrics compared against a baseline, and whether larger values are better
+TRACKED = {'ops_per_sec': True, 'peak_kib': False}
+
+
+def synthetic_text(rng, sentences):
+    """Random sentences of 6 to 16 words drawn from VOCABULARY"""
+    out = []
+    for _ in range(sentences):
+        words = [rng.choice(VOCABULARY) for _ in range(rng.randint(6, 16))]
+        out.append(' '.join(words).capitalize() + '.')
+    return ' '.join(out)
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def make_pdf(path, pages, sentences_per_page=20, seed=0, edits=None):
+    """
+    Write a ``pages``-page PDF of synthetic Helvetica text to ``path``.
+
+    ``edits`` maps page numbers to text used instead of that page's synthetic
+    text; the other pages are the same as without edits.
+    """
+    rng = random.Random(seed)
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None,
+               b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for number in range(1, pages + 1):
+        text = synthetic_text(rng, sentences_per_page)
+        lines = textwrap.wrap((edits or {}).get(number, text), 90)
+        ops = ['BT', '/F1 11 Tf', '14 TL', '50 800 Td'] + [f'({_escape(line)}) Tj T*' for line in lines] + ['ET']
+        stream = '\n'.join(ops).encode('latin-1')
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (len(objects))
+        )
+        kids.append(len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % kid for kid in kids), pages
+    )
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        out += b'%010d 00000 n \n' % offset
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    with open(path, 'wb') as fh:
+        fh.write(out)
+    return path
+
+
+def measure(fn, ops, repeat=3, setup=None):
+    """
+    Time ``fn`` (which performs ``ops`` operations) and trace its memory peak.
+
+    ``setup``, when given, is called before every run and its return value
+    passed to ``fn``; it is not timed.
+    """
+    args = ()
+    best = None
+    for _ in range(max(1, repeat)):
+        if setup is not None:
+            args = (setup(),)
+        start = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    peak = None
+    if not tracemalloc.is_tracing():
+        if setup is not None:
+            args = (setup(),)
+        tracemalloc.start()
+        try:
+            fn(*args)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {
+        'ops': ops,
+        'seconds': round(best, 6),
+        'ops_per_sec': round(ops / best, 2) if best else None,
+        'peak_kib': round(peak / 1024, 1) if peak is not None else None,
+    }
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list, or None when it is empty"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values), max(1, math.ceil(fraction * len(sorted_values)))) - 1
+    return sorted_values[index]
+
+
+def _synthetic_chunks(count, seed=0):
+    rng = random.Random(seed)
+    return [StoredChunk(synthetic_text(rng, 3), i, i // 5 + 1) for i in range(count)]
+
+
+def run_suite(pages=(10, 100), chunk_counts=(100, 1000, 10000), languages=None, repeat=3, only=None, progress=None):
+    """Run every benchmark and return ``{name: measurement}`` in run order"""
+    if languages is None:
+        languages = [code for code, _ in Question.LANGUAGE_CHOICES]
+    results = {}
+
+    def record(name, fn, ops, setup=None):
+        if only and not any(part in name for part in only):
+            return
+        results[name] = measure(fn, ops, repeat=repeat, setup=setup)
+        if progress is not None:
+            progress(name, results[name])
+
+    with tempfile.TemporaryDirectory(prefix='easylearning-bench-') as workdir, \
+            override_settings(MEDIA_ROOT=workdir):
+        os.makedirs(os.path.join(workdir, 'pdfs'))
+        for page_count in pages:
+            name = f'pdfs/bench-{page_count}.pdf'
+            path = make_pdf(os.path.join(workdir, name), page_count)
+
+            with override_settings(PDF_EXTRACTION_SANDBOX=False):
+                record(f'extraction[pages={page_count}]', lambda: extract_pages(path, reuse=False), page_count)
+            with override_settings(PDF_EXTRACTION_SANDBOX=True):
+                record(f'extraction.sandbox[pages={page_count}]', lambda: extract_pages(path, reuse=False), page_count)
+                extracted = extract_pages(path, reuse=False)
+
+            draft = PDFDocument(title='Benchmark', file=name)
+            record(f'chunking[pages={page_count}]', lambda: split_into_chunks(draft, extracted.pages), page_count)
+            record(f'summarisation[pages={page_count}]', lambda: summarise(extracted.pages), page_count)
+
+            def write_chunks(chunks):
+                with transaction.atomic():
+                    pdf_doc = PDFDocument.objects.create(title='Benchmark', file=name)
+                    for chunk in chunks:
+                        chunk.pdf_document = pdf_doc
+                    save_chunks(pdf_doc, chunks, extracted.page_total)
+                    transaction.set_rollback(True)
+
+            chunk_total = len(split_into_chunks(draft, extracted.pages))
+            record(f'db_write[chunks={chunk_total}]', write_chunks, chunk_total,
+                   setup=lambda: split_into_chunks(draft, extracted.pages))
+
+        rounds = 50
+        record('question_analysis', lambda: [analyze_question(q) for _ in range(rounds) for q in QUESTIONS],
+               rounds * len(QUESTIONS))
+
+        analyses = [analyze_question(q) for q in QUESTIONS]
+        for count in chunk_counts:
+            chunks = _synthetic_chunks(count)
+            record(f'scoring[chunks={count}]',
+                   lambda: [score_chunk_for_question(c, a) for a in analyses for c in chunks],
+                   count * len(analyses))
+
+        answer = ' '.join(c.chunk_text for c in _synthetic_chunks(8))
+        samples = TRANSLATION_SAMPLES + (answer,)
+        for language in languages:
+            record(f'translation[lang={language}]',
+                   lambda: [translate_answer(text, language) for _ in range(rounds) for text in samples],
+                   rounds * len(samples))
+    return results
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'system': platform.system(),
+        'sqlite': sqlite3.sqlite_version,
+    }
+
+
+def baseline_document(results):
+    return {
+        'format': BASELINE_FORMAT,
+        'created_at': timezone.now().isoformat(),
+        'environment': environment(),
+        'results': results,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    List the tracked metrics that regressed by more than ``threshold`` (0.2 = 20%).
+
+    Returns ``(name, metric, baseline_value, current_value, change)`` tuples;
+    benchmarks missing from either side are ignored.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        for metric, higher_is_better in TRACKED.items():
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append((name, metric, old, new, change))
+    return regressions
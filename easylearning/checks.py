@@ -0,0 +1,39 @@
+"""
+Deployment checks, run by ``manage.py check --deploy``.
+"""
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+from .startup import StartupError, eager_lazy_modules, measure_cold_start
+
+# Cold starts measured per check; the fastest counts, to ride out noise
+STARTUP_SAMPLES = 3
+
+
+@register('performance', deploy=True)
+def check_startup_budget(app_configs, **kwargs):
+    budget = getattr(settings, 'STARTUP_URLCONF_BUDGET_MS', None)
+    if budget is None:
+        return []
+    try:
+        samples = [measure_cold_start() for _ in range(STARTUP_SAMPLES)]
+    except StartupError as e:
+        return [Error(f"Could not measure the cold start: {e}", id='easylearning.E001')]
+    
+    errors = []
+    best = min(sample['urlconf_ms'] for sample in samples)
+    if best > budget:
+        errors.append(Error(
+            f"Importing the URLconf in a fresh worker takes {best:.0f} ms, over the "
+            f"STARTUP_URLCONF_BUDGET_MS budget of {budget} ms.",
+            hint="Run 'manage.py startup_report' to see which imports are slow.",
+            id='easylearning.E002',
+        ))
+    eager = eager_lazy_modules(samples[0]['modules'])
+    if eager:
+        errors.append(Warning(
+            f"{', '.join(eager)} are imported while a worker starts; they are meant to load on first use.",
+            hint="Import them inside the functions that use them.",
+            id='easylearning.W001',
+        ))
+    return errors
@@ -0,0 +1,240 @@
+"""
+Array-backed, memory-mapped storage of a document's chunks.
+
+Every document's chunks are written to a single ``.chunks`` file next to the
+PDF in MEDIA_ROOT: a small header, three compact arrays (text offsets, page
+numbers and chunk indexes) and the concatenated UTF-8 chunk text. Workers map
+the file read-only, so the pages are shared through the OS page cache, and
+retrieval reads chunks straight out of the mapping without building ORM
+objects. The PDFChunk rows remain the source of truth; the file is rebuilt
+from them whenever it is missing or stale.
+
+Layout (all integers little-endian; little-endian hosts map the arrays
+without copying, big-endian hosts copy and byte-swap them on open)::
+
+    magic  b'ELCS'  | format u16 | reserved u16 | chunk_version u32 | count u32
+    offsets      u32 * (count + 1)   byte offsets into the text blob
+    page_numbers i32 * count         -1 when unknown
+    chunk_index  i32 * count
+    text         concatenated UTF-8 chunk text
+"""
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'ELCS'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHHII')
+NO_PAGE = -1
+NATIVE_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+def _little_endian(view, typecode):
+    """The 32-bit little-endian integers in ``view`` as a sequence of ``typecode`` values"""
+    if NATIVE_LITTLE_ENDIAN:
+        return view.cast(typecode)
+    values = array(typecode, bytes(view))
+    values.byteswap()
+    return values
+
+
+class StoredChunk:
+    """A chunk read from a ChunkStore; quacks like PDFChunk for scoring"""
+    __slots__ = ('chunk_text', 'chunk_index', 'page_number')
+
+    def __init__(self, chunk_text, chunk_index, page_number):
+        self.chunk_text = chunk_text
+        self.chunk_index = chunk_index
+        self.page_number = page_number
+
+    def __repr__(self):
+        return f'<StoredChunk {self.chunk_index} page={self.page_number}>'
+
+
+class ChunkStore:
+    """Read-only view over an encoded chunk store buffer"""
+    __slots__ = ('buffer', 'chunk_version', 'offsets', 'page_numbers', 'chunk_indexes', '_text_start', '_mtime')
+
+    def __init__(self, buffer, mtime=None):
+        magic, fmt, _reserved, chunk_version, count = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise ValueError('Not a chunk store')
+        view = memoryview(buffer)
+        pos = HEADER.size
+        self.offsets = _little_endian(view[pos:pos + 4 * (count + 1)], 'I')
+        pos += 4 * (count + 1)
+        self.page_numbers = _little_endian(view[pos:pos + 4 * count], 'i')
+        pos += 4 * count
+        self.chunk_indexes = _little_endian(view[pos:pos + 4 * count], 'i')
+        pos += 4 * count
+        self._text_start = pos
+        self.buffer = buffer
+        self.chunk_version = chunk_version
+        self._mtime = mtime
+
+    def __len__(self):
+        return len(self.chunk_indexes)
+
+    def text(self, i):
+        start = self._text_start + self.offsets[i]
+        end = self._text_start + self.offsets[i + 1]
+        return bytes(self.buffer[start:end]).decode('utf-8')
+
+    def chunk(self, i):
+        page = self.page_numbers[i]
+        return StoredChunk(self.text(i), self.chunk_indexes[i], None if page == NO_PAGE else page)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.chunk(i)
+
+    def touch(self, page=4096):
+        """Read a byte of every page so the mapping is resident in the page cache"""
+        buffer = self.buffer
+        for offset in range(0, len(buffer), page):
+            _ = buffer[offset]
+
+    @staticmethod
+    def encode(rows, chunk_version=0):
+        """Encode ``(chunk_text, chunk_index, page_number)`` rows, in order"""
+        offsets = array('I', [0])
+        page_numbers = array('i')
+        chunk_indexes = array('i')
+        texts = []
+        total = 0
+        for chunk_text, chunk_index, page_number in rows:
+            data = chunk_text.encode('utf-8')
+            texts.append(data)
+            total += len(data)
+            offsets.append(total)
+            page_numbers.append(NO_PAGE if page_number is None else page_number)
+            chunk_indexes.append(chunk_index)
+        if not NATIVE_LITTLE_ENDIAN:
+            for values in (offsets, page_numbers, chunk_indexes):
+                values.byteswap()
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, 0, chunk_version, len(chunk_indexes))
+        return b''.join([header, offsets.tobytes(), page_numbers.tobytes(), chunk_indexes.tobytes(), *texts])
+
+
+def chunk_store_path(pdf_doc):
+    """Path of the store file next to the document's PDF, or None without a file"""
+    if not pdf_doc.file:
+        return None
+    try:
+        return pdf_doc.file.path + '.chunks'
+    except NotImplementedError:
+        # Remote storage backends have no local path
+        return None
+
+
+def write_chunk_store(pdf_doc, rows):
+    """Atomically (re)write the store file for ``pdf_doc``"""
+    path = chunk_store_path(pdf_doc)
+    if path is None:
+        return None
+    data = ChunkStore.encode(rows, pdf_doc.chunk_version)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as fh:
+        fh.write(data)
+    os.replace(tmp_path, path)
+    _forget(pdf_doc.pk)
+    return path
+
+
+def delete_chunk_store(pdf_doc):
+    path = chunk_store_path(pdf_doc)
+    _forget(pdf_doc.pk)
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+# Per-process cache of open stores, keyed by document id
+_cache_lock = threading.Lock()
+_cache = OrderedDict()
+
+
+def _forget(pdf_id):
+    with _cache_lock:
+        _cache.pop(pdf_id, None)
+
+
+def _remember(pdf_id, store):
+    limit = getattr(settings, 'CHUNK_STORE_CACHE_SIZE', 32)
+    with _cache_lock:
+        _cache[pdf_id] = store
+        _cache.move_to_end(pdf_id)
+        while len(_cache) > limit:
+            _cache.popitem(last=False)
+
+
+def _open_mapped(path):
+    with open(path, 'rb') as fh:
+        stat = os.fstat(fh.fileno())
+        if stat.st_size < HEADER.size:
+            return None
+        mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    return ChunkStore(mapped, mtime=stat.st_mtime_ns)
+
+
+def _rows_from_db(pdf_doc):
+    return pdf_doc.chunks.order_by('chunk_index').values_list('chunk_text', 'chunk_index', 'page_number')
+
+
+def get_chunk_store(pdf_doc):
+    """
+    Return the ChunkStore for ``pdf_doc``.
+
+    Uses the cached mapping when it is still current, maps the file when it
+    matches the document's chunk_version, and otherwise rebuilds the file from
+    the PDFChunk rows.
+    """
+    path = chunk_store_path(pdf_doc)
+    with _cache_lock:
+        store = _cache.get(pdf_doc.pk)
+    if store is not None and store.chunk_version == pdf_doc.chunk_version:
+        try:
+            if path is None or os.stat(path).st_mtime_ns == store._mtime:
+                return store
+        except OSError:
+            pass
+
+    if path is not None:
+        try:
+            store = _open_mapped(path)
+        except (OSError, ValueError, struct.error):
+            store = None
+        if store is not None and store.chunk_version == pdf_doc.chunk_version:
+            _remember(pdf_doc.pk, store)
+            return store
+
+        logger.info("Rebuilding chunk store for %s", pdf_doc.pk)
+        try:
+            write_chunk_store(pdf_doc, _rows_from_db(pdf_doc))
+            store = _open_mapped(path)
+            if store is not None:
+                _remember(pdf_doc.pk, store)
+                return store
+        except OSError:
+            logger.warning("Could not write chunk store %s", path, exc_info=True)
+
+    # No local file available: decode an in-memory copy
+    return ChunkStore(ChunkStore.encode(_rows_from_db(pdf_doc), pdf_doc.chunk_version))
+
+
+@receiver(post_delete, sender='easylearning.PDFDocument')
+def remove_chunk_store(sender, instance, **kwargs):
+    try:
+        delete_chunk_store(instance)
+    except OSError:
+        logger.warning("Could not delete chunk store for %s", instance.pk, exc_info=True)
@@ -0,0 +1,149 @@
+"""
+Single-flight coalescing of identical questions.
+
+Questions are keyed by document, chunk version, language and normalised
+question text. The first request for a key computes the answer; identical
+requests arriving while it runs wait for that result instead of computing
+it again. Inside a process waiters block on an event; across processes the
+leader holds a lock in the shared cache and publishes the result there for
+SINGLE_FLIGHT_RESULT_TTL seconds. If the leader fails or takes longer than
+SINGLE_FLIGHT_WAIT seconds, waiters compute the answer themselves.
+
+Answers to frequently asked questions can also be stored ahead of time by
+``manage.py warm_caches`` (see ``warmup``); ``warmed_answer`` returns them.
+"""
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import instrumentation
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'easylearning:qa:flight'
+WARM_PREFIX = 'easylearning:qa:warm'
+
+
+def normalise_question(text):
+    return ' '.join(text.lower().split()).strip(' ?!.')
+
+
+def question_key(pdf_document, question_text, language):
+    raw = f'{pdf_document.pk}:{pdf_document.chunk_version}:{language}:{normalise_question(question_text)}'
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def warmed_answer(key):
+    """The answer stored for ``key`` by a cache warm-up, or None"""
+    try:
+        result = _cache().get(f'{WARM_PREFIX}:{key}')
+    except Exception:
+        logger.warning("Shared cache unavailable; skipping warmed answers", exc_info=True)
+        return None
+    if result is not None:
+        instrumentation.increment('easylearning_warmed_answers_total')
+    return result
+
+
+def store_warmed_answer(key, result, timeout):
+    _cache().set(f'{WARM_PREFIX}:{key}', result, timeout=timeout)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _cache():
+    return caches[_setting('SINGLE_FLIGHT_CACHE', 'shared')]
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_flights_lock = threading.Lock()
+_flights = {}
+
+
+def single_flight(key, compute):
+    """Return ``compute()``, sharing one computation among concurrent callers with the same key"""
+    if not _setting('SINGLE_FLIGHT_ENABLED', True):
+        return compute()
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        if flight.done.wait(_setting('SINGLE_FLIGHT_WAIT', 30.0)):
+            if flight.error is not None:
+                raise flight.error
+            instrumentation.increment('easylearning_coalesced_questions_total', scope='process')
+            return flight.result
+        return compute()
+
+    try:
+        flight.result = _shared_flight(key, compute)
+        return flight.result
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
+
+
+def _shared_flight(key, compute):
+    result_key = f'{KEY_PREFIX}:result:{key}'
+    lock_key = f'{KEY_PREFIX}:lock:{key}'
+    wait = _setting('SINGLE_FLIGHT_WAIT', 30.0)
+    try:
+        cache = _cache()
+        result = cache.get(result_key)
+        if result is None:
+            leader = cache.add(lock_key, 1, timeout=int(wait) + 1)
+    except Exception:
+        logger.warning("Shared cache unavailable; answering without coalescing", exc_info=True)
+        return compute()
+
+    if result is not None:
+        instrumentation.increment('easylearning_coalesced_questions_total', scope='shared')
+        return result
+
+    if leader:
+        try:
+            result = compute()
+            cache.set(result_key, result, timeout=_setting('SINGLE_FLIGHT_RESULT_TTL', 10))
+            return result
+        finally:
+            try:
+                cache.delete(lock_key)
+            except Exception:
+                logger.warning("Could not release question lock %s", lock_key, exc_info=True)
+
+    # Another process is computing this answer
+    start = time.monotonic()
+    delay = 0.01
+    while time.monotonic() - start < wait:
+        time.sleep(delay)
+        delay = min(delay * 2, 0.25)
+        result = cache.get(result_key)
+        if result is not None:
+            instrumentation.increment('easylearning_coalesced_questions_total', scope='shared')
+            return result
+        if not cache.has_key(lock_key):
+            # The leader gave up without a result
+            break
+    return compute()
@@ -0,0 +1,204 @@
+"""
+Streaming export and import of documents and their conversations.
+
+A corpus file is JSON Lines, optionally gzip-compressed. The first line is a
+header, followed by one record per row grouped by table, parents before
+children: documents, summaries, section summaries, chunks, pages, canonical
+answers, threads, questions, answers and thread archives. Rows are read with ``iterator()`` and written with batched
+``bulk_create()``, so memory use does not depend on the size of the corpus.
+Users are referred to by username and mapped onto the target's accounts.
+"""
+import base64
+import gzip
+import json
+import logging
+import sys
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .archive import TimestampJSONEncoder
+from .models import (
+    PDFDocument, PDFSummary, SectionSummary, PDFChunk, PDFPage, CanonicalAnswer, ConversationThread, Question, Answer,
+    ArchivedThread,
+)
+
+logger = logging.getLogger(__name__)
+
+CORPUS_FORMAT = 1
+
+# (record type, model, exported fields, lookup from the model to PDFDocument)
+TABLES = (
+    ('document', PDFDocument,
+     ('id', 'title', 'file', 'uploaded_at', 'uploaded_by__username', 'chunk_version',
+      'thread_count', 'chunk_count', 'page_count', 'text_chars'), 'pk'),
+    ('summary', PDFSummary,
+     ('id', 'pdf_document_id', 'summary_text', 'generated_at'), 'pdf_document'),
+    ('section_summary', SectionSummary,
+     ('id', 'pdf_document_id', 'position', 'title', 'first_page', 'last_page', 'summary_text',
+      'generated_at'), 'pdf_document'),
+    ('chunk', PDFChunk,
+     ('id', 'pdf_document_id', 'chunk_text', 'chunk_index', 'page_number'), 'pdf_document'),
+    ('page', PDFPage,
+     ('id', 'pdf_document_id', 'page_number', 'text', 'text_hash'), 'pdf_document'),
+    ('canonical_answer', CanonicalAnswer,
+     ('id', 'pdf_document_id', 'kind', 'chapter', 'language', 'chunk_version', 'answer_text',
+      'confidence_score', 'generated_at'), 'pdf_document'),
+    ('thread', ConversationThread,
+     ('id', 'pdf_document_id', 'title', 'created_at', 'updated_at', 'question_count',
+      'answered_count', 'last_question_at'), 'pdf_document'),
+    ('question', Question,
+     ('id', 'thread_id', 'question_text', 'language', 'asked_at', 'asked_by__username'), 'thread__pdf_document'),
+    ('answer', Answer,
+     ('id', 'question_id', 'answer_text', 'language', 'is_from_pdf', 'confidence_score',
+      'generated_at'), 'question__thread__pdf_document'),
+    ('archive', ArchivedThread,
+     ('thread_id', 'payload', 'question_count', 'archived_at'), 'thread__pdf_document'),
+)
+
+MODELS = {record_type: model for record_type, model, _fields, _lookup in TABLES}
+
+
+def open_corpus(path, mode):
+    """Open ``path`` ('-' for stdin/stdout) as text, gzip-compressed when it ends in .gz"""
+    if path == '-':
+        return sys.stdout if 'w' in mode else sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8', compresslevel=6)
+    return open(path, mode, encoding='utf-8')
+
+
+def select_documents(username=None, since=None, until=None):
+    documents = PDFDocument.objects.all()
+    if username:
+        documents = documents.filter(uploaded_by__username=username)
+    if since:
+        documents = documents.filter(uploaded_at__gte=since)
+    if until:
+        documents = documents.filter(uploaded_at__lt=until)
+    return documents
+
+
+def export_corpus(stream, documents, with_files=False, chunk_size=2000):
+    """Write ``documents`` and everything hanging off them to ``stream``; returns counts per type"""
+    encoder = TimestampJSONEncoder(separators=(',', ':'), ensure_ascii=False)
+    stream.write(encoder.encode({'type': 'header', 'format': CORPUS_FORMAT}) + '\n')
+    document_ids = documents.values('pk')
+    counts = {}
+    for record_type, model, fields, lookup in TABLES:
+        rows = model.objects.filter(**{f'{lookup}__in': document_ids}).order_by('pk').values(*fields)
+        counts[record_type] = 0
+        for row in rows.iterator(chunk_size=chunk_size):
+            row['type'] = record_type
+            if record_type == 'document' and with_files and row['file']:
+                row['file_content'] = _read_file(row['file'])
+            stream.write(encoder.encode(row) + '\n')
+            counts[record_type] += 1
+    return counts
+
+
+def _read_file(name):
+    try:
+        with default_storage.open(name, 'rb') as fh:
+            return base64.b64encode(fh.read()).decode('ascii')
+    except OSError:
+        logger.warning("Could not read %s for export", name)
+        return None
+
+
+class CorpusImporter:
+    """Insert records from a corpus file in batches"""
+
+    def __init__(self, batch_size=1000, skip_existing=False):
+        self.batch_size = batch_size
+        self.skip_existing = skip_existing
+        self.counts = {record_type: 0 for record_type in MODELS}
+        self.skipped = 0
+        self._users = {}
+        self._type = None
+        self._batch = []
+
+    def load(self, stream):
+        first = next(stream, '')
+        header = json.loads(first) if first.strip() else None
+        if not isinstance(header, dict) or header.get('type') != 'header':
+            raise ValueError("Not a corpus file")
+        if header.get('format') != CORPUS_FORMAT:
+            raise ValueError(f"Unsupported corpus format: {header.get('format')}")
+        for line in stream:
+            if line.strip():
+                self.add(json.loads(line))
+        self.flush()
+        return self.counts
+
+    def add(self, record):
+        record_type = record.pop('type')
+        if record_type not in MODELS:
+            raise ValueError(f"Unknown record type: {record_type}")
+        if record_type != self._type:
+            self.flush()
+            self._type = record_type
+        self._batch.append(self._build(MODELS[record_type], record))
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def _build(self, model, record):
+        file_content = record.pop('file_content', None)
+        values = {}
+        for name, value in record.items():
+            if name.endswith('__username'):
+                values[name[:-len('__username')] + '_id'] = self._user_id(value)
+            else:
+                values[name] = model._meta.get_field(name).to_python(value)
+        if model is PDFDocument:
+            # Chunk stores left behind in this environment must not match
+            values['chunk_version'] = values.get('chunk_version', 0) + 1
+            if file_content is not None:
+                values['file'] = self._store_file(values['file'], file_content)
+        elif model is CanonicalAnswer:
+            # Follow the document's bumped chunk version; the chunks are unchanged
+            values['chunk_version'] = values.get('chunk_version', 0) + 1
+        obj = model(**values)
+        # Keep the exported timestamps instead of auto_now(_add) ones
+        obj._exported = {field.attname: values[field.attname] for field in self._auto_fields(model)
+                         if field.attname in values}
+        return obj
+
+    def _user_id(self, username):
+        if username is None:
+            return None
+        if username not in self._users:
+            self._users[username] = User.objects.filter(username=username).values_list('id', flat=True).first()
+        return self._users[username]
+
+    def _store_file(self, name, content):
+        if default_storage.exists(name):
+            return name
+        return default_storage.save(name, ContentFile(base64.b64decode(content)))
+
+    @staticmethod
+    def _auto_fields(model):
+        return [field for field in model._meta.concrete_fields
+                if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+
+    def flush(self):
+        if not self._batch:
+            return
+        model = MODELS[self._type]
+        objs = self._batch
+        self._batch = []
+        if self.skip_existing:
+            existing = set(model.objects.filter(pk__in=[obj.pk for obj in objs]).values_list('pk', flat=True))
+            self.skipped += len(existing)
+            objs = [obj for obj in objs if obj.pk not in existing]
+            if not objs:
+                return
+        model.objects.bulk_create(objs, batch_size=self.batch_size)
+        auto_fields = [field.attname for field in self._auto_fields(model)]
+        if auto_fields:
+            for obj in objs:
+                for attname, value in obj._exported.items():
+                    setattr(obj, attname, value)
+            model.objects.bulk_update(objs, auto_fields, batch_size=self.batch_size)
+        self.counts[self._type] += len(objs)
@@ -0,0 +1,181 @@
+"""
+Retrieval evaluation against a labelled question set.
+
+A question set is a JSON list (or JSON Lines file) of items::
+
+    {"document": "<pdf id or exact title>", "question": "...",
+     "chunks": [12, 13], "pages": [4]}
+
+where ``chunks`` are the chunk indexes and/or ``pages`` the page numbers that
+answer the question. A retrieved chunk is relevant when its index is listed
+in ``chunks`` or its page in ``pages``.
+
+For every engine ``evaluate`` reports recall@k (the share of an item's
+expected chunks and pages found in the top k, averaged over items), the mean
+reciprocal rank of the first relevant chunk, and per-query latency. Building
+an engine for a document is timed separately from its queries.
+
+``synthetic_question_set`` makes a set from the chunks themselves, asking
+about words that are rare in the document, for documents nobody has labelled.
+"""
+import json
+import random
+import re
+import time
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+
+from .benchmarks import percentile
+from .chunkstore import get_chunk_store
+from .models import PDFDocument
+from .retrieval import EngineUnavailable, get_engine
+
+WORD_RE = re.compile(r"[^\W\d_]{4,}")
+
+
+def load_question_set(path):
+    """Read a question set and resolve its documents; returns a list of items"""
+    with open(path, encoding='utf-8') as fh:
+        content = fh.read()
+    try:
+        raw_items = json.loads(content)
+    except ValueError:
+        try:
+            raw_items = [json.loads(line) for line in content.splitlines() if line.strip()]
+        except ValueError as e:
+            raise ValueError(f"{path} is neither JSON nor JSON Lines: {e}")
+    if not isinstance(raw_items, list):
+        raise ValueError(f"{path} must contain a list of questions")
+
+    documents = {}
+    items = []
+    for number, raw in enumerate(raw_items, 1):
+        if not raw.get('question') or not (raw.get('chunks') or raw.get('pages')):
+            raise ValueError(f"Item {number}: needs a question and expected chunks or pages")
+        reference = str(raw.get('document', ''))
+        if reference not in documents:
+            documents[reference] = _find_document(reference)
+        if documents[reference] is None:
+            raise ValueError(f"Item {number}: no document with id or title {reference!r}")
+        items.append({
+            'document': documents[reference],
+            'question': raw['question'],
+            'chunks': [int(c) for c in raw.get('chunks', [])],
+            'pages': [int(p) for p in raw.get('pages', [])],
+        })
+    return items
+
+
+def _find_document(reference):
+    try:
+        return PDFDocument.objects.get(pk=reference)
+    except (PDFDocument.DoesNotExist, ValidationError, ValueError):
+        return PDFDocument.objects.filter(title=reference).order_by('uploaded_at').first()
+
+
+def dump_question_set(items):
+    return [
+        {'document': str(item['document'].pk), 'question': item['question'],
+         'chunks': item['chunks'], 'pages': item['pages']}
+        for item in items
+    ]
+
+
+def synthetic_question_set(documents, per_document=20, seed=0, max_answers=3):
+    """
+    Ask about the three rarest words of randomly chosen chunks.
+
+    Every chunk containing all three words is an expected answer; chunks
+    whose words occur together in more than ``max_answers`` chunks (repeated
+    passages) are skipped as ambiguous.
+    """
+    rng = random.Random(seed)
+    items = []
+    for pdf_doc in documents:
+        chunks = list(get_chunk_store(pdf_doc))
+        words = [set(w.lower() for w in WORD_RE.findall(chunk.chunk_text)) for chunk in chunks]
+        frequency = Counter(word for chunk_words in words for word in chunk_words)
+        candidates = list(range(len(chunks)))
+        rng.shuffle(candidates)
+        asked = 0
+        for position in candidates:
+            if asked >= per_document:
+                break
+            rare = sorted(words[position], key=lambda w: (frequency[w], w))[:3]
+            if len(rare) < 3:
+                continue
+            answers = [chunks[i].chunk_index for i, chunk_words in enumerate(words) if chunk_words.issuperset(rare)]
+            if len(answers) > max_answers:
+                continue
+            items.append({
+                'document': pdf_doc,
+                'question': f"What does the document say about {' '.join(rare)}?",
+                'chunks': answers,
+                'pages': [],
+            })
+            asked += 1
+    return items
+
+
+def _relevant(hit, item):
+    return hit.chunk_index in item['chunks'] or (hit.page_number is not None and hit.page_number in item['pages'])
+
+
+def _recall(hits, item):
+    expected = {('chunk', c) for c in item['chunks']} | {('page', p) for p in item['pages']}
+    found = set()
+    for hit in hits:
+        if hit.chunk_index in item['chunks']:
+            found.add(('chunk', hit.chunk_index))
+        if hit.page_number in item['pages']:
+            found.add(('page', hit.page_number))
+    return len(found) / len(expected)
+
+
+def evaluate(items, engine_names, ks=(1, 3, 5)):
+    """Run every engine over every item; returns ``{engine: metrics}``"""
+    depth = max(ks)
+    results = {}
+    for name in engine_names:
+        engine_class = get_engine(name)
+        instances = {}
+        prepare = 0.0
+        latencies = []
+        recalls = {k: 0.0 for k in ks}
+        reciprocal_ranks = 0.0
+        try:
+            for item in items:
+                pdf_doc = item['document']
+                if pdf_doc.pk not in instances:
+                    start = time.perf_counter()
+                    instances[pdf_doc.pk] = engine_class(pdf_doc)
+                    prepare += time.perf_counter() - start
+                start = time.perf_counter()
+                hits = instances[pdf_doc.pk].search(item['question'], depth)
+                latencies.append(time.perf_counter() - start)
+
+                for k in ks:
+                    recalls[k] += _recall(hits[:k], item)
+                rank = next((i for i, hit in enumerate(hits, 1) if _relevant(hit, item)), None)
+                if rank:
+                    reciprocal_ranks += 1 / rank
+        except EngineUnavailable as e:
+            results[name] = {'unavailable': str(e)}
+            continue
+
+        count = len(items) or 1
+        latencies.sort()
+        results[name] = {
+            'queries': len(items),
+            **{f'recall@{k}': round(recalls[k] / count, 4) for k in ks},
+            'mrr': round(reciprocal_ranks / count, 4),
+            'latency_ms': {
+                'mean': round(sum(latencies) / count * 1000, 3),
+                'p50': round((percentile(latencies, 0.5) or 0) * 1000, 3),
+                'p95': round((percentile(latencies, 0.95) or 0) * 1000, 3),
+                'max': round((percentile(latencies, 1.0) or 0) * 1000, 3),
+            },
+            'prepare_ms': round(prepare * 1000, 3),
+        }
+    return results
@@ -0,0 +1,237 @@
+"""
+Sandboxed PDF text extraction.
+
+PyPDF2 runs in a child process with an address-space limit (RLIMIT_AS), so a
+decompression bomb or a pathological page cannot exhaust the web worker's
+memory or hang it. The child streams the text of each page back over a pipe.
+The parent enforces a per-page and a per-document wall-clock timeout. A page
+that hangs, runs out of memory or crashes the child is skipped and recorded,
+and a fresh child resumes at the next page.
+
+Limits come from the PDF_EXTRACTION_* settings. Each run produces an
+ExtractionResult whose ``report()`` is stored on the document.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from . import instrumentation
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Extra time a fresh worker gets to start up and open the document
+WORKER_START_TIMEOUT = 5.0
+
+
+class ExtractionResult:
+    """Text of the pages that could be extracted, and a record of those that could not"""
+
+    def __init__(self, path, limits):
+        self.path = path
+        self.limits = limits
+        self.page_total = None
+        self.pages = []  # (page_number, text), page numbers starting at 1
+        self.skipped = []  # {'page': n, 'reason': ...}
+        self.error = None
+        self.elapsed = 0.0
+
+    @property
+    def text(self):
+        return ' '.join(text for _, text in self.pages if text)
+
+    def skip(self, index, reason):
+        self.skipped.append({'page': index + 1, 'reason': reason})
+        instrumentation.increment('easylearning_page_errors_total')
+        logger.warning("Skipped page %d of %s: %s", index + 1, self.path, reason)
+
+    def report(self):
+        return {
+            'page_total': self.page_total or 0,
+            'pages_extracted': len(self.pages),
+            'skipped': self.skipped,
+            'error': self.error,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'limits': self.limits,
+        }
+
+
+def current_limits():
+    return {
+        'sandbox': getattr(settings, 'PDF_EXTRACTION_SANDBOX', True),
+        'page_timeout': getattr(settings, 'PDF_EXTRACTION_PAGE_TIMEOUT', 10.0),
+        'document_timeout': getattr(settings, 'PDF_EXTRACTION_DOCUMENT_TIMEOUT', 120.0),
+        'memory_limit_mb': getattr(settings, 'PDF_EXTRACTION_MEMORY_LIMIT_MB', 1024),
+    }
+
+
+# Child process
+
+def _iter_pages(path, start):
+    """Yield ('open', total), then ('page', i, text) or ('error', i, reason) per page"""
+    import PyPDF2
+    try:
+        reader = PyPDF2.PdfReader(path)
+        total = len(reader.pages)
+    except MemoryError:
+        yield ('failed', 'memory limit exceeded while opening')
+        return
+    except Exception as e:
+        yield ('failed', f'{type(e).__name__}: {e}')
+        return
+    yield ('open', total)
+    for index in range(start, total):
+        try:
+            yield ('page', index, reader.pages[index].extract_text() or '')
+        except MemoryError:
+            yield ('error', index, 'memory limit exceeded')
+        except Exception as e:
+            yield ('error', index, f'{type(e).__name__}: {e}')
+    yield ('done',)
+
+
+def _worker(path, start, conn, memory_limit_mb):
+    if resource is not None and memory_limit_mb:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    try:
+        for message in _iter_pages(path, start):
+            conn.send(message)
+    finally:
+        conn.close()
+
+
+# Parent process
+
+_last_lock = threading.Lock()
+_last = {'key': None, 'result': None}
+
+
+def extract_pages(path, reuse=True):
+    """
+    Extract the text of every page of the PDF at ``path`` within the configured limits.
+
+    The most recent result is reused while the file is unchanged, so the
+    summary and the chunks of a new upload share one extraction. Pass
+    ``reuse=False``, or call ``forget_extraction`` first, to extract again
+    regardless.
+    """
+    limits = current_limits()
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size, tuple(sorted(limits.items())))
+    if reuse:
+        with _last_lock:
+            if _last['key'] == key:
+                return _last['result']
+
+    result = ExtractionResult(path, limits)
+    start = time.monotonic()
+    if limits['sandbox']:
+        _collect(result, _sandboxed(result, limits))
+    else:
+        _collect(result, _iter_pages(path, 0))
+    result.elapsed = time.monotonic() - start
+    with _last_lock:
+        _last.update(key=key, result=result)
+    return result
+
+
+def forget_extraction(path):
+    """Drop the reusable result for ``path``, so the next extraction reads the file again"""
+    with _last_lock:
+        if _last['key'] is not None and _last['key'][0] == path:
+            _last.update(key=None, result=None)
+
+
+def _collect(result, messages):
+    """Apply worker messages to ``result``, timing the open and every page"""
+    last = time.monotonic()
+    for message in messages:
+        now = time.monotonic()
+        kind = message[0]
+        if kind == 'open':
+            result.page_total = message[1]
+            instrumentation.observe(instrumentation.STAGE_METRIC, now - last, stage='pdf_open')
+        elif kind == 'failed':
+            result.error = message[1]
+        elif kind == 'page':
+            _, index, text = message
+            result.pages.append((index + 1, text))
+            instrumentation.increment('easylearning_pages_extracted_total')
+            instrumentation.observe(instrumentation.STAGE_METRIC, now - last, stage='page_extraction')
+        elif kind == 'error':
+            result.skip(message[1], message[2])
+        last = now
+
+
+def _sandboxed(result, limits):
+    """Yield worker messages from child processes, skipping pages that break the limits"""
+    context = multiprocessing.get_context('spawn')
+    deadline = time.monotonic() + limits['document_timeout']
+    next_page = 0
+    while True:
+        parent_conn, child_conn = context.Pipe(duplex=False)
+        process = context.Process(
+            target=_worker, args=(result.path, next_page, child_conn, limits['memory_limit_mb']), daemon=True
+        )
+        process.start()
+        child_conn.close()
+        restart = False
+        opened = False
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                timeout = limits['page_timeout'] if opened else limits['page_timeout'] + WORKER_START_TIMEOUT
+                if remaining <= 0 or not parent_conn.poll(min(timeout, remaining)):
+                    document_expired = time.monotonic() >= deadline
+                    reason = 'document timeout' if document_expired else 'page timeout'
+                    if result.page_total is None:
+                        result.error = f'{reason} while opening'
+                    elif document_expired:
+                        for index in range(next_page, result.page_total):
+                            result.skip(index, reason)
+                    else:
+                        result.skip(next_page, reason)
+                        next_page += 1
+                        restart = True
+                    break
+                try:
+                    message = parent_conn.recv()
+                except EOFError:
+                    # The child died, most likely killed by the memory limit
+                    process.join(1)
+                    reason = f'worker exited with code {process.exitcode}'
+                    if result.page_total is None:
+                        result.error = reason
+                    else:
+                        result.skip(next_page, reason)
+                        next_page += 1
+                        restart = True
+                    break
+                
+                if message[0] == 'open':
+                    opened = True
+                    if result.page_total is not None:
+                        # A restarted worker reopening the document
+                        continue
+                yield message
+                if message[0] in ('page', 'error'):
+                    next_page = message[1] + 1
+                elif message[0] in ('failed', 'done'):
+                    break
+        finally:
+            parent_conn.close()
+            if process.is_alive():
+                process.kill()
+            process.join()
+        
+        if not restart or result.page_total is None or next_page >= result.page_total:
+            return
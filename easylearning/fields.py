@@ -0,0 +1,289 @@
+"""
+Custom model fields.
+
+CompressedTextField stores text as a zlib stream primed with a preset
+dictionary. The dictionary is trained from the corpus itself and kept in the
+CompressionDictionary table (see the ``train_compression_dictionary``
+command); a small built-in dictionary is used until one has been trained.
+The ORM still sees plain ``str`` values; compression happens when values are
+written and is undone when rows are loaded. On SQLite an
+``easylearning_inflate()`` SQL function is registered for every connection so
+pattern lookups (``contains``, ``icontains``, ...) used by admin search keep
+working against the compressed column. Those lookups, and the full-text index
+triggers built on the same function, are SQLite-only: other backends would
+need an equivalent server-side function before they can filter on the text.
+"""
+import struct
+import threading
+import zlib
+from itertools import zip_longest
+
+from django.db import DatabaseError, connection as default_connection, models
+from django.db.backends.signals import connection_created
+from django.db.models import lookups
+from django.dispatch import receiver
+
+# First byte of every stored value, so the format can evolve without
+# rewriting old rows.
+FORMAT_PLAIN = 0x00
+FORMAT_ZLIB = 0x01
+FORMAT_ZLIB_DICT_V1 = 0x02
+FORMAT_ZLIB_TRAINED = 0x03  # followed by a 4-byte CompressionDictionary id
+FORMAT_ZLIB_DICT_V2 = 0x04
+
+# Preset dictionaries are capped at the zlib window size
+MAX_DICTIONARY_SIZE = 32 * 1024
+
+# Values shorter than this are stored uncompressed; the zlib framing would
+# make them larger.
+MIN_COMPRESS_LENGTH = 64
+
+# Built-in fallback dictionary used until one is trained from the corpus:
+# common English words and phrases, nothing specific to any document. zlib
+# gives the strings nearest the end the shortest back-references, so the most
+# frequent come last. Stored values reference it, so it must never change.
+_DICTIONARY_V2 = ' '.join([
+    'however', 'through', 'between', 'without', 'against', 'another', 'because', 'before',
+    'something', 'together', 'important', 'different', 'following', 'example', 'number',
+    'people', 'little', 'place', 'world', 'great', 'small', 'found', 'thought', 'house',
+    'during', 'around', 'always', 'while', 'under', 'never', 'still', 'again', 'every',
+    'where', 'there', 'their', 'would', 'could', 'should', 'about', 'after', 'other',
+    'which', 'these', 'those', 'first', 'would be', 'into the', 'from the', 'with the',
+    'that the', 'for the', 'to the', 'on the', 'at the', 'was a', 'it was', 'he was',
+    'she was', 'they were', 'as the', 'and the', 'in the', 'of the', ' the ', ' and ',
+    ' of ', ' to ', ' in ', ' a ', '. The ',
+]).encode('utf-8')
+
+# The first built-in dictionary was drawn partly from a sample story. Nothing
+# is compressed with it any more; it is kept so rows written with it can
+# still be read; ``train_compression_dictionary --recompress`` rewrites them.
+_DICTIONARY_V1 = ' '.join([
+    'however', 'through', 'between', 'without', 'against', 'another', 'because', 'before',
+    'chapter', 'character', 'characters', 'document', 'information', 'something', 'together',
+    'village', 'warrior', 'shadow', 'shadows', 'moonlight', 'darkness', 'story', 'blade',
+    'answer', 'question', 'summary', 'section', 'example', 'important', 'different', 'during',
+    'around', 'always', 'while', 'under', 'never', 'still', 'again', 'every', 'where', 'there',
+    'their', 'would', 'could', 'should', 'about', 'after', 'other', 'which', 'these', 'those',
+    'first', 'would be', 'into the', 'from the', 'with the', 'that the', 'for the', 'to the',
+    'on the', 'at the', 'was a', 'it was', 'he was', 'she was', 'they were', 'as the',
+    'and the', 'in the', 'of the', ' the ', ' and ', ' of ', ' to ', ' in ', ' a ', '. The ',
+]).encode('utf-8')
+
+DICTIONARIES = {
+    FORMAT_ZLIB_DICT_V1: _DICTIONARY_V1,
+    FORMAT_ZLIB_DICT_V2: _DICTIONARY_V2,
+}
+
+_trained_lock = threading.Lock()
+_trained = {'loaded': False, 'active': None, 'dictionaries': {}}
+
+
+def _load_trained_dictionaries():
+    """Read every trained dictionary into the process-wide registry"""
+    try:
+        with default_connection.cursor() as cursor:
+            cursor.execute('SELECT id, data FROM easylearning_compressiondictionary ORDER BY id')
+            rows = cursor.fetchall()
+    except DatabaseError:
+        # Table not migrated yet
+        rows = []
+    with _trained_lock:
+        _trained['dictionaries'] = {row[0]: bytes(row[1]) for row in rows}
+        _trained['active'] = rows[-1][0] if rows else None
+        _trained['loaded'] = True
+
+
+def reset_dictionary_cache():
+    """Forget loaded dictionaries, e.g. after training a new one"""
+    with _trained_lock:
+        _trained['loaded'] = False
+
+
+def active_dictionary():
+    """Return ``(id, data)`` of the newest trained dictionary, or None"""
+    if not _trained['loaded']:
+        _load_trained_dictionaries()
+    active = _trained['active']
+    if active is None:
+        return None
+    return active, _trained['dictionaries'][active]
+
+
+def trained_dictionary(dictionary_id):
+    data = _trained['dictionaries'].get(dictionary_id)
+    if data is None:
+        # Trained by another process since we last looked
+        _load_trained_dictionaries()
+        data = _trained['dictionaries'].get(dictionary_id)
+    if data is None:
+        raise ValueError(f"Compression dictionary {dictionary_id} does not exist")
+    return data
+
+
+def build_dictionary(samples, size=MAX_DICTIONARY_SIZE):
+    """
+    Build a preset dictionary from sample texts.
+
+    Samples are packed until ``size`` bytes are filled, with the earliest
+    (most representative) samples placed last where zlib reaches them most
+    cheaply.
+    """
+    parts = []
+    total = 0
+    for text in samples:
+        data = text.encode('utf-8')
+        if total + len(data) > size:
+            data = data[:size - total]
+        parts.append(data)
+        total += len(data)
+        if total >= size:
+            break
+    return b' '.join(reversed(parts))[-size:]
+
+
+def compressed_fields(models_iterable):
+    """Yield ``(model, field_name)`` for every CompressedTextField in ``models_iterable``"""
+    for model in models_iterable:
+        for field in model._meta.concrete_fields:
+            if isinstance(field, CompressedTextField):
+                yield model, field.name
+
+
+def train_dictionary(dictionary_model, sources, samples_per_source=200, size=MAX_DICTIONARY_SIZE):
+    """
+    Train and save a new preset dictionary from random rows of ``sources``.
+
+    ``sources`` is a list of ``(model, field_name)`` pairs. Samples from the
+    sources are interleaved so every field is represented. Returns the new
+    dictionary, or None when there is no text to learn from.
+    """
+    per_source = [
+        [text for text in model._default_manager.order_by('?').values_list(field_name, flat=True)[:samples_per_source] if text]
+        for model, field_name in sources
+    ]
+    samples = [text for group in zip_longest(*per_source) for text in group if text]
+    if not samples:
+        return None
+    dictionary = dictionary_model._default_manager.create(
+        data=build_dictionary(samples, size), sample_count=len(samples)
+    )
+    reset_dictionary_cache()
+    return dictionary
+
+
+def recompress_rows(model, field_name, batch_size=500):
+    """
+    Rewrite every value of ``field_name`` with the active dictionary.
+
+    Rows are walked in primary-key order in fixed-size batches, so memory use
+    stays flat and the table is never read while it is being written.
+    """
+    rewritten = 0
+    last_pk = None
+    while True:
+        batch = model._default_manager.order_by('pk').only('pk', field_name)
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        rows = list(batch[:batch_size])
+        if not rows:
+            return rewritten
+        model._default_manager.bulk_update(rows, [field_name])
+        rewritten += len(rows)
+        last_pk = rows[-1].pk
+
+
+def _deflate(data, zdict):
+    compressor = zlib.compressobj(level=9, wbits=-15, zdict=zdict)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _inflate(payload, zdict):
+    decompressor = zlib.decompressobj(wbits=-15, zdict=zdict)
+    return decompressor.decompress(payload) + decompressor.flush()
+
+
+def compress_text(text):
+    """Encode ``text`` into the stored byte format"""
+    data = text.encode('utf-8')
+    if len(data) < MIN_COMPRESS_LENGTH:
+        return bytes([FORMAT_PLAIN]) + data
+    trained = active_dictionary()
+    if trained is not None:
+        dictionary_id, zdict = trained
+        header = bytes([FORMAT_ZLIB_TRAINED]) + struct.pack('>I', dictionary_id)
+    else:
+        zdict = DICTIONARIES[FORMAT_ZLIB_DICT_V2]
+        header = bytes([FORMAT_ZLIB_DICT_V2])
+    packed = _deflate(data, zdict)
+    if len(header) + len(packed) >= len(data) + 1:
+        return bytes([FORMAT_PLAIN]) + data
+    return header + packed
+
+
+def decompress_text(value):
+    """Decode a stored value back into ``str``; legacy text rows pass through"""
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    if not value:
+        return ''
+    fmt, payload = value[0], value[1:]
+    if fmt == FORMAT_PLAIN:
+        return payload.decode('utf-8')
+    if fmt == FORMAT_ZLIB:
+        return zlib.decompress(payload, wbits=-15).decode('utf-8')
+    if fmt == FORMAT_ZLIB_TRAINED:
+        (dictionary_id,) = struct.unpack('>I', payload[:4])
+        return _inflate(payload[4:], trained_dictionary(dictionary_id)).decode('utf-8')
+    if fmt in DICTIONARIES:
+        return _inflate(payload, DICTIONARIES[fmt]).decode('utf-8')
+    raise ValueError(f"Unknown compressed text format: {fmt:#04x}")
+
+
+class CompressedTextField(models.TextField):
+    """A TextField stored as a compressed BLOB"""
+    description = "Compressed text"
+
+    def get_internal_type(self):
+        return 'BinaryField'
+
+    def from_db_value(self, value, expression, connection):
+        return decompress_text(value)
+
+    def to_python(self, value):
+        if isinstance(value, (bytes, memoryview)):
+            return decompress_text(value)
+        return super().to_python(value)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = super().get_db_prep_value(value, connection, prepared)
+        if value is None:
+            return None
+        return connection.Database.Binary(compress_text(value))
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+
+class InflatedLhsMixin:
+    """Run pattern lookups against the decompressed column text"""
+    def process_lhs(self, compiler, connection, lhs=None):
+        sql, params = super().process_lhs(compiler, connection, lhs)
+        return f'easylearning_inflate({sql})', params
+
+
+for lookup_class in (
+    lookups.Contains, lookups.IContains, lookups.StartsWith, lookups.IStartsWith,
+    lookups.EndsWith, lookups.IEndsWith,
+):
+    CompressedTextField.register_lookup(
+        type(lookup_class.__name__, (InflatedLhsMixin, lookup_class), {})
+    )
+
+
+@receiver(connection_created)
+def register_sql_functions(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function(
+            'easylearning_inflate', 1, decompress_text, deterministic=True
+        )
@@ -1,5 +1,11 @@
+import logging
+
 from django import forms
 from .models import PDFDocument, Question, ConversationThread
+from .preflight import PreflightError, preflight
+
+
+logger = logging.getLogger(__name__)
 
 
 class PDFUploadForm(forms.ModelForm):
@@ -20,37 +26,46 @@ class PDFUploadForm(forms.ModelForm):
     
     def clean_file(self):
         file = self.cleaned_data.get('file')
-        print(f"Form clean_file called with: {file}")
-        
         if not file:
-            print("No file provided in form")
             raise forms.ValidationError("Please select a PDF file to upload.")
         
         if not file.name:
-            print("File has no name")
             raise forms.ValidationError("Invalid file selected.")
         
         if not file.name.endswith('.pdf'):
-            print(f"File type not PDF: {file.name}")
+            logger.info("Rejected upload, not a PDF: %s", file.name)
             raise forms.ValidationError("Only PDF files are allowed.")
         
         if file.size == 0:
-            print("File is empty")
             raise forms.ValidationError("The selected file is empty.")
         
         if file.size > 10 * 1024 * 1024:  # 10MB limit
-            print(f"File too large: {file.size} bytes")
+            logger.info("Rejected upload, too large: %s bytes", file.size)
             raise forms.ValidationError("File size must be under 10MB.")
         
-        print(f"File validation passed: {file.name}, size: {file.size} bytes")
+        # Check the file's structure before anything is saved or parsed
+        try:
+            info = preflight(file, file.size)
+        except PreflightError as e:
+            logger.info("Rejected upload %s in preflight: %s", file.name, e.reason)
+            raise forms.ValidationError(str(e))
+        logger.debug("Preflight passed: PDF %s, %s pages", info['version'], info['pages'] or 'unknown')
+        
+        logger.debug("File validation passed: %s, size: %s bytes", file.name, file.size)
         return file
     
     def clean(self):
         cleaned_data = super().clean()
-        print(f"Form clean method - cleaned_data: {cleaned_data}")
+        logger.debug("Upload form cleaned_data: %s", cleaned_data)
         return cleaned_data
 
 
+class PDFReplaceForm(PDFUploadForm):
+    """Form for uploading a revised edition of an existing PDF document"""
+    class Meta(PDFUploadForm.Meta):
+        fields = ['file']
+
+
 class QuestionForm(forms.ModelForm):
     """Form for asking questions"""
     class Meta:
@@ -0,0 +1,389 @@
+"""
+PDF ingestion: summaries and chunking of uploaded documents.
+
+Summaries are extractive, built per section and then for the whole document
+(see ``summarisation``); the section summaries are stored as well.
+
+Imported on first use by the upload view and the maintenance jobs, so web
+workers and management commands that never ingest a PDF do not load the
+extraction machinery.
+
+The text of every page is stored with the chunks, with a hash of it. When a document's
+file is replaced (``replace_document_file``) only the pages whose hash
+changed are re-chunked and re-indexed; the document, its threads and the
+chunks of unchanged pages are kept.
+
+Once a document has chunks and section summaries, answers to its most common
+questions are computed in every language and stored for its chunk version
+(``save_canonical_answers``).
+"""
+import hashlib
+import logging
+import os
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import instrumentation
+from .chunkstore import chunk_store_path, get_chunk_store, write_chunk_store
+from .extraction import extract_pages
+from .models import CanonicalAnswer, PDFChunk, PDFDocument, PDFPage, PDFSummary, Question, SectionSummary
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionError(Exception):
+    """A file could not be ingested; the document is unchanged"""
+
+def generate_pdf_summary(pdf_path, pdf_doc=None):
+    """
+    Generate summary from PDF text.
+    
+    When ``pdf_doc`` is given its section summaries are replaced as well.
+    """
+    try:
+        # Check if file exists and is accessible
+        if not os.path.exists(pdf_path):
+            return "Error reading PDF: File not found"
+        
+        file_size = os.path.getsize(pdf_path)
+        if file_size == 0:
+            return "Error reading PDF: File is empty"
+        
+        logger.debug("Processing PDF: %s (size: %s bytes)", pdf_path, file_size)
+        
+        result = extract_pages(pdf_path)
+        if result.error:
+            return f"Error reading PDF: {result.error}"
+        if not result.page_total:
+            return "Error reading PDF: No pages found"
+        
+        with instrumentation.timer('summarisation'):
+            summary, sections = summarise_pages(result.pages)
+        if not sections:
+            return "Error reading PDF: No text content found"
+        
+        logger.debug("Summarised %d sections of %s", len(sections), pdf_path)
+        if pdf_doc is not None:
+            save_section_summaries(pdf_doc, sections)
+        
+        return summary if summary else "Summary could not be generated."
+        
+    except Exception as e:
+        logger.exception("PDF summary generation error for %s", pdf_path)
+        return f"Error reading PDF: {str(e)}"
+
+
+def summarise_pages(pages):
+    """Summarise ``(page_number, text)`` pairs with the SUMMARY_* settings (see ``summarisation``)"""
+    from .summarisation import summarise
+    return summarise(
+        pages,
+        sentences=getattr(settings, 'SUMMARY_SENTENCES', 5),
+        section_sentences=getattr(settings, 'SUMMARY_SECTION_SENTENCES', 3),
+        section_pages=getattr(settings, 'SUMMARY_SECTION_PAGES', 10),
+        workers=getattr(settings, 'SUMMARY_WORKERS', 0),
+    )
+
+
+def save_section_summaries(pdf_doc, sections):
+    """Replace the section summaries of ``pdf_doc`` with ``(section, summary_text)`` pairs"""
+    with transaction.atomic():
+        SectionSummary.objects.filter(pdf_document=pdf_doc).delete()
+        SectionSummary.objects.bulk_create(
+            SectionSummary(
+                pdf_document=pdf_doc, position=position, title=section.title,
+                first_page=section.first_page, last_page=section.last_page, summary_text=summary_text,
+            )
+            for position, (section, summary_text) in enumerate(sections)
+        )
+
+
+def save_canonical_answers(pdf_doc):
+    """
+    Replace the canonical answers of ``pdf_doc`` with ones for its current chunks.
+    
+    Every answer is stored in every language. Returns the number of rows
+    written; failures are logged, and questions are then answered from the
+    chunks as usual.
+    """
+    if not getattr(settings, 'CANONICAL_ANSWERS', True):
+        return 0
+    from .answering import canonical_answers
+    from .translation import translate_answer
+    try:
+        # A savepoint, so a failure here leaves a surrounding transaction usable
+        with transaction.atomic(), instrumentation.timer('canonical_answers'):
+            pdf_doc.refresh_from_db(fields=['chunk_version'])
+            rows = [
+                CanonicalAnswer(
+                    pdf_document=pdf_doc, kind=kind, chapter=chapter, language=language,
+                    chunk_version=pdf_doc.chunk_version, answer_text=translate_answer(answer_text, language),
+                    confidence_score=confidence,
+                )
+                for kind, chapter, answer_text, confidence in canonical_answers(pdf_doc)
+                for language, _ in Question.LANGUAGE_CHOICES
+            ]
+            CanonicalAnswer.objects.filter(pdf_document=pdf_doc).delete()
+            CanonicalAnswer.objects.bulk_create(rows, batch_size=500)
+    except Exception:
+        logger.exception("Could not store canonical answers for %s", pdf_doc.pk)
+        return 0
+    logger.debug("Stored %d canonical answers for %s", len(rows), pdf_doc.pk)
+    return len(rows)
+
+
+def create_pdf_chunks(pdf_doc):
+    """Create text chunks from PDF for better search"""
+    try:
+        chunk_document(pdf_doc)
+    except IngestionError as e:
+        logger.warning("Could not chunk PDF %s: %s", pdf_doc.title, e)
+    except Exception:
+        logger.exception("Error creating chunks for PDF %s", pdf_doc.title)
+        # Don't raise the exception - just log it
+
+
+def chunk_document(pdf_doc):
+    """
+    Extract and store the chunks, pages and canonical answers of ``pdf_doc``; returns the number of chunks.
+    
+    Raises IngestionError when the file is missing or cannot be read. The
+    caller deletes any previous chunks first, in the same transaction.
+    """
+    if not pdf_doc.file:
+        raise IngestionError("Document has no file")
+    
+    file_path = pdf_doc.file.path
+    if not os.path.exists(file_path):
+        raise IngestionError(f"PDF file not found: {file_path}")
+    
+    logger.debug("Creating chunks for PDF: %s at %s", pdf_doc.title, file_path)
+    
+    result = extract_pages(file_path)
+    pdf_doc.extraction_report = result.report()
+    PDFDocument.objects.filter(pk=pdf_doc.pk).update(extraction_report=pdf_doc.extraction_report)
+    if result.error:
+        raise IngestionError(f"Could not extract the PDF: {result.error}")
+    if not result.page_total:
+        raise IngestionError("No pages found in the PDF")
+    
+    chunks = split_into_chunks(pdf_doc, result.pages)
+    save_chunks(pdf_doc, chunks, result.page_total)
+    save_pages(pdf_doc, result.pages)
+    save_canonical_answers(pdf_doc)
+    
+    logger.info("Created %d chunks for PDF %s", len(chunks), pdf_doc.title)
+    return len(chunks)
+
+
+def split_into_chunks(pdf_doc, pages):
+    """Split (page_number, text) pairs into unsaved PDFChunks of about three sentences"""
+    chunks = []
+    for page_number, text in pages:
+        try:
+            if not text.strip():
+                continue
+            
+            # Clean the text
+            text = text.strip()
+            # Remove excessive whitespace
+            text = ' '.join(text.split())
+            
+            # Split into sentences for better chunking
+            sentences = text.split('. ')
+            
+            current_chunk = ""
+            sentence_count = 0
+            
+            for sentence in sentences:
+                sentence = sentence.strip()
+                if not sentence:
+                    continue
+                
+                # Add sentence to current chunk
+                if current_chunk:
+                    current_chunk += ". " + sentence
+                else:
+                    current_chunk = sentence
+                
+                sentence_count += 1
+                
+                # Create chunk when we have enough sentences or reach character limit
+                if sentence_count >= 3 or len(current_chunk) >= 300:
+                    if current_chunk.strip():
+                        chunks.append(PDFChunk(
+                            pdf_document=pdf_doc,
+                            chunk_text=current_chunk.strip(),
+                            chunk_index=len(chunks),
+                            page_number=page_number
+                        ))
+                    
+                    # Reset for next chunk
+                    current_chunk = ""
+                    sentence_count = 0
+            
+            # Don't forget the last chunk if it has content
+            if current_chunk.strip():
+                chunks.append(PDFChunk(
+                    pdf_document=pdf_doc,
+                    chunk_text=current_chunk.strip(),
+                    chunk_index=len(chunks),
+                    page_number=page_number
+                ))
+                    
+        except Exception as e:
+            instrumentation.increment('easylearning_page_errors_total')
+            logger.warning("Error processing page %d of %s: %s", page_number, pdf_doc.id, e)
+            continue
+    
+    return chunks
+
+
+def save_chunks(pdf_doc, chunks, page_total):
+    """
+    Write a new chunk set, bump the chunk version and rebuild the chunk store.
+    
+    The store file is written once the surrounding transaction commits, so
+    a rollback leaves the previous file matching the previous rows.
+    """
+    with instrumentation.timer('chunk_write'):
+        PDFChunk.objects.bulk_create(chunks, batch_size=500)
+        PDFDocument.objects.filter(pk=pdf_doc.pk).update(
+            chunk_version=F('chunk_version') + 1,
+            chunk_count=len(chunks),
+            page_count=page_total,
+            text_chars=sum(len(c.chunk_text) for c in chunks),
+        )
+        pdf_doc.refresh_from_db(fields=['chunk_version'])
+        rows = [(c.chunk_text, c.chunk_index, c.page_number) for c in chunks]
+        transaction.on_commit(lambda: write_chunk_store(pdf_doc, rows))
+    instrumentation.increment('easylearning_chunks_written_total', len(chunks))
+
+
+def page_hash(text):
+    """SHA-256 of a page's text with whitespace normalised, as chunking sees it"""
+    return hashlib.sha256(' '.join(text.split()).encode('utf-8')).hexdigest()
+
+
+def save_pages(pdf_doc, pages):
+    """Replace the stored pages of ``pdf_doc`` with ``(page_number, text)`` pairs"""
+    PDFPage.objects.filter(pdf_document=pdf_doc).delete()
+    PDFPage.objects.bulk_create(
+        (PDFPage(pdf_document=pdf_doc, page_number=number, text=text, text_hash=page_hash(text)) for number, text in pages),
+        batch_size=500,
+    )
+
+
+def replace_document_file(pdf_doc, uploaded_file):
+    """
+    Replace the PDF behind ``pdf_doc`` with ``uploaded_file``, re-chunking only changed pages.
+    
+    Pages are compared by text hash. Chunks of changed and removed pages are
+    deleted, the changed pages are chunked again, and the chunk indexes of the
+    whole document are renumbered in page order in the same transaction.
+    Documents ingested before page hashes were stored are re-chunked in full.
+    Returns a dict of what changed; raises IngestionError, leaving the
+    document as it was, when the new file cannot be read.
+    """
+    storage = pdf_doc.file.storage
+    old_name = pdf_doc.file.name
+    old_store = chunk_store_path(pdf_doc)
+    new_name = storage.save(pdf_doc.file.field.generate_filename(pdf_doc, uploaded_file.name), uploaded_file)
+    
+    try:
+        result = extract_pages(storage.path(new_name))
+        if result.error:
+            raise IngestionError(f"Could not read the new file: {result.error}")
+        if not result.page_total:
+            raise IngestionError("The new file has no pages")
+        with instrumentation.timer('chunk_write'):
+            report = _apply_page_changes(pdf_doc, new_name, result)
+    except BaseException:
+        storage.delete(new_name)
+        raise
+    
+    # Build the store for the new file and drop the old file and its store
+    pdf_doc.refresh_from_db()
+    get_chunk_store(pdf_doc)
+    if old_name and old_name != new_name:
+        storage.delete(old_name)
+        if old_store and os.path.exists(old_store):
+            os.remove(old_store)
+    
+    summary_text = generate_pdf_summary(storage.path(new_name), pdf_doc)
+    if summary_text and not summary_text.startswith("Error reading PDF"):
+        PDFSummary.objects.update_or_create(
+            pdf_document=pdf_doc, defaults={'summary_text': summary_text, 'generated_at': timezone.now()}
+        )
+    save_canonical_answers(pdf_doc)
+    
+    logger.info(
+        "Replaced file of %s: %d of %d pages changed, %d removed",
+        pdf_doc.pk, len(report['changed_pages']), report['pages'], len(report['removed_pages']),
+    )
+    return report
+
+
+def _apply_page_changes(pdf_doc, new_name, result):
+    texts = dict(result.pages)
+    hashes = {number: page_hash(text) for number, text in result.pages}
+    
+    with transaction.atomic():
+        pdf_doc = PDFDocument.objects.select_for_update().get(pk=pdf_doc.pk)
+        stored = dict(pdf_doc.pages.values_list('page_number', 'text_hash'))
+        changed = sorted(number for number, digest in hashes.items() if stored.get(number) != digest)
+        removed = sorted(set(stored) - set(hashes))
+        
+        stale = PDFChunk.objects.filter(pdf_document=pdf_doc)
+        if stored:
+            stale = stale.filter(Q(page_number__in=changed + removed) | Q(page_number__isnull=True))
+        stale_chars = sum(len(text) for text in stale.values_list('chunk_text', flat=True))
+        deleted, _ = stale.delete()
+        fresh = split_into_chunks(pdf_doc, [(number, texts[number]) for number in changed])
+        
+        # Order kept and new chunks by page, then by their position on the page
+        kept = PDFChunk.objects.filter(pdf_document=pdf_doc).values_list('pk', 'page_number', 'chunk_index')
+        ordered = sorted(
+            [(page, index, pk) for pk, page, index in kept] +
+            [(chunk.page_number, position, chunk) for position, chunk in enumerate(fresh)],
+            key=lambda entry: entry[:2],
+        )
+        moves = []
+        for new_index, (_, old_index, item) in enumerate(ordered):
+            if isinstance(item, PDFChunk):
+                item.chunk_index = new_index
+            elif old_index != new_index:
+                # Parked at a negative index first so no two rows share one
+                moves.append(PDFChunk(pk=item, chunk_index=-new_index - 1))
+        PDFChunk.objects.bulk_update(moves, ['chunk_index'], batch_size=500)
+        PDFChunk.objects.filter(pdf_document=pdf_doc, chunk_index__lt=0).update(chunk_index=-F('chunk_index') - 1)
+        PDFChunk.objects.bulk_create(fresh, batch_size=500)
+        
+        PDFPage.objects.filter(pdf_document=pdf_doc, page_number__in=changed + removed).delete()
+        PDFPage.objects.bulk_create(
+            [PDFPage(pdf_document=pdf_doc, page_number=number, text=texts[number], text_hash=hashes[number])
+             for number in changed],
+            batch_size=500,
+        )
+        PDFDocument.objects.filter(pk=pdf_doc.pk).update(
+            file=new_name,
+            chunk_version=F('chunk_version') + 1,
+            chunk_count=len(ordered),
+            page_count=result.page_total,
+            text_chars=F('text_chars') - stale_chars + sum(len(c.chunk_text) for c in fresh),
+            extraction_report=result.report(),
+        )
+    
+    instrumentation.increment('easylearning_chunks_written_total', len(fresh))
+    return {
+        'pages': result.page_total,
+        'changed_pages': changed,
+        'removed_pages': removed,
+        'chunks_deleted': deleted,
+        'chunks_created': len(fresh),
+        'chunks_renumbered': len(moves),
+    }
+
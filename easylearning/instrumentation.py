@@ -0,0 +1,217 @@
+"""
+Lightweight timers and counters for the ingestion and Q&A pipelines.
+
+Observations are aggregated in-process and flushed periodically into a small
+SQLite file shared by every worker, so the ``/metrics`` endpoint reports
+totals across the whole deployment in Prometheus text format.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Pipeline stages timed through ``timer()``
+STAGES = (
+    'pdf_open',
+    'page_extraction',
+    'summarisation',
+    'chunk_write',
+    'question_analysis',
+    'scoring',
+    'selection',
+    'translation',
+    'admission_wait',
+)
+
+INF_LABEL = 'le="+Inf"'
+
+STAGE_METRIC = 'easylearning_stage_duration_seconds'
+
+HELP_TEXT = {
+    STAGE_METRIC: 'Wall-clock time spent in each pipeline stage.',
+    'easylearning_pages_extracted_total': 'PDF pages whose text was extracted.',
+    'easylearning_page_errors_total': 'PDF pages that failed text extraction.',
+    'easylearning_chunks_written_total': 'Text chunks written to the database.',
+    'easylearning_questions_answered_total': 'Questions answered, by primary question type.',
+    'easylearning_uploads_total': 'PDF uploads, by outcome.',
+    'easylearning_preflight_rejections_total': 'Uploads rejected by the PDF preflight checks, by reason.',
+    'easylearning_admission_rejections_total': 'Questions turned away by admission control, by reason.',
+    'easylearning_coalesced_questions_total': 'Questions answered from an identical in-flight computation, by scope.',
+    'easylearning_warmed_answers_total': 'Questions answered from the answers stored by a cache warm-up.',
+    'easylearning_canonical_answers_total': 'Questions answered from the answers computed at ingestion, by kind.',
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_last_flush = 0.0
+
+
+def metrics_enabled():
+    return getattr(settings, 'METRICS_ENABLED', True)
+
+
+def _label_key(labels):
+    return ','.join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+
+
+def increment(name, amount=1, **labels):
+    """Add ``amount`` to a counter."""
+    if not metrics_enabled():
+        return
+    key = (name, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+    _maybe_flush()
+
+
+def observe(name, value, **labels):
+    """Record one observation in a histogram."""
+    if not metrics_enabled():
+        return
+    key = (name, _label_key(labels))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * len(DEFAULT_BUCKETS) + [0, 0.0]
+        for i, bound in enumerate(DEFAULT_BUCKETS):
+            if value <= bound:
+                hist[i] += 1
+                break
+        hist[-2] += 1
+        hist[-1] += value
+    _maybe_flush()
+
+
+@contextmanager
+def timer(stage, **labels):
+    """Time a block of code as one pipeline stage."""
+    if not metrics_enabled():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(STAGE_METRIC, time.perf_counter() - start, stage=stage, **labels)
+
+
+# Shared store
+
+def _store_path():
+    return str(getattr(settings, 'METRICS_STORE_PATH', os.path.join(settings.BASE_DIR, 'metrics.sqlite3')))
+
+
+def _connect():
+    conn = sqlite3.connect(_store_path(), timeout=5)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS metric ('
+        ' name TEXT NOT NULL, labels TEXT NOT NULL, kind TEXT NOT NULL,'
+        ' slot INTEGER NOT NULL, value REAL NOT NULL,'
+        ' PRIMARY KEY (name, labels, slot))'
+    )
+    return conn
+
+
+def _maybe_flush():
+    interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5.0)
+    if time.monotonic() - _last_flush >= interval:
+        flush()
+
+
+def flush():
+    """Merge the in-process deltas into the shared store."""
+    global _last_flush
+    with _lock:
+        counters, histograms = dict(_counters), {k: list(v) for k, v in _histograms.items()}
+        _counters.clear()
+        _histograms.clear()
+        _last_flush = time.monotonic()
+
+    if not counters and not histograms:
+        return
+
+    rows = []
+    for (name, labels), value in counters.items():
+        rows.append((name, labels, 'counter', 0, value))
+    for (name, labels), hist in histograms.items():
+        for slot, value in enumerate(hist):
+            if value:
+                rows.append((name, labels, 'histogram', slot, value))
+
+    try:
+        conn = _connect()
+        try:
+            with conn:
+                conn.executemany(
+                    'INSERT INTO metric (name, labels, kind, slot, value) VALUES (?, ?, ?, ?, ?) '
+                    'ON CONFLICT (name, labels, slot) DO UPDATE SET value = value + excluded.value',
+                    rows,
+                )
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        logger.warning('Could not flush metrics to %s', _store_path(), exc_info=True)
+
+
+def render_prometheus():
+    """Return every stored metric in the Prometheus text exposition format."""
+    flush()
+    try:
+        conn = _connect()
+        try:
+            rows = conn.execute(
+                'SELECT name, labels, kind, slot, value FROM metric ORDER BY name, labels, slot'
+            ).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        logger.warning('Could not read metrics from %s', _store_path(), exc_info=True)
+        rows = []
+
+    series = {}
+    kinds = {}
+    for name, labels, kind, slot, value in rows:
+        kinds[name] = kind
+        series.setdefault(name, {}).setdefault(labels, {})[slot] = value
+
+    lines = []
+    for name in sorted(series):
+        kind = kinds[name]
+        if name in HELP_TEXT:
+            lines.append(f'# HELP {name} {HELP_TEXT[name]}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, slots in series[name].items():
+            if kind == 'counter':
+                lines.append(f'{name}{_braces(labels)} {_fmt(slots.get(0, 0))}')
+                continue
+            cumulative = 0
+            for i, bound in enumerate(DEFAULT_BUCKETS):
+                cumulative += slots.get(i, 0)
+                le = 'le="%s"' % bound
+                lines.append(f'{name}_bucket{_braces(labels, le)} {_fmt(cumulative)}')
+            count = slots.get(len(DEFAULT_BUCKETS), 0)
+            lines.append(f'{name}_bucket{_braces(labels, INF_LABEL)} {_fmt(count)}')
+            lines.append(f'{name}_sum{_braces(labels)} {_fmt(slots.get(len(DEFAULT_BUCKETS) + 1, 0.0))}')
+            lines.append(f'{name}_count{_braces(labels)} {_fmt(count)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _braces(labels, extra=''):
+    parts = ','.join(p for p in (labels, extra) if p)
+    return '{' + parts + '}' if parts else ''
+
+
+def _fmt(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
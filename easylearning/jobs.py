@@ -0,0 +1,238 @@
+"""
+Background maintenance jobs.
+
+Admin actions queue MaintenanceJob rows; a small thread pool in the web
+process (or the ``run_maintenance_jobs`` command, when
+MAINTENANCE_JOBS_IN_PROCESS is off) picks them up oldest first. Two limits
+keep bulk work from starving live requests: each process runs at most
+MAINTENANCE_JOB_WORKERS jobs, and a job is only claimed while fewer than
+MAINTENANCE_JOB_MAX_RUNNING jobs are running across all processes. Worker
+threads also lower their own scheduling priority where the OS allows it.
+
+A job still marked running MAINTENANCE_JOB_TIMEOUT seconds after it started
+is taken to have lost its worker (a killed process or a restart) and is
+failed, so it no longer holds one of the running slots.
+Jobs still queued when a process stopped are picked up when a web process
+starts, or when the job list is opened in the admin.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import Count, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .chunkstore import delete_chunk_store, get_chunk_store
+from .models import MaintenanceJob, PDFChunk, PDFSummary
+from .search import ensure_search_index
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+class JobError(Exception):
+    """A maintenance step could not be completed"""
+
+
+def enqueue(documents, kind, user=None):
+    """Queue a ``kind`` job for each document without one already pending; returns the new jobs"""
+    pending = set(MaintenanceJob.objects.filter(
+        pdf_document__in=documents, kind=kind, status__in=ACTIVE_STATUSES
+    ).values_list('pdf_document_id', flat=True))
+    jobs = MaintenanceJob.objects.bulk_create([
+        MaintenanceJob(pdf_document=pdf_doc, kind=kind, created_by=user)
+        for pdf_doc in documents if pdf_doc.pk not in pending
+    ])
+    if jobs:
+        transaction.on_commit(start_worker)
+    return jobs
+
+
+def start_worker():
+    """Have the in-process pool run whatever jobs are queued, unless jobs run elsewhere"""
+    if getattr(settings, 'MAINTENANCE_JOBS_IN_PROCESS', True):
+        _executor().submit(_run_in_thread)
+
+
+def fail_stale_jobs():
+    """Fail running jobs older than MAINTENANCE_JOB_TIMEOUT; returns the number failed"""
+    timeout = getattr(settings, 'MAINTENANCE_JOB_TIMEOUT', 3600)
+    now = timezone.now()
+    failed = MaintenanceJob.objects.filter(
+        status='running', started_at__lt=now - timedelta(seconds=timeout)
+    ).update(
+        status='failed', finished_at=now,
+        message=f"Did not finish within {timeout} seconds; its worker probably stopped",
+    )
+    if failed:
+        logger.warning("Failed %d maintenance jobs that stopped running", failed)
+    return failed
+
+
+def claim_next():
+    """Mark the oldest queued job as running if the global limit allows; returns it or None"""
+    fail_stale_jobs()
+    limit = getattr(settings, 'MAINTENANCE_JOB_MAX_RUNNING', 1)
+    running = MaintenanceJob.objects.filter(status='running').order_by().values('status').annotate(
+        total=Count('pk')
+    ).values('total')
+    while True:
+        job = MaintenanceJob.objects.filter(status='queued').order_by('created_at').first()
+        if job is None:
+            return None
+        claimed = MaintenanceJob.objects.filter(pk=job.pk, status='queued').annotate(
+            running=Coalesce(Subquery(running), 0)
+        ).filter(running__lt=limit).update(status='running', started_at=timezone.now())
+        if claimed:
+            job.refresh_from_db()
+            return job
+        if MaintenanceJob.objects.filter(status='running').count() >= limit:
+            return None
+        # Another worker claimed this one first; try the next
+
+
+def run_pending():
+    """Run queued jobs until none can be claimed; returns the number run"""
+    count = 0
+    while True:
+        job = claim_next()
+        if job is None:
+            return count
+        run_job(job)
+        count += 1
+
+
+def run_job(job):
+    step = STEPS[job.kind]
+    try:
+        message = step(job) or ''
+    except Exception as e:
+        logger.exception("Maintenance job %s (%s) failed", job.pk, job.kind)
+        _update(job, status='failed', message=str(e), finished_at=timezone.now())
+    else:
+        _update(job, status='succeeded', progress=100, message=message, finished_at=timezone.now())
+
+
+def _update(job, **fields):
+    for name, value in fields.items():
+        setattr(job, name, value)
+    MaintenanceJob.objects.filter(pk=job.pk).update(**fields)
+
+
+# Steps
+
+def _read_file_again(pdf_doc):
+    """Make the next extraction of the document's file skip the reusable result of an earlier one"""
+    from .extraction import forget_extraction
+    if pdf_doc.file:
+        forget_extraction(pdf_doc.file.path)
+
+
+def _resummarise(job, progress_to=100, answers=True):
+    from .ingestion import generate_pdf_summary, save_canonical_answers
+    pdf_doc = job.pdf_document
+    if not pdf_doc.file:
+        raise JobError("Document has no file")
+    _read_file_again(pdf_doc)
+    summary_text = generate_pdf_summary(pdf_doc.file.path, pdf_doc)
+    if not summary_text or summary_text.startswith("Error reading PDF"):
+        raise JobError(summary_text or "No summary generated")
+    PDFSummary.objects.update_or_create(
+        pdf_document=pdf_doc, defaults={'summary_text': summary_text, 'generated_at': timezone.now()}
+    )
+    if answers:
+        # Overview and chapter answers come from the section summaries
+        save_canonical_answers(pdf_doc)
+    _update(job, progress=progress_to)
+    return f"Summary of {len(summary_text)} characters"
+
+
+def _rechunk(job, progress_to=100, fresh=True):
+    from .ingestion import IngestionError, chunk_document
+    pdf_doc = job.pdf_document
+    if fresh:
+        _read_file_again(pdf_doc)
+    # Any failure rolls back to the previous chunks; their store file is
+    # only rewritten once the new rows are committed
+    with transaction.atomic():
+        PDFChunk.objects.filter(pdf_document=pdf_doc).delete()
+        try:
+            chunk_count = chunk_document(pdf_doc)
+        except IngestionError as e:
+            raise JobError(str(e)) from e
+        if not chunk_count:
+            raise JobError("No chunks could be extracted")
+    _update(job, progress=progress_to)
+    return f"{chunk_count} chunks"
+
+
+def _extract(job):
+    # Re-chunking stores the canonical answers, and reuses the summary's extraction
+    summary = _resummarise(job, progress_to=50, answers=False)
+    chunks = _rechunk(job, fresh=False)
+    return f"{summary}; {chunks}"
+
+
+def _reindex(job):
+    pdf_doc = job.pdf_document
+    delete_chunk_store(pdf_doc)
+    store = get_chunk_store(pdf_doc)
+    _update(job, progress=50)
+    ensure_search_index()
+    return f"Chunk store rebuilt with {len(store)} chunks"
+
+
+def _warm(job):
+    store = get_chunk_store(job.pdf_document)
+    store.touch()
+    return f"{len(store)} chunks ({len(store.buffer)} bytes) loaded"
+
+
+STEPS = {
+    'extract': _extract,
+    'rechunk': _rechunk,
+    'resummarise': _resummarise,
+    'reindex': _reindex,
+    'warm': _warm,
+}
+
+
+# In-process worker pool
+
+_executor_lock = threading.Lock()
+_pool = None
+
+
+def _lower_priority():
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except (AttributeError, OSError):
+        pass
+
+
+def _executor():
+    global _pool
+    with _executor_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'MAINTENANCE_JOB_WORKERS', 1),
+                thread_name_prefix='maintenance',
+                initializer=_lower_priority,
+            )
+        return _pool
+
+
+def _run_in_thread():
+    close_old_connections()
+    try:
+        run_pending()
+    except Exception:
+        logger.exception("Maintenance worker stopped")
+    finally:
+        connections.close_all()
@@ -0,0 +1,363 @@
+"""
+End-to-end load testing of the Q&A and upload endpoints.
+
+A corpus of synthetic PDFs (see ``benchmarks.make_pdf``) is seeded for a
+dedicated ``loadtest`` user, then worker threads, each logged in as its own
+virtual user, issue a weighted mix of operations:
+
+* ``ask``: JSON POST to ``ask_question_api``;
+* ``thread``: form POST to ``thread_detail``;
+* ``upload``: multipart POST of a small PDF to ``upload_pdf``.
+
+Requests go either through Django's test client in this process or over HTTP
+to a running server that shares this project's database. In-process runs
+also watch every SQL statement for SQLite lock errors and slow writes. The
+report (throughput, latency percentiles, error and rejection rates, database
+contention) is plain JSON so runs can be compared with ``compare_reports``.
+
+Used by ``manage.py loadtest``.
+"""
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection
+from django.middleware.csrf import CSRF_ALLOWED_CHARS
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from .benchmarks import QUESTIONS, environment, make_pdf, percentile
+from .models import ConversationThread, PDFDocument, PDFSummary, Question
+from .ingestion import create_pdf_chunks, generate_pdf_summary
+
+REPORT_FORMAT = 1
+
+OWNER = 'loadtest'
+WORKER_PREFIX = 'loadtest-'
+
+OPERATIONS = ('ask', 'thread', 'upload')
+
+# Statuses that mean the server shed load on purpose
+REJECTED_STATUSES = (429, 503)
+
+# Writes slower than this (seconds) were most likely waiting on a lock
+SLOW_WRITE = 0.1
+
+
+def parse_mix(spec):
+    """Parse 'ask=8,thread=1,upload=1' into {operation: weight}"""
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation {name!r}; choose from {', '.join(OPERATIONS)}")
+        try:
+            mix[name] = float(weight) if weight else 1.0
+        except ValueError:
+            raise ValueError(f"Invalid weight for {name}: {weight!r}")
+    if not any(mix.values()):
+        raise ValueError("The mix needs at least one operation with a positive weight")
+    return mix
+
+
+# Corpus
+
+def seed_corpus(documents, pages):
+    """Create ``documents`` synthetic PDFs with summaries, chunks and a thread each; returns the threads"""
+    owner, _ = User.objects.get_or_create(username=OWNER)
+    os.makedirs(os.path.join(settings.MEDIA_ROOT, 'pdfs'), exist_ok=True)
+    threads = []
+    for i in range(documents):
+        name = f'pdfs/loadtest-{uuid.uuid4().hex[:12]}.pdf'
+        make_pdf(os.path.join(settings.MEDIA_ROOT, name), pages, seed=i)
+        pdf_doc = PDFDocument.objects.create(title=f'Load test {i + 1}', file=name, uploaded_by=owner)
+        summary_text = generate_pdf_summary(pdf_doc.file.path, pdf_doc)
+        PDFSummary.objects.create(pdf_document=pdf_doc, summary_text=summary_text)
+        create_pdf_chunks(pdf_doc)
+        threads.append(ConversationThread.objects.create(pdf_document=pdf_doc, title=f'Load test {i + 1}'))
+    return threads
+
+
+def worker_users(count):
+    return [User.objects.get_or_create(username=f'{WORKER_PREFIX}{i + 1}')[0] for i in range(count)]
+
+
+def cleanup():
+    """Delete the load-test users with their documents, files, threads and questions"""
+    users = User.objects.filter(username=OWNER) | User.objects.filter(username__startswith=WORKER_PREFIX)
+    for pdf_doc in PDFDocument.objects.filter(uploaded_by__in=users):
+        if pdf_doc.file:
+            pdf_doc.file.delete(save=False)
+    Question.objects.filter(asked_by__in=users).delete()
+    return users.delete()[0]
+
+
+# Transports
+
+class Response:
+    __slots__ = ('status', 'body')
+
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body
+
+
+class InProcessTransport:
+    """Sends requests through Django's test client, one client per virtual user"""
+
+    def __init__(self, user):
+        self.client = Client(raise_request_exception=False)
+        self.client.force_login(user)
+
+    def post(self, path, data=None, json_body=None, files=None):
+        if json_body is not None:
+            response = self.client.post(path, json.dumps(json_body), content_type='application/json')
+        else:
+            response = self.client.post(path, {**(data or {}), **(files or {})})
+        return Response(response.status_code, response.content)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpTransport:
+    """Sends requests to a running server, authenticated with a session created in the shared database"""
+
+    def __init__(self, user, base_url, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        client = Client()
+        client.force_login(user)
+        self.csrf_token = get_random_string(32, allowed_chars=CSRF_ALLOWED_CHARS)
+        self.cookie = (f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}; '
+                       f'{settings.CSRF_COOKIE_NAME}={self.csrf_token}')
+        self.opener = urllib.request.build_opener(_NoRedirect)
+
+    def post(self, path, data=None, json_body=None, files=None):
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            content_type = 'application/json'
+        else:
+            body, content_type = encode_multipart(data or {}, files or {})
+        request = urllib.request.Request(self.base_url + path, data=body, method='POST', headers={
+            'Content-Type': content_type,
+            'Cookie': self.cookie,
+            'X-CSRFToken': self.csrf_token,
+        })
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                return Response(response.status, response.read())
+        except urllib.error.HTTPError as e:
+            return Response(e.code, e.read())
+
+
+def encode_multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, upload in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{upload.name}"\r\n'
+            f'Content-Type: application/pdf\r\n\r\n'.encode() + upload.read() + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class _Upload:
+    """A named in-memory file, re-readable for every request"""
+
+    def __init__(self, name, content):
+        self.name = name
+        self.content = content
+
+    def open(self):
+        return SimpleUploadedFile(self.name, self.content, content_type='application/pdf')
+
+
+# Operations
+
+def op_ask(transport, thread, rng, upload):
+    return transport.post(reverse('easylearning:ask_question_api'), json_body={
+        'question': rng.choice(QUESTIONS), 'thread_id': str(thread.id), 'language': rng.choice(('en', 'en', 'gu', 'hi')),
+    })
+
+
+def op_thread(transport, thread, rng, upload):
+    return transport.post(reverse('easylearning:thread_detail', args=[thread.id]), data={
+        'question_text': rng.choice(QUESTIONS), 'language': 'en',
+    })
+
+
+def op_upload(transport, thread, rng, upload):
+    return transport.post(reverse('easylearning:upload_pdf'), data={'title': 'Load test upload'},
+                          files={'file': upload.open()})
+
+
+OPERATION_FUNCTIONS = {'ask': op_ask, 'thread': op_thread, 'upload': op_upload}
+
+
+# Database contention
+
+class WriteMonitor:
+    """``execute_wrapper`` recording write latency and lock errors on one connection"""
+
+    def __init__(self):
+        self.writes = []
+        self.lock_errors = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        is_write = sql.lstrip()[:6].upper() in ('INSERT', 'UPDATE', 'DELETE')
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as e:
+            if 'locked' in str(e):
+                self.lock_errors += 1
+            raise
+        finally:
+            if is_write:
+                self.writes.append(time.perf_counter() - start)
+
+
+# Running
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = []  # (operation, status, seconds)
+        self.monitors = []
+
+    def add(self, operation, status, seconds):
+        with self.lock:
+            self.samples.append((operation, status, seconds))
+
+
+def run_load(threads, users, mix, concurrency, requests=None, duration=None, base_url=None, seed=0,
+             upload_pages=2):
+    """Drive the mix with ``concurrency`` workers until ``requests`` are done or ``duration`` passes"""
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(make_pdf(os.path.join(workdir, 'upload.pdf'), upload_pages, seed=seed), 'rb') as fh:
+            upload = _Upload('loadtest.pdf', fh.read())
+
+    recorder = Recorder()
+    issued = [0]
+    issued_lock = threading.Lock()
+    deadline = time.monotonic() + duration if duration else None
+
+    def next_ticket():
+        with issued_lock:
+            if requests is not None and issued[0] >= requests:
+                return False
+            issued[0] += 1
+        return deadline is None or time.monotonic() < deadline
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        user = users[index % len(users)]
+        monitor = WriteMonitor()
+        with recorder.lock:
+            recorder.monitors.append(monitor)
+        try:
+            with connection.execute_wrapper(monitor):
+                transport = HttpTransport(user, base_url) if base_url else InProcessTransport(user)
+                while next_ticket():
+                    operation = rng.choices(names, weights)[0]
+                    start = time.perf_counter()
+                    try:
+                        status = OPERATION_FUNCTIONS[operation](transport, rng.choice(threads), rng, upload).status
+                    except Exception:
+                        status = 0
+                    recorder.add(operation, status, time.perf_counter() - start)
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(i,), name=f'loadtest-{i}') for i in range(concurrency)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return recorder, elapsed
+
+
+def _summarise(samples, elapsed):
+    latencies = sorted(seconds for _, _, seconds in samples)
+    statuses = Counter(status for _, status, _ in samples)
+    rejected = sum(statuses[code] for code in REJECTED_STATUSES)
+    errors = sum(count for code, count in statuses.items() if code == 0 or (code >= 400 and code not in REJECTED_STATUSES))
+    count = len(samples)
+    return {
+        'requests': count,
+        'throughput_rps': round(count / elapsed, 2) if elapsed else None,
+        'ok': count - rejected - errors,
+        'rejected': rejected,
+        'errors': errors,
+        'error_rate': round(errors / count, 4) if count else 0.0,
+        'rejection_rate': round(rejected / count, 4) if count else 0.0,
+        'latency_ms': {
+            name: round(percentile(latencies, fraction) * 1000, 1) if latencies else None
+            for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p95', 0.95), ('p99', 0.99), ('max', 1.0))
+        },
+        'statuses': {str(code): statuses[code] for code in sorted(statuses)},
+    }
+
+
+def build_report(recorder, elapsed, config):
+    writes = sorted(seconds for monitor in recorder.monitors for seconds in monitor.writes)
+    return {
+        'format': REPORT_FORMAT,
+        'created_at': timezone.now().isoformat(),
+        'environment': {**environment(), 'database': connection.vendor},
+        'config': config,
+        'duration_seconds': round(elapsed, 3),
+        'overall': _summarise(recorder.samples, elapsed),
+        'operations': {
+            name: _summarise([s for s in recorder.samples if s[0] == name], elapsed)
+            for name in OPERATIONS if any(s[0] == name for s in recorder.samples)
+        },
+        # Only observed for in-process runs
+        'database': {
+            'writes': len(writes),
+            'write_p99_ms': round(percentile(writes, 0.99) * 1000, 1) if writes else None,
+            'slow_writes': sum(1 for seconds in writes if seconds >= SLOW_WRITE),
+            'lock_errors': sum(monitor.lock_errors for monitor in recorder.monitors),
+        },
+    }
+
+
+def compare_reports(current, previous):
+    """(metric, previous, current, change) rows for the headline numbers of two reports"""
+    rows = []
+
+    def add(label, old, new):
+        change = (new - old) / old if old and new is not None else None
+        rows.append((label, old, new, change))
+
+    for scope, old_scope, new_scope in [('overall', previous.get('overall', {}), current['overall'])] + [
+        (name, previous.get('operations', {}).get(name, {}), stats) for name, stats in current['operations'].items()
+    ]:
+        add(f'{scope} throughput_rps', old_scope.get('throughput_rps'), new_scope['throughput_rps'])
+        add(f'{scope} p99_ms', old_scope.get('latency_ms', {}).get('p99'), new_scope['latency_ms']['p99'])
+        add(f'{scope} error_rate', old_scope.get('error_rate'), new_scope['error_rate'])
+    add('database lock_errors', previous.get('database', {}).get('lock_errors'), current['database']['lock_errors'])
+    return rows
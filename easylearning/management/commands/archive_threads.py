@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from easylearning.archive import archive_thread, idle_threads
+
+
+class Command(BaseCommand):
+    help = 'Move the questions and answers of idle threads into compressed archives'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=getattr(settings, 'THREAD_ARCHIVE_AFTER_DAYS', 90),
+            help='Archive threads with no activity for this many days',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Archive at most this many threads',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report the threads that would be archived',
+        )
+
+    def handle(self, *args, **options):
+        threads = idle_threads(options['days']).order_by('updated_at')
+        if options['limit']:
+            threads = threads[:options['limit']]
+        
+        if options['dry_run']:
+            for thread in threads:
+                self.stdout.write(f"Would archive {thread.id} ({thread.title}), idle since {thread.updated_at:%Y-%m-%d}")
+            return
+        
+        archived_threads = 0
+        archived_questions = 0
+        for thread in threads.iterator(chunk_size=200):
+            moved = archive_thread(thread)
+            if moved:
+                archived_threads += 1
+                archived_questions += moved
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {archived_questions} questions from {archived_threads} threads idle for {options['days']} days"
+        ))
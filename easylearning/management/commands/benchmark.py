@@ -0,0 +1,96 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from easylearning.benchmarks import baseline_document, compare, run_suite
+
+
+class Command(BaseCommand):
+    help = 'Benchmark extraction, chunking, DB writes, question analysis, scoring and translation'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages',
+            type=int,
+            nargs='+',
+            default=[10, 100],
+            help='Page counts of the synthetic PDFs',
+        )
+        parser.add_argument(
+            '--chunks',
+            type=int,
+            nargs='+',
+            default=[100, 1000, 10000],
+            help='Chunk counts to score questions against',
+        )
+        parser.add_argument(
+            '--languages',
+            nargs='+',
+            help='Answer languages to translate into (default: all supported)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Runs per benchmark; the fastest is reported',
+        )
+        parser.add_argument(
+            '--only',
+            nargs='+',
+            help='Only run benchmarks whose name contains one of these strings',
+        )
+        parser.add_argument(
+            '--save',
+            metavar='PATH',
+            help='Write the results to PATH as a JSON baseline',
+        )
+        parser.add_argument(
+            '--baseline',
+            metavar='PATH',
+            help='Compare against a saved baseline and fail on regressions',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.25,
+            help='Allowed regression before failing, as a fraction (default 0.25)',
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as fh:
+                    baseline = json.load(fh)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read baseline {options['baseline']}: {e}")
+
+        self.stdout.write(f"{'benchmark':<34} {'ops/sec':>12} {'best (s)':>10} {'peak KiB':>10}")
+        results = run_suite(
+            pages=options['pages'],
+            chunk_counts=options['chunks'],
+            languages=options['languages'],
+            repeat=options['repeat'],
+            only=options['only'],
+            progress=self.report,
+        )
+
+        if options['save']:
+            with open(options['save'], 'w') as fh:
+                json.dump(baseline_document(results), fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Saved baseline to {options['save']}"))
+
+        if baseline is None:
+            return
+        regressions = compare(results, baseline, options['threshold'])
+        for name, metric, old, new, change in regressions:
+            self.stdout.write(self.style.ERROR(f"{name}: {metric} {old} -> {new} ({change:+.0%})"))
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} metric(s) regressed by more than {options['threshold']:.0%} "
+                f"against {options['baseline']}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"No regressions beyond {options['threshold']:.0%}"))
+
+    def report(self, name, result):
+        peak = '-' if result['peak_kib'] is None else f"{result['peak_kib']:.1f}"
+        self.stdout.write(f"{name:<34} {result['ops_per_sec']:>12.1f} {result['seconds']:>10.4f} {peak:>10}")
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from easylearning.search import FTS_TABLE, optimize_search_index
+
+
+def megabytes(size):
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+def database_size():
+    """
+    Return ``(total, free, search_index)`` sizes in bytes of the SQLite database.
+
+    ``search_index`` covers the full-text index's shadow tables and is None
+    when SQLite was built without the ``dbstat`` table.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA page_size')
+        page_size = cursor.fetchone()[0]
+        cursor.execute('PRAGMA page_count')
+        total = cursor.fetchone()[0] * page_size
+        cursor.execute('PRAGMA freelist_count')
+        free = cursor.fetchone()[0] * page_size
+        try:
+            cursor.execute('SELECT SUM(pgsize) FROM dbstat WHERE name LIKE %s', [f'{FTS_TABLE}%'])
+        except DatabaseError:
+            return total, free, None
+        return total, free, cursor.fetchone()[0] or 0
+
+
+class Command(BaseCommand):
+    help = 'Merge the search index and VACUUM the database to reclaim space left by rewritten rows'
+
+    def describe(self, total, free, search_index):
+        description = f"{megabytes(total)} ({megabytes(free)} free)"
+        if search_index is not None:
+            description += f", search index {megabytes(search_index)}"
+        return description
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stdout.write("Only SQLite databases are compacted; run your database's own VACUUM instead")
+            return
+        if connection.in_atomic_block:
+            raise CommandError("VACUUM cannot run inside a transaction")
+        
+        before = database_size()
+        self.stdout.write(f"Database before: {self.describe(*before)}")
+        optimize_search_index()
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM')
+        after = database_size()
+        self.stdout.write(self.style.SUCCESS(
+            f"Database after: {self.describe(*after)}; reclaimed {megabytes(max(before[0] - after[0], 0))}"
+        ))
@@ -0,0 +1,96 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from easylearning.evaluation import dump_question_set, evaluate, load_question_set, synthetic_question_set
+from easylearning.models import PDFDocument
+from easylearning.retrieval import engines
+
+
+class Command(BaseCommand):
+    help = 'Compare retrieval engines on recall@k, MRR and latency over a labelled question set'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'questions',
+            nargs='?',
+            help='Labelled question set (JSON or JSON Lines)',
+        )
+        parser.add_argument(
+            '--synthetic',
+            type=int,
+            metavar='N',
+            help='Instead of a question set, ask N generated questions per document',
+        )
+        parser.add_argument(
+            '--document',
+            action='append',
+            dest='documents',
+            metavar='ID',
+            help='Limit --synthetic to these documents (repeatable)',
+        )
+        parser.add_argument(
+            '--save-questions',
+            metavar='PATH',
+            help='Write the generated question set to PATH for review or reuse',
+        )
+        parser.add_argument(
+            '--engines',
+            nargs='+',
+            help='Engines to compare (default: all registered)',
+        )
+        parser.add_argument(
+            '--k',
+            type=int,
+            nargs='+',
+            default=[1, 3, 5],
+            help='Cut-offs for recall@k',
+        )
+        parser.add_argument(
+            '--output',
+            metavar='PATH',
+            help='Write the results to PATH as JSON',
+        )
+
+    def handle(self, *args, **options):
+        if bool(options['questions']) == bool(options['synthetic']):
+            raise CommandError("Give either a question set or --synthetic N")
+        try:
+            if options['questions']:
+                items = load_question_set(options['questions'])
+            else:
+                documents = PDFDocument.objects.filter(chunk_count__gt=0).order_by('uploaded_at')
+                if options['documents']:
+                    documents = documents.filter(pk__in=options['documents'])
+                items = synthetic_question_set(documents, per_document=options['synthetic'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        if not items:
+            raise CommandError("No questions to evaluate")
+        if options['save_questions']:
+            with open(options['save_questions'], 'w') as fh:
+                json.dump(dump_question_set(items), fh, indent=2)
+
+        names = options['engines'] or sorted(engines())
+        ks = sorted(set(options['k']))
+        try:
+            results = evaluate(items, names, ks)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        recall_columns = ''.join(f" {f'R@{k}':>7}" for k in ks)
+        self.stdout.write(f"{len(items)} questions over {len({item['document'].pk for item in items})} documents")
+        self.stdout.write(f"{'engine':<12}{recall_columns} {'MRR':>7} {'mean ms':>9} {'p95 ms':>9} {'setup ms':>9}")
+        for name, metrics in results.items():
+            if 'unavailable' in metrics:
+                self.stdout.write(self.style.WARNING(f"{name:<12} unavailable: {metrics['unavailable']}"))
+                continue
+            recalls = ''.join(f" {metrics[f'recall@{k}']:>7.3f}" for k in ks)
+            latency = metrics['latency_ms']
+            self.stdout.write(
+                f"{name:<12}{recalls} {metrics['mrr']:>7.3f} {latency['mean']:>9.3f} {latency['p95']:>9.3f} "
+                f"{metrics['prepare_ms']:>9.1f}"
+            )
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump({'questions': len(items), 'k': ks, 'engines': results}, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Saved results to {options['output']}"))
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime, parse_date
+from easylearning.corpus import export_corpus, open_corpus, select_documents
+
+
+class Command(BaseCommand):
+    help = 'Stream documents, chunks and conversations to a JSONL corpus file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output',
+            help="Corpus file to write ('.gz' for gzip, '-' for stdout)",
+        )
+        parser.add_argument(
+            '--user',
+            help='Only export documents uploaded by this username',
+        )
+        parser.add_argument(
+            '--since',
+            help='Only export documents uploaded on or after this date (YYYY-MM-DD or ISO timestamp)',
+        )
+        parser.add_argument(
+            '--until',
+            help='Only export documents uploaded before this date (YYYY-MM-DD or ISO timestamp)',
+        )
+        parser.add_argument(
+            '--with-files',
+            action='store_true',
+            help='Embed the PDF files in the corpus',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Rows fetched from the database at a time',
+        )
+
+    def handle(self, *args, **options):
+        documents = select_documents(
+            username=options['user'],
+            since=self.parse_when(options['since']),
+            until=self.parse_when(options['until']),
+        )
+        
+        stream = open_corpus(options['output'], 'w')
+        try:
+            counts = export_corpus(stream, documents, with_files=options['with_files'],
+                                   chunk_size=options['chunk_size'])
+        finally:
+            if options['output'] != '-':
+                stream.close()
+        
+        summary = ', '.join(f"{record_type}={count}" for record_type, count in counts.items())
+        self.stderr.write(self.style.SUCCESS(f"Exported {summary}"))
+
+    def parse_when(self, value):
+        if not value:
+            return None
+        when = parse_datetime(value) or parse_date(value)
+        if when is None:
+            raise CommandError(f"Invalid date: {value}")
+        return when
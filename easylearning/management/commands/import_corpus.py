@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from easylearning.corpus import CorpusImporter, open_corpus
+
+
+class Command(BaseCommand):
+    help = 'Load a JSONL corpus file written by export_corpus'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input',
+            help="Corpus file to read ('.gz' for gzip, '-' for stdin)",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows inserted per query',
+        )
+        parser.add_argument(
+            '--skip-existing',
+            action='store_true',
+            help='Leave rows that already exist untouched instead of failing',
+        )
+
+    def handle(self, *args, **options):
+        importer = CorpusImporter(batch_size=options['batch_size'], skip_existing=options['skip_existing'])
+        
+        stream = open_corpus(options['input'], 'r')
+        try:
+            with transaction.atomic():
+                counts = importer.load(stream)
+        except (ValueError, IntegrityError) as e:
+            raise CommandError(f"Import failed, nothing was imported: {e}")
+        finally:
+            if options['input'] != '-':
+                stream.close()
+        
+        summary = ', '.join(f"{record_type}={count}" for record_type, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Imported {summary}"))
+        if importer.skipped:
+            self.stdout.write(f"Skipped {importer.skipped} existing rows")
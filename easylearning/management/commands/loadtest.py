@@ -0,0 +1,176 @@
+import json
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from easylearning.loadtest import build_report, cleanup, compare_reports, parse_mix, run_load, seed_corpus, worker_users
+
+
+class Command(BaseCommand):
+    help = 'Drive a mix of questions and uploads concurrently and report throughput, latency and errors'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mix',
+            default='ask=8,thread=1,upload=1',
+            help='Weighted operations, e.g. "ask=8,thread=1,upload=1"',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Worker threads, each logged in as its own user',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Total requests to issue (ignored with --duration)',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            help='Run for this many seconds instead of a fixed number of requests',
+        )
+        parser.add_argument(
+            '--documents',
+            type=int,
+            default=3,
+            help='Synthetic documents to seed the corpus with',
+        )
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=20,
+            help='Pages per seeded document',
+        )
+        parser.add_argument(
+            '--url',
+            help='Base URL of a running server sharing this database (default: in-process)',
+        )
+        parser.add_argument(
+            '--no-admission',
+            action='store_true',
+            help='Disable question admission control (in-process runs only)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed for the operation mix',
+        )
+        parser.add_argument(
+            '--output',
+            metavar='PATH',
+            help='Write the report to PATH as JSON',
+        )
+        parser.add_argument(
+            '--compare',
+            metavar='PATH',
+            help='Compare the headline numbers with an earlier report',
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Keep the seeded users, documents and questions afterwards',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['concurrency'] < 1:
+            raise CommandError("--concurrency must be at least 1")
+        previous = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as fh:
+                    previous = json.load(fh)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read report {options['compare']}: {e}")
+
+        overrides = {}
+        if not options['url']:
+            # Uploads go to a scratch media directory, and the test client's host must be allowed
+            overrides['MEDIA_ROOT'] = tempfile.mkdtemp(prefix='easylearning-loadtest-')
+            overrides['ALLOWED_HOSTS'] = [*settings.ALLOWED_HOSTS, 'testserver']
+            if options['no_admission']:
+                overrides['QA_ADMISSION_ENABLED'] = False
+        elif options['no_admission']:
+            raise CommandError("--no-admission only applies to in-process runs")
+
+        config = {
+            'mix': mix,
+            'concurrency': options['concurrency'],
+            'requests': None if options['duration'] else options['requests'],
+            'duration': options['duration'],
+            'documents': options['documents'],
+            'pages': options['pages'],
+            'target': options['url'] or 'in-process',
+            'admission': not options['no_admission'],
+            'seed': options['seed'],
+        }
+        with override_settings(**overrides):
+            try:
+                self.stdout.write(f"Seeding {options['documents']} documents of {options['pages']} pages...")
+                threads = seed_corpus(options['documents'], options['pages'])
+                users = worker_users(options['concurrency'])
+                self.stdout.write(f"Running {options['mix']} with {options['concurrency']} workers against {config['target']}...")
+                recorder, elapsed = run_load(
+                    threads, users, mix, options['concurrency'],
+                    requests=None if options['duration'] else options['requests'],
+                    duration=options['duration'],
+                    base_url=options['url'],
+                    seed=options['seed'],
+                )
+            finally:
+                if not options['keep']:
+                    cleanup()
+                    if 'MEDIA_ROOT' in overrides:
+                        shutil.rmtree(overrides['MEDIA_ROOT'], ignore_errors=True)
+                elif 'MEDIA_ROOT' in overrides:
+                    # The kept documents point at files in the scratch directory
+                    self.stdout.write(f"Kept the seeded files in {overrides['MEDIA_ROOT']}")
+
+        report = build_report(recorder, elapsed, config)
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Saved report to {options['output']}"))
+        if previous is not None:
+            self.print_comparison(compare_reports(report, previous), options['compare'])
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{'operation':<10} {'requests':>8} {'req/s':>8} {'ok':>6} {'rejected':>8} {'errors':>6} "
+            f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+        )
+        rows = list(report['operations'].items()) + [('overall', report['overall'])]
+        for name, stats in rows:
+            latency = stats['latency_ms']
+            self.stdout.write(
+                f"{name:<10} {stats['requests']:>8} {stats['throughput_rps']:>8.1f} {stats['ok']:>6} "
+                f"{stats['rejected']:>8} {stats['errors']:>6} {latency['p50']:>8} {latency['p90']:>8} "
+                f"{latency['p99']:>8} {latency['max']:>8}"
+            )
+        self.stdout.write(f"Statuses: {report['overall']['statuses']}")
+        database = report['database']
+        self.stdout.write(
+            f"Database: {database['writes']} writes, p99 {database['write_p99_ms']} ms, "
+            f"{database['slow_writes']} slower than 100 ms, {database['lock_errors']} lock errors"
+        )
+        style = self.style.ERROR if report['overall']['errors'] else self.style.SUCCESS
+        self.stdout.write(style(
+            f"{report['overall']['throughput_rps']} requests/s over {report['duration_seconds']} s, "
+            f"error rate {report['overall']['error_rate']:.2%}"
+        ))
+
+    def print_comparison(self, rows, path):
+        self.stdout.write(f"Compared with {path}:")
+        for label, old, new, change in rows:
+            delta = '' if change is None else f" ({change:+.0%})"
+            self.stdout.write(f"  {label:<32} {old} -> {new}{delta}")
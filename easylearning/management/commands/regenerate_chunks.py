@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
 from easylearning.models import PDFDocument, PDFChunk
-from easylearning.views import create_pdf_chunks
+from easylearning.ingestion import create_pdf_chunks
 
 
 class Command(BaseCommand):
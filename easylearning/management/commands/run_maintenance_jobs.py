@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from easylearning.jobs import fail_stale_jobs, run_pending
+
+
+class Command(BaseCommand):
+    help = 'Run maintenance jobs queued from the admin'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Keep polling for new jobs instead of exiting when the queue is empty',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Seconds between polls with --watch',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            stale = fail_stale_jobs()
+            if stale:
+                self.stdout.write(self.style.WARNING(f"Failed {stale} jobs that stopped running"))
+            count = run_pending()
+            if count:
+                self.stdout.write(self.style.SUCCESS(f"Ran {count} maintenance jobs"))
+            if not options['watch']:
+                return
+            time.sleep(options['interval'])
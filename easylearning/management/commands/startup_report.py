@@ -0,0 +1,59 @@
+import json
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from easylearning.startup import StartupError, eager_lazy_modules, measure_cold_start
+
+
+class Command(BaseCommand):
+    help = 'Break down the import time of a cold worker start (django.setup() plus the URLconf)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=20,
+            help='Show this many of the slowest modules and packages',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the raw measurements as JSON',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            result = measure_cold_start(importtime=True)
+        except StartupError as e:
+            raise CommandError(f"Could not start the project: {e}")
+        if options['json']:
+            self.stdout.write(json.dumps({key: result[key] for key in ('setup_ms', 'urlconf_ms', 'imports')}, indent=2))
+            return
+        
+        imports = result['imports']
+        self.stdout.write(
+            f"django.setup() {result['setup_ms']:.1f} ms, URLconf {result['urlconf_ms']:.1f} ms "
+            f"(under -X importtime), {len(imports)} modules imported"
+        )
+        
+        by_package = defaultdict(int)
+        for name, self_us, _, _ in imports:
+            by_package[name.split('.')[0]] += self_us
+        self.stdout.write(f"\n{'package':<40} {'self ms':>9}")
+        for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f"{package:<40} {self_us / 1000:>9.1f}")
+        
+        self.stdout.write(f"\n{'module':<50} {'self ms':>9} {'cumulative ms':>14}")
+        for name, self_us, cumulative_us, _ in sorted(imports, key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f"{name:<50} {self_us / 1000:>9.1f} {cumulative_us / 1000:>14.1f}")
+        
+        project = [entry for entry in imports if entry[0].split('.')[0] in ('easylearning', 'extaractsummary')]
+        self.stdout.write(f"\nProject modules ({len(project)}):")
+        for name, self_us, cumulative_us, _ in sorted(project, key=lambda item: -item[2]):
+            self.stdout.write(f"  {name:<48} {self_us / 1000:>9.1f} {cumulative_us / 1000:>14.1f}")
+        
+        eager = eager_lazy_modules(result['modules'])
+        if eager:
+            self.stdout.write(self.style.WARNING(f"\nLoaded at startup but meant to be lazy: {', '.join(eager)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("\nNo lazily-loaded modules were imported at startup"))
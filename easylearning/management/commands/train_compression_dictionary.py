@@ -0,0 +1,43 @@
+from django.apps import apps
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from easylearning.fields import compressed_fields, recompress_rows, train_dictionary
+from easylearning.models import CompressionDictionary
+
+
+class Command(BaseCommand):
+    help = 'Train a new compression dictionary from the current corpus'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--samples',
+            type=int,
+            default=200,
+            help='Rows sampled from each compressed field',
+        )
+        parser.add_argument(
+            '--recompress',
+            action='store_true',
+            help='Rewrite every compressed value with the new dictionary, then compact the database',
+        )
+
+    def handle(self, *args, **options):
+        sources = list(compressed_fields(apps.get_app_config('easylearning').get_models()))
+        dictionary = train_dictionary(CompressionDictionary, sources, samples_per_source=options['samples'])
+        
+        if dictionary is None:
+            self.stdout.write(self.style.ERROR("No text found to train a dictionary from"))
+            return
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Trained dictionary {dictionary.pk} ({len(dictionary.data)} bytes from {dictionary.sample_count} samples)"
+        ))
+        
+        if options['recompress']:
+            for model, field_name in sources:
+                rewritten = recompress_rows(model, field_name)
+                self.stdout.write(f"Recompressed {rewritten} {model.__name__}.{field_name} values")
+            self.stdout.write(self.style.SUCCESS("Recompression complete"))
+            # Rewritten rows leave their old pages free; the file only
+            # shrinks once it is vacuumed.
+            call_command('compact_database', stdout=self.stdout, stderr=self.stderr)
@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from easylearning.warmup import warm_caches
+
+
+class Command(BaseCommand):
+    help = "Preload the most-asked documents' chunk stores, the translation tables and frequent answers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=getattr(settings, 'WARM_CACHES_DAYS', 7),
+            help='Rank documents by the questions asked in this many days',
+        )
+        parser.add_argument(
+            '--documents',
+            type=int,
+            default=getattr(settings, 'WARM_CACHES_DOCUMENTS', 10),
+            help='Number of documents to warm',
+        )
+        parser.add_argument(
+            '--answers',
+            type=int,
+            default=getattr(settings, 'WARM_CACHES_ANSWERS', 20),
+            help='Frequent questions per document to answer into the shared cache (0: none)',
+        )
+        parser.add_argument(
+            '--ttl',
+            type=int,
+            default=getattr(settings, 'WARM_CACHES_ANSWER_TTL', 3600),
+            help='Seconds the stored answers stay in the shared cache',
+        )
+
+    def handle(self, *args, **options):
+        for name in ('days', 'documents', 'ttl'):
+            if options[name] < 1:
+                raise CommandError(f"--{name} must be at least 1")
+        if options['answers'] < 0:
+            raise CommandError("--answers cannot be negative")
+
+        results = warm_caches(
+            days=options['days'],
+            documents=options['documents'],
+            answers=options['answers'],
+            timeout=options['ttl'],
+            progress=self.report,
+        )
+        if not results:
+            self.stdout.write(f"No questions asked in the last {options['days']} days; nothing to warm")
+            return
+        failed = sum(1 for stats in results if 'error' in stats)
+        answers = sum(stats.get('answers', 0) for stats in results)
+        style = self.style.WARNING if failed else self.style.SUCCESS
+        self.stdout.write(style(
+            f"Warmed {len(results) - failed} of {len(results)} documents, {answers} answers stored"
+        ))
+
+    def report(self, stats):
+        title = stats['document'].title
+        if 'error' in stats:
+            self.stdout.write(self.style.ERROR(f"  {title}: {stats['error']}"))
+            return
+        self.stdout.write(
+            f"  {title}: {stats['questions']} questions, {stats['chunks']} chunks "
+            f"({stats['bytes']} bytes), {stats['answers']} answers in {stats['seconds']} s"
+        )
@@ -1,7 +1,21 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection
 from django.shortcuts import redirect
 from django.contrib import messages
 from django.urls import reverse
 
+logger = logging.getLogger(__name__)
+
+
 class AdminAccessMiddleware:
     """
     Middleware to restrict admin access to superusers only
@@ -22,4 +36,98 @@ class AdminAccessMiddleware:
                 return redirect('easylearning:landing')
         
         response = self.get_response(request)
-        return response 
\ No newline at end of file
+        return response
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper counting SQL queries and their total time
+    """
+    def __init__(self):
+        self.count = 0
+        self.elapsed = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.elapsed += time.perf_counter() - start
+            self.count += 1
+
+
+class RequestProfilingMiddleware:
+    """
+    Middleware letting superusers profile a single request on demand.
+
+    Send the ``X-Profile: 1`` header or add ``?profile=1`` to the URL. The
+    request runs under cProfile, SQL queries are counted and timed, and the
+    result is stored as a RequestProfile with a downloadable ``.prof`` file.
+    """
+    HEADER = 'X-Profile'
+    QUERY_PARAM = 'profile'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        queries = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - start
+
+        try:
+            profile = self.save_profile(request, response, profiler, queries, duration)
+            response['X-Profile-Id'] = str(profile.id)
+        except Exception:
+            logger.exception("Could not store request profile for %s", request.path)
+        return response
+
+    def should_profile(self, request):
+        if not getattr(settings, 'REQUEST_PROFILING_ENABLED', True):
+            return False
+        requested = (
+            request.headers.get(self.HEADER) == '1'
+            or request.GET.get(self.QUERY_PARAM) == '1'
+        )
+        return requested and request.user.is_authenticated and request.user.is_superuser
+
+    def save_profile(self, request, response, profiler, queries, duration):
+        from .models import RequestProfile
+
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(
+            getattr(settings, 'REQUEST_PROFILING_SUMMARY_LINES', 40)
+        )
+
+        profile = RequestProfile(
+            path=request.path[:500],
+            method=request.method,
+            status_code=response.status_code,
+            user=request.user,
+            duration_ms=duration * 1000,
+            sql_query_count=queries.count,
+            sql_time_ms=queries.elapsed * 1000,
+            summary_text=stream.getvalue(),
+        )
+
+        fd, tmp_path = tempfile.mkstemp(suffix='.prof')
+        os.close(fd)
+        try:
+            stats.dump_stats(tmp_path)
+            with open(tmp_path, 'rb') as fh:
+                profile.profile_file.save(f'{profile.id}.prof', File(fh), save=False)
+        finally:
+            os.remove(tmp_path)
+        profile.save()
+        return profile
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:35
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def remove_duplicate_chunk_indexes(apps, schema_editor):
+    """Keep one chunk per (pdf_document, chunk_index) so the constraint can be added"""
+    PDFChunk = apps.get_model('easylearning', 'PDFChunk')
+    duplicates = (
+        PDFChunk.objects.values('pdf_document', 'chunk_index')
+        .annotate(rows=Count('id'))
+        .filter(rows__gt=1)
+    )
+    for dup in duplicates:
+        ids = list(
+            PDFChunk.objects.filter(pdf_document=dup['pdf_document'], chunk_index=dup['chunk_index'])
+            .values_list('id', flat=True)
+        )
+        PDFChunk.objects.filter(id__in=ids[1:]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('easylearning', '0003_requestprofile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='conversationthread',
+            index=models.Index(fields=['pdf_document', '-updated_at'], name='thread_pdf_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pdfdocument',
+            index=models.Index(fields=['-uploaded_at'], name='pdfdoc_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pdfdocument',
+            index=models.Index(fields=['uploaded_by', '-uploaded_at'], name='pdfdoc_owner_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['thread', 'asked_at'], name='question_thread_asked_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['asked_by', '-asked_at'], name='question_user_asked_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_chunk_indexes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='pdfchunk',
+            constraint=models.UniqueConstraint(fields=('pdf_document', 'chunk_index'), name='unique_chunk_index_per_pdf'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:37
+
+import easylearning.fields
+from django.db import migrations, models
+
+COMPRESSED_FIELDS = [
+    ('PDFChunk', 'chunk_text'),
+    ('PDFSummary', 'summary_text'),
+    ('Answer', 'answer_text'),
+]
+
+
+def compress_existing_rows(apps, schema_editor):
+    """
+    Train a dictionary from the existing corpus and compress every row with it.
+
+    The space the plain text used is only returned to the filesystem by a
+    VACUUM, which cannot run inside the migration's transaction: run
+    ``python manage.py compact_database`` afterwards.
+    """
+    sources = [(apps.get_model('easylearning', model), field) for model, field in COMPRESSED_FIELDS]
+    easylearning.fields.train_dictionary(apps.get_model('easylearning', 'CompressionDictionary'), sources)
+    for model, field in sources:
+        easylearning.fields.recompress_rows(model, field)
+
+
+def decompress_existing_rows(apps, schema_editor):
+    """Write plain text back so the columns can return to TextField"""
+    for model_name, field in COMPRESSED_FIELDS:
+        model = apps.get_model('easylearning', model_name)
+        table = model._meta.db_table
+        column = model._meta.get_field(field).column
+        with schema_editor.connection.cursor() as cursor:
+            for pk, text in list(model.objects.values_list('pk', field)):
+                cursor.execute(
+                    f'UPDATE {table} SET {column} = %s WHERE id = %s',
+                    [text, model._meta.pk.get_db_prep_value(pk, schema_editor.connection)],
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('easylearning', '0004_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompressionDictionary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.BinaryField()),
+                ('sample_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='answer',
+            name='answer_text',
+            field=easylearning.fields.CompressedTextField(),
+        ),
+        migrations.AlterField(
+            model_name='pdfchunk',
+            name='chunk_text',
+            field=easylearning.fields.CompressedTextField(),
+        ),
+        migrations.AlterField(
+            model_name='pdfsummary',
+            name='summary_text',
+            field=easylearning.fields.CompressedTextField(),
+        ),
+        migrations.RunPython(compress_existing_rows, decompress_existing_rows),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('easylearning', '0005_compressed_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='chunk_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:40
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    PDFDocument = apps.get_model('easylearning', 'PDFDocument')
+    ConversationThread = apps.get_model('easylearning', 'ConversationThread')
+    Question = apps.get_model('easylearning', 'Question')
+    PDFChunk = apps.get_model('easylearning', 'PDFChunk')
+
+    questions = Question.objects.filter(thread=OuterRef('pk')).order_by().values('thread')
+    ConversationThread.objects.update(
+        question_count=Coalesce(Subquery(questions.annotate(n=Count('pk')).values('n')), 0),
+        answered_count=Coalesce(Subquery(
+            questions.filter(answer__isnull=False).annotate(n=Count('pk')).values('n')
+        ), 0),
+        last_question_at=Subquery(questions.annotate(last=Max('asked_at')).values('last')),
+    )
+
+    threads = ConversationThread.objects.filter(pdf_document=OuterRef('pk')).order_by().values('pdf_document')
+    chunks = PDFChunk.objects.filter(pdf_document=OuterRef('pk')).order_by().values('pdf_document')
+    PDFDocument.objects.update(
+        thread_count=Coalesce(Subquery(threads.annotate(n=Count('pk')).values('n')), 0),
+        chunk_count=Coalesce(Subquery(chunks.annotate(n=Count('pk')).values('n')), 0),
+        # The PDFs are not re-parsed here; the highest chunked page is the best estimate
+        page_count=Coalesce(Subquery(chunks.annotate(n=Max('page_number')).values('n')), 0),
+    )
+
+    # Chunk text is compressed, so lengths are summed in Python
+    for pdf_id in PDFDocument.objects.values_list('pk', flat=True):
+        text_chars = sum(
+            len(text) for text in PDFChunk.objects.filter(pdf_document_id=pdf_id).values_list('chunk_text', flat=True)
+        )
+        PDFDocument.objects.filter(pk=pdf_id).update(text_chars=text_chars)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('easylearning', '0006_pdfdocument_chunk_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversationthread',
+            name='answered_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='conversationthread',
+            name='last_question_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversationthread',
+            name='question_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='chunk_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='page_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='text_chars',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='thread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:43
+
+import django.db.models.deletion
+import easylearning.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('easylearning', '0007_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedThread',
+            fields=[
+                ('thread', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='archive', serialize=False, to='easylearning.conversationthread')),
+                ('payload', easylearning.fields.CompressedTextField()),
+                ('question_count', models.PositiveIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('easylearning', '0009_maintenancejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='extraction_report',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('easylearning', '0010_pdfdocument_extraction_report'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PDFPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page_number', models.PositiveIntegerField()),
+                ('text_hash', models.CharField(max_length=64)),
+                ('pdf_document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='easylearning.pdfdocument')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('pdf_document', 'page_number'), name='unique_page_per_pdf')],
+            },
+        ),
+    ]
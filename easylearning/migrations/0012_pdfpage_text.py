@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:13
+
+import easylearning.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('easylearning', '0011_pdfpage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfpage',
+            name='text',
+            field=easylearning.fields.CompressedTextField(blank=True, default=''),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:16
+
+import django.db.models.deletion
+import easylearning.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('easylearning', '0012_pdfpage_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SectionSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('title', models.CharField(max_length=100)),
+                ('first_page', models.PositiveIntegerField()),
+                ('last_page', models.PositiveIntegerField()),
+                ('summary_text', easylearning.fields.CompressedTextField()),
+                ('generated_at', models.DateTimeField(auto_now_add=True)),
+                ('pdf_document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='section_summaries', to='easylearning.pdfdocument')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('pdf_document', 'position'), name='unique_section_per_pdf')],
+            },
+        ),
+    ]
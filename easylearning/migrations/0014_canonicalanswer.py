@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-19 11:22
+
+import django.db.models.deletion
+import easylearning.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('easylearning', '0013_sectionsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CanonicalAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('overview', 'Overview'), ('characters', 'Main characters'), ('chapter', 'Chapter'), ('setting', 'Setting')], max_length=20)),
+                ('chapter', models.PositiveIntegerField(default=0)),
+                ('language', models.CharField(choices=[('en', 'English'), ('gu', 'Gujarati'), ('hi', 'Hindi')], max_length=2)),
+                ('chunk_version', models.PositiveIntegerField()),
+                ('answer_text', easylearning.fields.CompressedTextField()),
+                ('confidence_score', models.FloatField(default=0.0)),
+                ('generated_at', models.DateTimeField(auto_now_add=True)),
+                ('pdf_document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='canonical_answers', to='easylearning.pdfdocument')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('pdf_document', 'kind', 'chapter', 'language'), name='unique_canonical_answer')],
+            },
+        ),
+    ]
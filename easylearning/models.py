@@ -1,8 +1,11 @@
 from django.db import models
+from django.db.models import F
 from django.contrib.auth.models import User
 from django.utils import timezone
 import uuid
 
+from .fields import CompressedTextField
+
 
 class PDFDocument(models.Model):
     """Model to store uploaded PDF documents"""
@@ -11,6 +14,22 @@ class PDFDocument(models.Model):
     file = models.FileField(upload_to='pdfs/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    # Bumped every time the chunk set is regenerated
+    chunk_version = models.PositiveIntegerField(default=0)
+    # Denormalised counters: thread_count is kept by the handlers in
+    # signals.py, the chunk and page figures by ingestion
+    thread_count = models.PositiveIntegerField(default=0)
+    chunk_count = models.PositiveIntegerField(default=0)
+    page_count = models.PositiveIntegerField(default=0)
+    text_chars = models.PositiveIntegerField(default=0)
+    # Pages skipped and limits hit by the last text extraction
+    extraction_report = models.JSONField(default=dict, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['-uploaded_at'], name='pdfdoc_uploaded_idx'),
+            models.Index(fields=['uploaded_by', '-uploaded_at'], name='pdfdoc_owner_uploaded_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -20,13 +39,32 @@ class PDFSummary(models.Model):
     """Model to store generated summaries of PDF documents"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     pdf_document = models.OneToOneField(PDFDocument, on_delete=models.CASCADE, related_name='summary')
-    summary_text = models.TextField()
+    summary_text = CompressedTextField()
     generated_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f"Summary of {self.pdf_document.title}"
 
 
+class SectionSummary(models.Model):
+    """Model to store the summary of one section (a chapter or a run of pages) of a PDF document"""
+    pdf_document = models.ForeignKey(PDFDocument, on_delete=models.CASCADE, related_name='section_summaries')
+    position = models.PositiveIntegerField()
+    title = models.CharField(max_length=100)
+    first_page = models.PositiveIntegerField()
+    last_page = models.PositiveIntegerField()
+    summary_text = CompressedTextField()
+    generated_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['pdf_document', 'position'], name='unique_section_per_pdf'),
+        ]
+    
+    def __str__(self):
+        return f"{self.title} of {self.pdf_document.title}"
+
+
 class ConversationThread(models.Model):
     """Model to store conversation threads for each PDF"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -34,9 +72,33 @@ class ConversationThread(models.Model):
     title = models.CharField(max_length=255, default="New Conversation")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalised counters, maintained by the handlers in signals.py
+    question_count = models.PositiveIntegerField(default=0)
+    answered_count = models.PositiveIntegerField(default=0)
+    last_question_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['pdf_document', '-updated_at'], name='thread_pdf_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.pdf_document.title}"
+    
+    def record_question(self, question):
+        """Count a newly asked question and mark the thread as active"""
+        ConversationThread.objects.filter(pk=self.pk).update(
+            question_count=F('question_count') + 1,
+            last_question_at=question.asked_at,
+            updated_at=timezone.now(),
+        )
+    
+    def record_answer(self):
+        """Count a newly stored answer"""
+        ConversationThread.objects.filter(pk=self.pk).update(
+            answered_count=F('answered_count') + 1,
+            updated_at=timezone.now(),
+        )
 
 
 class Question(models.Model):
@@ -54,6 +116,12 @@ class Question(models.Model):
     asked_at = models.DateTimeField(auto_now_add=True)
     asked_by = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['thread', 'asked_at'], name='question_thread_asked_idx'),
+            models.Index(fields=['asked_by', '-asked_at'], name='question_user_asked_idx'),
+        ]
+    
     def __str__(self):
         return self.question_text[:50]
 
@@ -62,7 +130,7 @@ class Answer(models.Model):
     """Model to store answers to questions"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     question = models.OneToOneField(Question, on_delete=models.CASCADE, related_name='answer')
-    answer_text = models.TextField()
+    answer_text = CompressedTextField()
     language = models.CharField(max_length=2, choices=Question.LANGUAGE_CHOICES, default='en')
     is_from_pdf = models.BooleanField(default=True)
     confidence_score = models.FloatField(default=0.0)
@@ -76,9 +144,137 @@ class PDFChunk(models.Model):
     """Model to store PDF text chunks for better search and retrieval"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     pdf_document = models.ForeignKey(PDFDocument, on_delete=models.CASCADE, related_name='chunks')
-    chunk_text = models.TextField()
+    chunk_text = CompressedTextField()
     chunk_index = models.IntegerField()
     page_number = models.IntegerField(null=True, blank=True)
     
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['pdf_document', 'chunk_index'], name='unique_chunk_index_per_pdf'),
+        ]
+    
     def __str__(self):
         return f"Chunk {self.chunk_index} of {self.pdf_document.title}"
+
+
+class PDFPage(models.Model):
+    """Model to store the extracted text of each page and its hash, used to find the pages a replaced file changes"""
+    pdf_document = models.ForeignKey(PDFDocument, on_delete=models.CASCADE, related_name='pages')
+    page_number = models.PositiveIntegerField()
+    text = CompressedTextField(default='', blank=True)
+    text_hash = models.CharField(max_length=64)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['pdf_document', 'page_number'], name='unique_page_per_pdf'),
+        ]
+    
+    def __str__(self):
+        return f"Page {self.page_number} of {self.pdf_document.title}"
+
+
+class CanonicalAnswer(models.Model):
+    """Model to store an answer to a common question, computed at ingestion for one chunk version"""
+    KIND_CHOICES = [
+        ('overview', 'Overview'),
+        ('characters', 'Main characters'),
+        ('chapter', 'Chapter'),
+        ('setting', 'Setting'),
+    ]
+    
+    pdf_document = models.ForeignKey(PDFDocument, on_delete=models.CASCADE, related_name='canonical_answers')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    chapter = models.PositiveIntegerField(default=0)  # 0 unless kind is 'chapter'
+    language = models.CharField(max_length=2, choices=Question.LANGUAGE_CHOICES)
+    chunk_version = models.PositiveIntegerField()
+    answer_text = CompressedTextField()
+    confidence_score = models.FloatField(default=0.0)
+    generated_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['pdf_document', 'kind', 'chapter', 'language'], name='unique_canonical_answer'),
+        ]
+    
+    def __str__(self):
+        kind = f"Chapter {self.chapter}" if self.kind == 'chapter' else self.get_kind_display()
+        return f"{kind} ({self.language}) of {self.pdf_document.title}"
+
+
+class RequestProfile(models.Model):
+    """Model to store on-demand cProfile captures of individual requests"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    path = models.CharField(max_length=500)
+    method = models.CharField(max_length=10)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    duration_ms = models.FloatField(default=0.0)
+    sql_query_count = models.PositiveIntegerField(default=0)
+    sql_time_ms = models.FloatField(default=0.0)
+    profile_file = models.FileField(upload_to='profiles/')
+    summary_text = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+
+class CompressionDictionary(models.Model):
+    """Model to store preset dictionaries used by CompressedTextField"""
+    data = models.BinaryField()
+    sample_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Dictionary {self.pk} ({len(self.data)} bytes)"
+
+
+class ArchivedThread(models.Model):
+    """Model to store the questions and answers of an idle thread as one compressed JSON document"""
+    thread = models.OneToOneField(ConversationThread, on_delete=models.CASCADE, primary_key=True, related_name='archive')
+    payload = CompressedTextField()
+    question_count = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Archive of {self.thread.title} ({self.question_count} questions)"
+
+
+class MaintenanceJob(models.Model):
+    """Model to track background maintenance work queued from the admin"""
+    KIND_CHOICES = [
+        ('extract', 'Re-extract text (summary and chunks)'),
+        ('rechunk', 'Re-chunk'),
+        ('resummarise', 'Re-summarise'),
+        ('reindex', 'Rebuild search index'),
+        ('warm', 'Pre-warm caches'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    pdf_document = models.ForeignKey(PDFDocument, on_delete=models.CASCADE, related_name='maintenance_jobs')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    progress = models.PositiveSmallIntegerField(default=0)
+    message = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='maintjob_status_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} for {self.pdf_document.title} ({self.status})"
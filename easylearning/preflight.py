@@ -0,0 +1,109 @@
+"""
+Structural checks of an uploaded PDF before it is saved or parsed.
+
+Only a few small windows of the file are read: its first and last
+PDF_PREFLIGHT_WINDOW bytes, and as much again where ``startxref`` points.
+They must contain the ``%PDF-`` header, the ``%%EOF`` marker, a
+``startxref`` offset inside the file leading to a cross-reference table or
+stream, no ``/Encrypt`` entry, and, when the page tree root is in one of the
+windows, a page count between 1 and PDF_MAX_PAGES. When python-magic (and
+libmagic) is installed the header must also be identified as a PDF.
+
+Files that pass may still fail to parse; preflight only turns away the
+obviously broken ones before anything is written.
+"""
+import functools
+import re
+
+from django.conf import settings
+
+from . import instrumentation
+
+HEADER_RE = re.compile(rb'%PDF-(\d\.\d)')
+STARTXREF_RE = re.compile(rb'startxref\s+(\d+)')
+XREF_RE = re.compile(rb'\s*(?:xref\b|\d+\s+\d+\s+obj\b)')
+PAGES_RE = re.compile(rb'<<[^<>]*?/Type\s*/Pages\b[^<>]*>>')
+COUNT_RE = re.compile(rb'/Count\s+(\d+)')
+# The header may follow up to this many bytes of other data
+HEADER_SEARCH = 1024
+
+
+class PreflightError(Exception):
+    """The upload is not a usable PDF; the message is shown to the user"""
+
+    def __init__(self, message, reason):
+        super().__init__(message)
+        self.reason = reason
+
+
+@functools.lru_cache(maxsize=None)
+def _magic():
+    try:
+        import magic
+        return magic.Magic(mime=True)
+    except (ImportError, OSError):
+        # python-magic, or the libmagic it wraps, is not installed
+        return None
+
+
+def _read(fh, offset, length):
+    fh.seek(offset)
+    return fh.read(length)
+
+
+def preflight(fh, size):
+    """
+    Check the PDF in the binary file object ``fh`` of ``size`` bytes.
+
+    Returns ``{'version', 'pages'}`` (``pages`` None when the page tree root
+    was not in the windows read) and leaves ``fh`` at the start; raises
+    PreflightError otherwise.
+    """
+    window = getattr(settings, 'PDF_PREFLIGHT_WINDOW', 8192)
+    try:
+        head = _read(fh, 0, window)
+        tail = head if size <= window else _read(fh, size - window, window)
+
+        header = HEADER_RE.search(head, 0, HEADER_SEARCH)
+        if header is None:
+            _reject("The file is not a PDF.", 'header')
+        detector = _magic()
+        if detector is not None and detector.from_buffer(head[header.start():]) != 'application/pdf':
+            _reject("The file is not a PDF.", 'magic')
+        if b'%%EOF' not in tail[-1024:]:
+            _reject("The PDF is incomplete; it may have been cut off during upload.", 'trailer')
+
+        offsets = STARTXREF_RE.findall(tail)
+        if not offsets or int(offsets[-1]) >= size:
+            _reject("The PDF has no valid cross-reference table.", 'xref')
+        # Offsets count from the header, which may follow other data
+        xref = _read(fh, int(offsets[-1]) + header.start(), window)
+        if not XREF_RE.match(xref):
+            xref = _read(fh, int(offsets[-1]), window)
+            if not XREF_RE.match(xref):
+                _reject("The PDF has no valid cross-reference table.", 'xref')
+    finally:
+        fh.seek(0)
+
+    # The trailer dictionary follows 'trailer', or heads a cross-reference stream
+    trailer = tail[tail.rfind(b'trailer'):] if b'trailer' in tail else b''
+    if not xref.lstrip().startswith(b'xref'):
+        trailer += xref.split(b'stream', 1)[0]
+    if b'/Encrypt' in trailer:
+        _reject("Password-protected PDFs are not supported.", 'encrypted')
+
+    counts = [int(count) for data in (head, tail, xref) for match in PAGES_RE.finditer(data)
+              for count in COUNT_RE.findall(match.group())]
+    # Intermediate page tree nodes count only their own subtree; the root counts every page
+    pages = max(counts) if counts else None
+    if pages == 0:
+        _reject("The PDF has no pages.", 'pages')
+    limit = getattr(settings, 'PDF_MAX_PAGES', 2000)
+    if pages is not None and limit and pages > limit:
+        _reject(f"The PDF has {pages} pages; at most {limit} are supported.", 'pages')
+    return {'version': header.group(1).decode(), 'pages': pages}
+
+
+def _reject(message, reason):
+    instrumentation.increment('easylearning_preflight_rejections_total', reason=reason)
+    raise PreflightError(message, reason)
@@ -0,0 +1,111 @@
+"""
+Pluggable retrieval engines.
+
+An engine ranks a document's chunks for a question. Engines are registered
+by name with ``@register``, or listed in the RETRIEVAL_ENGINES setting as
+dotted paths, and are compared on accuracy and speed by
+``manage.py evaluate_retrieval`` (see ``evaluation``).
+
+An engine class is instantiated once per document, which is where it builds
+any index it needs, and then answers ``search(question, k)`` with up to ``k``
+Hits, best first.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from .chunkstore import get_chunk_store
+from .search import CHUNK_TABLE, FTS_TABLE, search_available
+from .answering import analyze_question, score_chunk_for_question, select_best_chunks
+
+Hit = namedtuple('Hit', ['chunk_index', 'page_number', 'score'])
+
+_registry = {}
+
+
+class EngineUnavailable(Exception):
+    """The engine cannot run in this environment (e.g. a missing index)"""
+
+
+class RetrievalEngine:
+    name = None
+
+    def __init__(self, pdf_document):
+        self.pdf_document = pdf_document
+
+    def search(self, question, k):
+        raise NotImplementedError
+
+
+def register(cls):
+    _registry[cls.name] = cls
+    return cls
+
+
+def engines():
+    """Every registered engine by name, including those named in RETRIEVAL_ENGINES"""
+    found = dict(_registry)
+    for path in getattr(settings, 'RETRIEVAL_ENGINES', []):
+        cls = import_string(path)
+        found[cls.name] = cls
+    return found
+
+
+def get_engine(name):
+    try:
+        return engines()[name]
+    except KeyError:
+        raise ValueError(f"Unknown retrieval engine {name!r}; choose from {', '.join(sorted(engines()))}")
+
+
+@register
+class RulesEngine(RetrievalEngine):
+    """The production rules: ``score_chunk_for_question`` then ``select_best_chunks``"""
+    name = 'rules'
+
+    def __init__(self, pdf_document):
+        super().__init__(pdf_document)
+        self.store = get_chunk_store(pdf_document)
+
+    def search(self, question, k):
+        analysis = analyze_question(question)
+        scored = []
+        for chunk in self.store:
+            score = score_chunk_for_question(chunk, analysis)
+            if score > 0:
+                scored.append((chunk, score))
+        scored.sort(key=lambda x: x[1], reverse=True)
+        # The chunks an answer is built from come first, the rest by score
+        selected = select_best_chunks(scored, analysis)
+        chosen = {chunk.chunk_index for chunk, _ in selected}
+        ranked = selected + [(chunk, score) for chunk, score in scored if chunk.chunk_index not in chosen]
+        return [Hit(chunk.chunk_index, chunk.page_number, score) for chunk, score in ranked[:k]]
+
+
+@register
+class FullTextEngine(RetrievalEngine):
+    """BM25 ranking over the FTS5 chunk index, matching any question keyword"""
+    name = 'fts'
+
+    def __init__(self, pdf_document):
+        super().__init__(pdf_document)
+        if not search_available():
+            raise EngineUnavailable("The chunk full-text index is not available")
+
+    def search(self, question, k):
+        words = {word.strip('?!.,;:"\'()') for word in analyze_question(question)['keywords']}
+        quoted = ['"' + word.replace('"', '""') + '"' for word in sorted(words) if word]
+        terms = ' OR '.join(quoted)
+        if not terms:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT c.chunk_index, c.page_number, bm25({FTS_TABLE}) AS rank '
+                f'FROM {FTS_TABLE} f JOIN {CHUNK_TABLE} c ON c.rowid = f.rowid '
+                f'WHERE {FTS_TABLE} MATCH %s AND c.pdf_document_id = %s ORDER BY rank LIMIT %s',
+                [terms, self.pdf_document.pk.hex, k],
+            )
+            # bm25() is lower for better matches
+            return [Hit(index, page, -rank) for index, page, rank in cursor.fetchall()]
@@ -0,0 +1,134 @@
+"""
+Full-text index over chunk text.
+
+On SQLite the chunks are indexed by an FTS5 table whose rowids are the rowids
+of ``easylearning_pdfchunk``. The index is contentless: the text itself is
+only stored (compressed) in the chunk table, and triggers keep the index in
+step with every insert, update and delete, decompressing through the
+``easylearning_inflate()`` function registered on each Django connection.
+Chunks written by other SQLite clients therefore need that function too.
+
+Schema changes that rebuild the chunk table drop the triggers, so the index
+is checked after every ``migrate`` and rebuilt when anything is missing.
+Other database backends fall back to ordinary ``icontains`` searches.
+"""
+import logging
+
+from django.db import DatabaseError, connection, connections
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+CHUNK_TABLE = 'easylearning_pdfchunk'
+FTS_TABLE = 'easylearning_pdfchunk_fts'
+
+TRIGGERS = {
+    f'{FTS_TABLE}_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {CHUNK_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, chunk_text) VALUES (new.rowid, easylearning_inflate(new.chunk_text));
+        END""",
+    f'{FTS_TABLE}_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {CHUNK_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, chunk_text)
+                VALUES ('delete', old.rowid, easylearning_inflate(old.chunk_text));
+        END""",
+    f'{FTS_TABLE}_au': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF chunk_text ON {CHUNK_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, chunk_text)
+                VALUES ('delete', old.rowid, easylearning_inflate(old.chunk_text));
+            INSERT INTO {FTS_TABLE} (rowid, chunk_text) VALUES (new.rowid, easylearning_inflate(new.chunk_text));
+        END""",
+}
+
+
+def _existing_objects(cursor):
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE name = %s OR (type = 'trigger' AND tbl_name = %s)",
+        [FTS_TABLE, CHUNK_TABLE],
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def search_available(using=connection):
+    """Whether the chunk full-text index exists on this connection"""
+    if using.vendor != 'sqlite':
+        return False
+    with using.cursor() as cursor:
+        return FTS_TABLE in _existing_objects(cursor)
+
+
+def rebuild_search_index(using=connection):
+    """(Re)create the index and its triggers and fill it from the chunk table"""
+    if using.vendor != 'sqlite':
+        return False
+    with using.cursor() as cursor:
+        for name in TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                f"chunk_text, content='', tokenize='unicode61 remove_diacritics 2')"
+            )
+        except DatabaseError:
+            logger.warning("SQLite was built without FTS5; chunk search uses LIKE")
+            return False
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, chunk_text) '
+            f'SELECT rowid, easylearning_inflate(chunk_text) FROM {CHUNK_TABLE}'
+        )
+        for sql in TRIGGERS.values():
+            cursor.execute(sql)
+    return True
+
+
+def ensure_search_index(using=connection):
+    """Rebuild the index when it or one of its triggers is missing"""
+    if using.vendor != 'sqlite' or CHUNK_TABLE not in using.introspection.table_names():
+        return False
+    with using.cursor() as cursor:
+        existing = _existing_objects(cursor)
+    if FTS_TABLE in existing and existing.issuperset(TRIGGERS):
+        return True
+    logger.info("Building chunk search index")
+    return rebuild_search_index(using)
+
+
+def optimize_search_index(using=connection):
+    """Merge the index's segments; rewriting many chunks leaves it fragmented"""
+    if not search_available(using):
+        return False
+    with using.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return True
+
+
+def match_expression(terms):
+    """Turn free text into an FTS5 query matching every word (the last as a prefix)"""
+    words = [word.replace('"', '""') for word in terms.split()]
+    if not words:
+        return None
+    quoted = [f'"{word}"' for word in words]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def search_chunks(queryset, terms):
+    """Filter a PDFChunk queryset to chunks matching ``terms``, using the index when available"""
+    expression = match_expression(terms)
+    if expression is None:
+        return queryset
+    if not search_available():
+        return queryset.filter(chunk_text__icontains=terms)
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT c.id FROM {FTS_TABLE} f JOIN {CHUNK_TABLE} c ON c.rowid = f.rowid WHERE {FTS_TABLE} MATCH %s',
+        (expression,),
+    ))
+
+
+@receiver(post_migrate)
+def install_search_index(sender, app_config, using, **kwargs):
+    if app_config.label == 'easylearning':
+        ensure_search_index(connections[using])
@@ -0,0 +1,54 @@
+"""
+Signal handlers maintaining the denormalised counters.
+
+Every thread, question and answer saved for the first time is counted, and
+every one deleted is uncounted, whichever code path (views, admin, scripts,
+cascades) does it. ``bulk_create`` sends no signals; its callers (corpus
+import, thread restore) write the counters themselves. Thread archival
+deletes rows without signals, as the thread keeps counting them.
+"""
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import PDFDocument, ConversationThread, Question, Answer
+
+
+@receiver(post_save, sender=ConversationThread)
+def thread_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        PDFDocument.objects.filter(pk=instance.pdf_document_id).update(thread_count=F('thread_count') + 1)
+
+
+@receiver(post_save, sender=Question)
+def question_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ConversationThread(pk=instance.thread_id).record_question(instance)
+
+
+@receiver(post_save, sender=Answer)
+def answer_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ConversationThread(pk=instance.question.thread_id).record_answer()
+
+
+@receiver(post_delete, sender=ConversationThread)
+def thread_deleted(sender, instance, **kwargs):
+    PDFDocument.objects.filter(pk=instance.pdf_document_id, thread_count__gt=0).update(
+        thread_count=F('thread_count') - 1
+    )
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    ConversationThread.objects.filter(pk=instance.thread_id, question_count__gt=0).update(
+        question_count=F('question_count') - 1
+    )
+
+
+@receiver(post_delete, sender=Answer)
+def answer_deleted(sender, instance, **kwargs):
+    thread_id = Question.objects.filter(pk=instance.question_id).values('thread_id')
+    ConversationThread.objects.filter(pk__in=thread_id, answered_count__gt=0).update(
+        answered_count=F('answered_count') - 1
+    )
@@ -0,0 +1,86 @@
+"""
+Cold-start measurements.
+
+Each measurement starts a fresh interpreter, runs ``django.setup()`` and
+imports the URLconf, which is what a new web worker does before it can serve
+its first request. With ``importtime`` the child runs under ``-X importtime``
+so the cost of every module can be broken down; that slows the child down,
+so budgets are checked without it.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+
+# Modules that are meant to load on first use, never while a worker boots
+LAZY_MODULES = (
+    'PyPDF2',
+    'numpy',
+    'easylearning.answering',
+    'easylearning.extraction',
+    'easylearning.ingestion',
+    'easylearning.summarisation',
+    'easylearning.translation',
+)
+
+CHILD_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+import importlib
+importlib.import_module(sys.argv[1])
+done = time.perf_counter()
+print(json.dumps({
+    'setup_ms': (setup - start) * 1000,
+    'urlconf_ms': (done - setup) * 1000,
+    'modules': sorted(sys.modules),
+}))
+"""
+
+
+class StartupError(Exception):
+    """The child process could not start the project"""
+
+
+def measure_cold_start(importtime=False, urlconf=None):
+    """
+    Time ``django.setup()`` and the URLconf import in a fresh interpreter.
+
+    Returns ``{'setup_ms', 'urlconf_ms', 'modules', 'imports'}``; ``imports``
+    lists ``(name, self_us, cumulative_us, depth)`` when ``importtime`` is set.
+    """
+    urlconf = urlconf or settings.ROOT_URLCONF
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(settings.BASE_DIR), env.get('PYTHONPATH')]))
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', CHILD_SCRIPT, urlconf]
+    completed = subprocess.run(command, capture_output=True, text=True, cwd=str(settings.BASE_DIR), env=env)
+    if completed.returncode != 0:
+        raise StartupError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'exit code %d' % completed.returncode)
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['imports'] = parse_importtime(completed.stderr) if importtime else []
+    return result
+
+
+def parse_importtime(output):
+    """Parse ``-X importtime`` lines into ``(name, self_us, cumulative_us, depth)`` tuples"""
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        stripped = name.lstrip(' ')
+        imports.append((stripped, int(parts[0]), int(parts[1]), (len(name) - len(stripped) - 1) // 2))
+    return imports
+
+
+def eager_lazy_modules(modules):
+    """The LAZY_MODULES that were nevertheless imported"""
+    return [name for name in LAZY_MODULES if name in modules]
@@ -0,0 +1,185 @@
+"""
+Map-reduce extractive summarisation.
+
+``split_sections`` groups a document's pages into sections: chapters when
+pages open with chapter headings, otherwise runs of a fixed number of pages.
+The map step condenses every section on its own by weighting its sentences
+with TF-IDF (each sentence counts as a document) and keeping the sentences
+closest to the section's centroid, in reading order. The reduce step ranks
+the kept sentences of all sections the same way to choose the document
+summary.
+
+Sections are independent, so the map step can run on a process pool. Only
+the standard library and NumPy are imported here, which keeps pool workers
+quick to start.
+"""
+import multiprocessing
+import re
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+Section = namedtuple('Section', ['title', 'first_page', 'last_page', 'text'])
+
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+(?=["\'(\[]?[A-Z0-9])')
+WORD_RE = re.compile(r"[^\W\d_]{3,}")
+CHAPTER_RE = re.compile(r'\W*chapter\s+(\d+|[ivxlc]+)\b', re.IGNORECASE)
+STOP_WORDS = frozenset("""
+    the and for are but not you all any can had her was one our out has him his how its may new now
+    see two who did get let say she too use that with have this will your from they been were said
+    each which their there what about would make like into than them then these some could other
+    more also only over such after most very when where while upon onto those being because
+""".split())
+
+# Sentences outside this many words are not chosen while others are available
+MIN_WORDS = 5
+MAX_WORDS = 80
+# Summaries are cut at a word boundary past this many characters
+MAX_CHARS = 1500
+# Smaller documents are summarised in the calling process even with workers
+PARALLEL_MIN_CHARS = 500_000
+
+
+def split_sentences(text):
+    text = ' '.join(text.split())
+    return [sentence for sentence in SENTENCE_RE.split(text) if sentence]
+
+
+ROMAN_VALUES = {'i': 1, 'v': 5, 'x': 10, 'l': 50, 'c': 100}
+
+
+def chapter_number(token):
+    """The number of a chapter heading written in digits ('03') or roman numerals ('IV')"""
+    if token.isdigit():
+        return int(token)
+    values = [ROMAN_VALUES[char] for char in token.lower()]
+    return sum(-value if value < following else value for value, following in zip(values, values[1:] + [0]))
+
+
+def split_sections(pages, section_pages=10):
+    """Group ``(page_number, text)`` pairs into Sections, skipping pages without text"""
+    pages = [(number, text) for number, text in pages if text and text.strip()]
+    if not pages:
+        return []
+    starts = [i for i, (_, text) in enumerate(pages) if CHAPTER_RE.match(text.lstrip()[:80])]
+    if len(starts) >= 2:
+        if starts[0] != 0:
+            starts.insert(0, 0)
+        bounds = list(zip(starts, starts[1:] + [len(pages)]))
+    else:
+        bounds = [(i, min(i + section_pages, len(pages))) for i in range(0, len(pages), section_pages)]
+
+    sections = []
+    for begin, end in bounds:
+        group = pages[begin:end]
+        first, last = group[0][0], group[-1][0]
+        heading = CHAPTER_RE.match(group[0][1].lstrip())
+        if heading and len(starts) >= 2:
+            # Stored as 'Chapter <n>', the form chapter questions are looked up by
+            title = f'Chapter {chapter_number(heading.group(1))}'
+        else:
+            title = f'Page {first}' if first == last else f'Pages {first}-{last}'
+        sections.append(Section(title, first, last, ' '.join(text for _, text in group)))
+    return sections
+
+
+def rank_sentences(sentences):
+    """Cosine similarity of each sentence's TF-IDF vector to the centroid of all of them"""
+    vocabulary = {}
+    rows = []
+    cols = []
+    for row, sentence in enumerate(sentences):
+        for word in WORD_RE.findall(sentence.lower()):
+            if word not in STOP_WORDS:
+                rows.append(row)
+                cols.append(vocabulary.setdefault(word, len(vocabulary)))
+    count = len(sentences)
+    scores = np.zeros(count)
+    if not cols:
+        return scores
+
+    size = len(vocabulary)
+    pairs, tf = np.unique(np.array(rows, dtype=np.int64) * size + np.array(cols, dtype=np.int64), return_counts=True)
+    sentence_ids, term_ids = np.divmod(pairs, size)
+    df = np.bincount(term_ids, minlength=size)
+    idf = np.log((1 + count) / (1 + df)) + 1.0
+    weights = tf * idf[term_ids]
+    centroid = np.bincount(term_ids, weights=weights, minlength=size) / count
+    dots = np.bincount(sentence_ids, weights=weights * centroid[term_ids], minlength=count)
+    norms = np.sqrt(np.bincount(sentence_ids, weights=weights ** 2, minlength=count)) * np.linalg.norm(centroid)
+    np.divide(dots, norms, out=scores, where=norms > 0)
+    return scores
+
+
+def select_sentences(sentences, limit):
+    """The ``limit`` best-ranked distinct sentences, in their original order"""
+    sentences = list(dict.fromkeys(sentences))
+    if len(sentences) <= limit:
+        return list(sentences)
+    scores = rank_sentences(sentences)
+    lengths = np.array([len(sentence.split()) for sentence in sentences])
+    usable = (lengths >= MIN_WORDS) & (lengths <= MAX_WORDS)
+    if usable.any():
+        scores = np.where(usable, scores, -1.0)
+    best = np.argsort(-scores, kind='stable')[:limit]
+    return [sentences[i] for i in sorted(best)]
+
+
+def summarise_section(text, limit):
+    return select_sentences(split_sentences(text), limit)
+
+
+def _clip(text):
+    if len(text) <= MAX_CHARS:
+        return text
+    return text[:MAX_CHARS].rsplit(' ', 1)[0] + '...'
+
+
+def summarise(pages, sentences=5, section_sentences=3, section_pages=10, workers=0):
+    """
+    Summarise ``(page_number, text)`` pairs.
+
+    Returns ``(summary, [(section, section_summary), ...])``; the summary is
+    empty when no page has text. With ``workers`` the sections of large
+    documents are summarised on a pool of that many processes.
+    """
+    sections = split_sections(pages, section_pages)
+    texts = [section.text for section in sections]
+    if workers and len(texts) > 1 and sum(len(text) for text in texts) >= PARALLEL_MIN_CHARS:
+        partials = _parallel_map(texts, section_sentences, workers)
+    else:
+        partials = [summarise_section(text, section_sentences) for text in texts]
+
+    kept = [sentence for partial in partials for sentence in partial]
+    summary = _clip(' '.join(select_sentences(kept, sentences)))
+    return summary, [(section, _clip(' '.join(partial))) for section, partial in zip(sections, partials)]
+
+
+# Process pool, started on first use
+
+_pool_lock = threading.Lock()
+_pool = None
+
+
+def _executor(workers):
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._max_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _parallel_map(texts, limit, workers):
+    global _pool
+    try:
+        chunksize = max(1, len(texts) // (workers * 4))
+        return list(_executor(workers).map(summarise_section, texts, [limit] * len(texts), chunksize=chunksize))
+    except BrokenProcessPool:
+        with _pool_lock:
+            _pool = None
+        return [summarise_section(text, limit) for text in texts]
@@ -1,3 +1,1347 @@
-from django.test import TestCase
+import io
+import json
+import os
+import pstats
+import re
+import shutil
+import threading
+import time
+import tempfile
+import unittest
+import zlib
+from unittest import mock
+from datetime import timedelta
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.models import F
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import instrumentation
+from .archive import archive_thread, idle_threads
+from .benchmarks import compare, make_pdf, percentile, run_suite
+from .chunkstore import ChunkStore, chunk_store_path, get_chunk_store
+from .coalescing import KEY_PREFIX, normalise_question, question_key, single_flight, warmed_answer
+from .jobs import run_pending
+from .loadtest import cleanup, compare_reports, parse_mix
+from .preflight import PreflightError, preflight
+from .management.commands.compact_database import database_size
+from .corpus import CorpusImporter, export_corpus, select_documents
+from .evaluation import evaluate, load_question_set, synthetic_question_set
+from .extraction import extract_pages
+from .search import search_chunks
+from .startup import measure_cold_start, parse_importtime
+from .summarisation import select_sentences, split_sections, summarise
+from .warmup import hot_documents, warm_caches
+from .fields import DICTIONARIES, FORMAT_PLAIN, FORMAT_ZLIB_DICT_V1, FORMAT_ZLIB_DICT_V2, compress_text, decompress_text
+from .models import (
+    PDFDocument, PDFSummary, ConversationThread, Question, Answer, PDFChunk, PDFPage, ArchivedThread, MaintenanceJob,
+    SectionSummary, CanonicalAnswer, RequestProfile,
+)
+
+
+def create_corpus(user, documents=3, threads=2, questions=3, chunks=5):
+    """Create documents with summaries, chunks, threads and answered questions"""
+    created = []
+    for d in range(documents):
+        pdf_doc = PDFDocument.objects.create(title=f'Document {d}', file=f'pdfs/doc{d}.pdf', uploaded_by=user)
+        PDFSummary.objects.create(pdf_document=pdf_doc, summary_text=f'Summary of document {d}.')
+        PDFChunk.objects.bulk_create(
+            PDFChunk(pdf_document=pdf_doc, chunk_text=f'Chapter {c}: text of chunk {c}.', chunk_index=c, page_number=c + 1)
+            for c in range(chunks)
+        )
+        for t in range(threads):
+            thread = ConversationThread.objects.create(pdf_document=pdf_doc, title=f'Thread {t}')
+            for q in range(questions):
+                question = Question.objects.create(thread=thread, question_text=f'Question {q}?', asked_by=user)
+                Answer.objects.create(question=question, answer_text=f'Answer {q}.')
+        created.append(pdf_doc)
+    return created
+
+
+class MetricsTests(TestCase):
+    """Stage timers and counters are merged in the shared store and served to authorised scrapers"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        overrides = override_settings(
+            METRICS_ENABLED=True, METRICS_FLUSH_INTERVAL=3600,
+            METRICS_STORE_PATH=os.path.join(directory, 'metrics.sqlite3'),
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        instrumentation.flush()
+
+    def test_timers_and_counters_are_aggregated(self):
+        with instrumentation.timer('unit'):
+            pass
+        instrumentation.observe(instrumentation.STAGE_METRIC, 0.003, stage='unit')
+        instrumentation.observe(instrumentation.STAGE_METRIC, 0.2, stage='unit')
+        instrumentation.increment('easylearning_uploads_total', outcome='unit')
+        # A flush stands in for another worker adding its deltas to the same store
+        instrumentation.flush()
+        instrumentation.increment('easylearning_uploads_total', 2, outcome='unit')
+        
+        lines = instrumentation.render_prometheus().splitlines()
+        self.assertIn('# TYPE easylearning_stage_duration_seconds histogram', lines)
+        self.assertIn('# HELP easylearning_uploads_total PDF uploads, by outcome.', lines)
+        self.assertIn('# TYPE easylearning_uploads_total counter', lines)
+        self.assertIn('easylearning_uploads_total{outcome="unit"} 3', lines)
+        self.assertIn('easylearning_stage_duration_seconds_bucket{stage="unit",le="0.25"} 3', lines)
+        self.assertIn('easylearning_stage_duration_seconds_bucket{stage="unit",le="+Inf"} 3', lines)
+        self.assertIn('easylearning_stage_duration_seconds_count{stage="unit"} 3', lines)
+        fives = [line for line in lines if line.startswith('easylearning_stage_duration_seconds_bucket{stage="unit",le="0.005"}')]
+        self.assertEqual(fives, ['easylearning_stage_duration_seconds_bucket{stage="unit",le="0.005"} 2'])
+
+    def test_endpoint_requires_token(self):
+        url = reverse('easylearning:metrics')
+        with override_settings(METRICS_AUTH_TOKEN=None, DEBUG=False):
+            self.assertEqual(self.client.get(url).status_code, 403)
+        with override_settings(METRICS_AUTH_TOKEN=None, DEBUG=True):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        with override_settings(METRICS_AUTH_TOKEN='secret'):
+            self.assertEqual(self.client.get(url).status_code, 401)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+            response = self.client.get(url, HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+
+class RequestProfilingTests(TestCase):
+    """Superusers can profile a request on demand; nobody else can"""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=media, REQUEST_PROFILING_ENABLED=True)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.url = reverse('easylearning:home')
+
+    def test_only_superusers_are_profiled(self):
+        self.assertNotIn('X-Profile-Id', self.client.get(self.url, HTTP_X_PROFILE='1'))
+        self.client.force_login(User.objects.create_user('reader', password='pw'))
+        response = self.client.get(self.url, {'profile': '1'}, HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_profile_is_stored_and_downloadable(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='pw'))
+        self.assertNotIn('X-Profile-Id', self.client.get(self.url))
+        response = self.client.get(self.url, HTTP_X_PROFILE='1')
+        profile = RequestProfile.objects.get(id=response['X-Profile-Id'])
+        self.assertEqual((profile.path, profile.method, profile.status_code), (self.url, 'GET', response.status_code))
+        self.assertGreater(profile.sql_query_count, 0)
+        self.assertIn('cumulative', profile.summary_text)
+        
+        download = self.client.get(reverse('admin:easylearning_requestprofile_download', args=[profile.id]))
+        self.assertEqual(download.status_code, 200)
+        path = os.path.join(settings.MEDIA_ROOT, 'downloaded.prof')
+        with open(path, 'wb') as fh:
+            fh.write(b''.join(download.streaming_content))
+        self.assertTrue(pstats.Stats(path).total_calls)
+        
+        self.client.force_login(User.objects.create_user('reader', password='pw'))
+        download = self.client.get(reverse('admin:easylearning_requestprofile_download', args=[profile.id]))
+        self.assertNotEqual(download.status_code, 200)
+
+
+class QueryCountTests(TestCase):
+    """Each page issues a bounded number of queries regardless of corpus size"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='pw')
+        self.client.force_login(self.user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assertMaxQueries(self, url, limit):
+        count = self.count_queries(url)
+        self.assertLessEqual(count, limit, f'{url} issued {count} queries (limit {limit})')
+        return count
+
+    def assertQueriesDoNotGrow(self, url_for_corpus, limit):
+        small = create_corpus(self.user, documents=1, threads=1, questions=1)
+        small_count = self.assertMaxQueries(url_for_corpus(small), limit)
+        large = create_corpus(self.user, documents=5, threads=4, questions=6)
+        large_count = self.assertMaxQueries(url_for_corpus(large), limit)
+        self.assertEqual(small_count, large_count)
+
+    def test_home(self):
+        self.assertQueriesDoNotGrow(lambda docs: reverse('easylearning:home'), 6)
+
+    def test_pdf_detail(self):
+        self.assertQueriesDoNotGrow(
+            lambda docs: reverse('easylearning:pdf_detail', args=[docs[0].id]), 10
+        )
+
+    def test_thread_detail(self):
+        self.assertQueriesDoNotGrow(
+            lambda docs: reverse('easylearning:thread_detail', args=[docs[0].conversations.first().id]), 8
+        )
+
+    def test_profile(self):
+        self.assertQueriesDoNotGrow(lambda docs: reverse('easylearning:profile'), 12)
+
+
+class AdminChangelistTests(TestCase):
+    """Large admin changelists avoid per-row queries and full-text scans"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', password='pw')
+        self.client.force_login(self.admin)
+
+    def assertChangelistQueriesDoNotGrow(self, model_name, params=''):
+        url = reverse(f'admin:easylearning_{model_name}_changelist') + params
+        counts = []
+        for documents in (1, 4):
+            create_corpus(self.admin, documents=documents)
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+        return response
+
+    def test_question_changelist(self):
+        self.assertChangelistQueriesDoNotGrow('question', '?asked_by=admin&document=Document')
+
+    def test_chunk_changelist(self):
+        response = self.assertChangelistQueriesDoNotGrow('pdfchunk', '?q=chapter+tex')
+        self.assertContains(response, 'Chapter 4')
+
+    def test_chunk_search(self):
+        create_corpus(self.admin, documents=1)
+        PDFChunk.objects.filter(chunk_index=2).update(chunk_text='Épée and shadow')
+        PDFChunk.objects.filter(chunk_index=3).delete()
+        self.assertEqual(search_chunks(PDFChunk.objects.all(), 'epee').count(), 1)
+        self.assertEqual(search_chunks(PDFChunk.objects.all(), 'text of chunk').count(), 3)
+        self.assertEqual(search_chunks(PDFChunk.objects.all(), 'chunk "3').count(), 0)
+
+
+class ConditionalPageTests(TestCase):
+    """Detail pages answer 304 only while what they render is unchanged"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='pw')
+        self.client.force_login(self.user)
+        self.pdf_doc = create_corpus(self.user, documents=1, threads=1, questions=1)[0]
+        self.thread = self.pdf_doc.conversations.get()
+        self.url = reverse('easylearning:thread_detail', args=[self.thread.id])
+
+    def test_not_modified_until_a_question_is_added(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        
+        question = Question.objects.create(thread=self.thread, question_text='Another?', asked_by=self.user)
+        self.thread.record_question(question)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_new_csrf_token_is_not_modified_away(self):
+        url = reverse('easylearning:pdf_detail', args=[self.pdf_doc.id])
+        etag = self.client.get(url)['ETag']
+        self.client.logout()
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class DownloadTests(TestCase):
+    """The original PDF is served with ranges, validators and proxy offload"""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=media, PDF_SENDFILE_BACKEND=None)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        os.makedirs(os.path.join(media, 'pdfs'))
+        with open(make_pdf(os.path.join(media, 'pdfs', 'my book#1.pdf'), 2, sentences_per_page=3), 'rb') as fh:
+            self.data = fh.read()
+        user = User.objects.create_user('reader', password='pw')
+        self.client.force_login(user)
+        pdf_doc = PDFDocument.objects.create(title='Book', file='pdfs/my book#1.pdf', uploaded_by=user)
+        self.url = reverse('easylearning:download_pdf', args=[pdf_doc.id])
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_ranges(self):
+        size = len(self.data)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual((response.status_code, response['Content-Range']), (206, f'bytes 0-9/{size}'))
+        self.assertEqual(self.body(response), self.data[:10])
+        self.assertEqual(self.body(self.client.get(self.url, HTTP_RANGE='bytes=-5')), self.data[-5:])
+        
+        # Several ranges, or a malformed one, get the whole file
+        for header in ('bytes=0-1,4-5', 'bytes=x-y', 'items=0-1'):
+            response = self.client.get(self.url, HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.body(response), self.data)
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={size}-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, f'bytes */{size}'))
+
+    def test_validators(self):
+        full = self.client.get(self.url)
+        etag = full['ETag']
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        for header in (etag, f'W/{etag}', f'"other", {etag}', '*'):
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=header).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    @override_settings(PDF_SENDFILE_BACKEND='nginx', PDF_SENDFILE_URL_PREFIX='/protected/')
+    def test_nginx_offload_quotes_the_name(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/pdfs/my%20book%231.pdf')
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class QueryPlanTests(TestCase):
+    """The main query of each view is served from an index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('planner', password='pw')
+        cls.pdf_doc = create_corpus(cls.user, documents=1)[0]
+        cls.thread = cls.pdf_doc.conversations.first()
+
+    def assertIndexBacked(self, queryset, table):
+        plan = queryset.explain()
+        self.assertRegex(
+            plan, rf'(SEARCH|SCAN) {re.escape(table)} USING (COVERING )?INDEX',
+            f'{table} is not read through an index:\n{plan}'
+        )
+        self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan, f'Ordering needs a sort:\n{plan}')
+
+    def test_home_documents(self):
+        self.assertIndexBacked(
+            PDFDocument.objects.select_related('summary').order_by('-uploaded_at'),
+            'easylearning_pdfdocument'
+        )
+
+    def test_profile_documents(self):
+        self.assertIndexBacked(
+            PDFDocument.objects.filter(uploaded_by=self.user).order_by('-uploaded_at'),
+            'easylearning_pdfdocument'
+        )
+
+    def test_pdf_detail_threads(self):
+        self.assertIndexBacked(
+            ConversationThread.objects.filter(pdf_document=self.pdf_doc).order_by('-updated_at'),
+            'easylearning_conversationthread'
+        )
+
+    def test_thread_detail_questions(self):
+        self.assertIndexBacked(
+            Question.objects.filter(thread=self.thread).select_related('answer', 'asked_by').order_by('asked_at'),
+            'easylearning_question'
+        )
+
+    def test_profile_questions(self):
+        self.assertIndexBacked(
+            Question.objects.filter(asked_by=self.user).order_by('-asked_at'),
+            'easylearning_question'
+        )
+
+    def test_answer_chunks(self):
+        self.assertIndexBacked(
+            PDFChunk.objects.filter(pdf_document=self.pdf_doc).order_by('chunk_index'),
+            'easylearning_pdfchunk'
+        )
+
+
+class CompressedTextFieldTests(TestCase):
+    """Compressed text round-trips through the ORM and stays searchable"""
+
+    def setUp(self):
+        self.pdf_doc = PDFDocument.objects.create(title='Compressed', file='pdfs/compressed.pdf')
+        self.text = 'Chapter 7: The river of stars. ' * 20
+
+    def test_round_trip(self):
+        self.assertEqual(decompress_text(compress_text(self.text)), self.text)
+        self.assertLess(len(compress_text(self.text)), len(self.text.encode('utf-8')))
+
+    def test_builtin_dictionaries(self):
+        self.assertEqual(compress_text(self.text)[0], FORMAT_ZLIB_DICT_V2)
+        compressor = zlib.compressobj(level=9, wbits=-15, zdict=DICTIONARIES[FORMAT_ZLIB_DICT_V1])
+        legacy = bytes([FORMAT_ZLIB_DICT_V1]) + compressor.compress(self.text.encode('utf-8')) + compressor.flush()
+        self.assertEqual(decompress_text(legacy), self.text)
+
+    def test_short_values_are_stored_plain(self):
+        self.assertEqual(compress_text('short')[0], FORMAT_PLAIN)
+
+    def test_legacy_text_passes_through(self):
+        self.assertEqual(decompress_text('plain legacy row'), 'plain legacy row')
+
+    def test_orm_values_and_search(self):
+        PDFChunk.objects.create(pdf_document=self.pdf_doc, chunk_text=self.text, chunk_index=0)
+        self.assertEqual(PDFChunk.objects.get().chunk_text, self.text)
+        self.assertEqual(list(PDFChunk.objects.values_list('chunk_text', flat=True)), [self.text])
+        self.assertEqual(PDFChunk.objects.filter(chunk_text__icontains='RIVER OF STARS').count(), 1)
+        self.assertEqual(PDFChunk.objects.filter(chunk_text__startswith='Chapter 7').count(), 1)
+        self.assertEqual(PDFChunk.objects.filter(chunk_text__contains='desert').count(), 0)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'VACUUM and dbstat are SQLite features')
+class CompactDatabaseTests(TransactionTestCase):
+    """Recompressing frees pages that compact_database gives back"""
+
+    def test_recompress_compacts(self):
+        pdf_doc = PDFDocument.objects.create(title='Compact', file='pdfs/compact.pdf')
+        PDFChunk.objects.bulk_create(
+            PDFChunk(pdf_document=pdf_doc, chunk_text=f'Chunk {i} about the river of stars. ' * 40, chunk_index=i)
+            for i in range(300)
+        )
+        PDFChunk.objects.filter(chunk_index__gte=20).delete()
+        self.assertGreater(database_size()[1], 0)
+        
+        stdout = io.StringIO()
+        call_command('train_compression_dictionary', '--recompress', stdout=stdout)
+        self.assertIn('Database before:', stdout.getvalue())
+        self.assertIn('search index', stdout.getvalue())
+        self.assertEqual(database_size()[1], 0)
+
+    def test_refuses_inside_transaction(self):
+        with transaction.atomic(), self.assertRaisesMessage(CommandError, 'inside a transaction'):
+            call_command('compact_database', stdout=io.StringIO())
+
+
+class ChunkStoreTests(TestCase):
+    """Chunk stores encode and decode chunk text, indexes and pages"""
+
+    def test_round_trip(self):
+        rows = [('First chunk.', 0, 1), ('Zweiter Abschnitt – ü.', 1, None), ('', 2, 3)]
+        store = ChunkStore(ChunkStore.encode(rows, chunk_version=4))
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.chunk_version, 4)
+        self.assertEqual([(c.chunk_text, c.chunk_index, c.page_number) for c in store], rows)
+
+    def test_empty_store(self):
+        store = ChunkStore(ChunkStore.encode([]))
+        self.assertEqual(len(store), 0)
+        self.assertEqual(list(store), [])
+
+    def test_arrays_are_little_endian(self):
+        data = ChunkStore.encode([('ab', 7, 3)])
+        self.assertEqual(data[16:32], bytes([0, 0, 0, 0, 2, 0, 0, 0, 3, 0, 0, 0, 7, 0, 0, 0]))
+
+    def test_stale_version_rebuilds_the_store(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        os.makedirs(os.path.join(media, 'pdfs'))
+        with override_settings(MEDIA_ROOT=media):
+            pdf_doc = create_corpus(User.objects.create_user('owner', password='pw'), documents=1, threads=0, chunks=2)[0]
+            self.assertEqual(len(get_chunk_store(pdf_doc)), 2)
+            self.assertTrue(os.path.exists(os.path.join(media, 'pdfs', 'doc0.pdf.chunks')))
+            PDFChunk.objects.create(pdf_document=pdf_doc, chunk_text='Added later.', chunk_index=2, page_number=3)
+            PDFDocument.objects.filter(pk=pdf_doc.pk).update(chunk_version=F('chunk_version') + 1)
+            pdf_doc.refresh_from_db()
+            store = get_chunk_store(pdf_doc)
+            self.assertEqual((len(store), store.chunk_version), (3, pdf_doc.chunk_version))
+            self.assertEqual(store.chunk(2).chunk_text, 'Added later.')
+
+
+class CounterTests(TestCase):
+    """Denormalised counters follow writes and deletes"""
+
+    @classmethod
+    def setUpClass(cls):
+        media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        cls.enterClassContext(override_settings(MEDIA_ROOT=media_root))
+        super().setUpClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user('counter', password='pw')
+        self.client.force_login(self.user)
+        self.pdf_doc = PDFDocument.objects.create(title='Counted', file='pdfs/counted.pdf', uploaded_by=self.user)
+
+    def test_thread_and_question_counters(self):
+        self.client.post(reverse('easylearning:create_thread', args=[self.pdf_doc.id]), {'title': 'Counting'})
+        self.pdf_doc.refresh_from_db()
+        self.assertEqual(self.pdf_doc.thread_count, 1)
+
+        thread = self.pdf_doc.conversations.get()
+        response = self.client.post(
+            reverse('easylearning:ask_question_api'),
+            data={'question': 'What is counted?', 'thread_id': str(thread.id)},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        thread.refresh_from_db()
+        self.assertEqual((thread.question_count, thread.answered_count), (1, 1))
+        self.assertIsNotNone(thread.last_question_at)
+
+        thread.questions.get().answer.delete()
+        thread.refresh_from_db()
+        self.assertEqual((thread.question_count, thread.answered_count), (1, 0))
+
+        thread.delete()
+        self.pdf_doc.refresh_from_db()
+        self.assertEqual(self.pdf_doc.thread_count, 0)
+
+    def test_rows_created_outside_the_views_are_counted(self):
+        # As the admin, scripts and seeding commands create them
+        thread = ConversationThread.objects.create(pdf_document=self.pdf_doc)
+        question = Question.objects.create(thread=thread, question_text='Counted?')
+        Answer.objects.create(question=question, answer_text='Yes.')
+        question.save()
+        self.pdf_doc.refresh_from_db()
+        thread.refresh_from_db()
+        self.assertEqual(self.pdf_doc.thread_count, 1)
+        self.assertEqual((thread.question_count, thread.answered_count), (1, 1))
+        self.assertEqual(thread.last_question_at, question.asked_at)
+
+
+class ArchiveTests(TestCase):
+    """Idle threads are archived and restored when opened"""
+
+    @classmethod
+    def setUpClass(cls):
+        media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        cls.enterClassContext(override_settings(MEDIA_ROOT=media_root))
+        super().setUpClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user('archivist', password='pw')
+        self.client.force_login(self.user)
+        self.thread = create_corpus(self.user, documents=1, threads=1, questions=3)[0].conversations.get()
+        self.original = list(
+            self.thread.questions.order_by('asked_at').values_list('id', 'asked_at', 'answer__answer_text')
+        )
+        ConversationThread.objects.filter(pk=self.thread.pk).update(
+            question_count=3, answered_count=3, updated_at=timezone.now() - timedelta(days=120)
+        )
+
+    def test_archive_and_restore(self):
+        self.assertEqual(list(idle_threads(90)), [self.thread])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(archive_thread(self.thread), 3)
+        # One delete per table and no counter updates, however many questions
+        statements = [query['sql'].split()[0] for query in queries.captured_queries]
+        self.assertEqual((statements.count('DELETE'), statements.count('UPDATE')), (2, 0))
+        self.assertFalse(Question.objects.exists())
+        self.assertFalse(Answer.objects.exists())
+        self.assertEqual(
+            ConversationThread.objects.values_list('question_count', 'answered_count').get(), (3, 3)
+        )
+        self.assertEqual(list(idle_threads(90)), [])
+
+        response = self.client.get(reverse('easylearning:thread_detail', args=[self.thread.id]))
+        self.assertContains(response, 'Answer 2.')
+        self.assertFalse(ArchivedThread.objects.exists())
+        self.assertEqual(
+            list(self.thread.questions.order_by('asked_at').values_list('id', 'asked_at', 'answer__answer_text')),
+            self.original
+        )
+        # A thread that was just opened is not archived again by the next run
+        self.assertEqual(list(idle_threads(90)), [])
+
+
+class CorpusTransferTests(TestCase):
+    """A corpus survives an export and import round trip"""
+
+    def snapshot(self):
+        return {
+            'documents': list(PDFDocument.objects.order_by('pk').values_list('pk', 'title', 'uploaded_at', 'uploaded_by')),
+            'chunks': list(PDFChunk.objects.order_by('pk').values_list('pk', 'chunk_text', 'chunk_index')),
+            'pages': list(PDFPage.objects.order_by('pk').values_list('pk', 'pdf_document', 'page_number', 'text', 'text_hash')),
+            'sections': list(SectionSummary.objects.order_by('pk').values_list(
+                'pk', 'pdf_document', 'position', 'title', 'first_page', 'last_page', 'summary_text', 'generated_at'
+            )),
+            'canonical_answers': list(CanonicalAnswer.objects.order_by('pk').values_list(
+                'pk', 'pdf_document', 'kind', 'chapter', 'language', 'answer_text', 'generated_at'
+            )),
+            'questions': list(Question.objects.order_by('pk').values_list('pk', 'asked_at', 'asked_by', 'answer__answer_text')),
+            'threads': list(ConversationThread.objects.order_by('pk').values_list('pk', 'updated_at')),
+        }
+
+    def test_round_trip(self):
+        user = User.objects.create_user('exporter', password='pw')
+        other = User.objects.create_user('other', password='pw')
+        create_corpus(user, documents=2, threads=2, questions=2)
+        create_corpus(other, documents=1)
+        for pdf_doc in PDFDocument.objects.all():
+            PDFPage.objects.bulk_create(
+                PDFPage(pdf_document=pdf_doc, page_number=n, text=f'Text of page {n}.', text_hash=f'{n:064x}')
+                for n in (1, 2)
+            )
+            SectionSummary.objects.create(pdf_document=pdf_doc, position=0, title='Chapter 1', first_page=1,
+                                          last_page=2, summary_text='The first chapter.')
+            CanonicalAnswer.objects.create(pdf_document=pdf_doc, kind='overview', language='en',
+                                           chunk_version=pdf_doc.chunk_version, answer_text='An overview.')
+        before = self.snapshot()
+        
+        stream = io.StringIO()
+        counts = export_corpus(stream, select_documents(), chunk_size=3)
+        self.assertEqual(counts['document'], 3)
+        self.assertEqual(counts['answer'], 2 * 2 * 2 + 2 * 3)
+        self.assertEqual(counts['page'], 3 * 2)
+        self.assertEqual(counts['section_summary'], 3)
+        self.assertEqual(counts['canonical_answer'], 3)
+        self.assertEqual(export_corpus(io.StringIO(), select_documents(username='other'))['document'], 1)
+        
+        PDFDocument.objects.all().delete()
+        stream.seek(0)
+        CorpusImporter(batch_size=4).load(stream)
+        self.assertEqual(self.snapshot(), before)
+        self.assertTrue(all(doc.chunk_version == 1 for doc in PDFDocument.objects.all()))
+        # Canonical answers stay current for the imported chunk version
+        self.assertEqual(CanonicalAnswer.objects.filter(chunk_version=1).count(), 3)
+        
+        stream.seek(0)
+        importer = CorpusImporter(skip_existing=True)
+        importer.load(stream)
+        self.assertEqual(sum(importer.counts.values()), 0)
+        self.assertEqual(importer.skipped, sum(counts.values()))
+
+
+class MaintenanceJobTests(TestCase):
+    """Admin actions queue jobs that a worker runs within the concurrency limit"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        os.makedirs(os.path.join(media_root, 'pdfs'))
+        make_pdf(os.path.join(media_root, 'pdfs', 'story.pdf'), 6, sentences_per_page=8)
+        self.admin = User.objects.create_superuser('maintainer', password='pw')
+        self.client.force_login(self.admin)
+        self.pdf_doc = PDFDocument.objects.create(title='Story', file='pdfs/story.pdf', uploaded_by=self.admin)
+
+    def run_action(self, action):
+        return self.client.post(reverse('admin:easylearning_pdfdocument_changelist'), {
+            'action': action, '_selected_action': [str(self.pdf_doc.pk)],
+        }, follow=True)
+
+    def test_extract_and_warm(self):
+        self.assertContains(self.run_action('reextract'), 'Queued 1 job(s)')
+        self.assertContains(self.run_action('reextract'), 'Queued 0 job(s), 1 already pending')
+        self.run_action('warm_caches')
+        self.assertEqual(run_pending(), 2)
+        
+        jobs = {job.kind: job for job in MaintenanceJob.objects.all()}
+        self.assertEqual([(job.status, job.progress) for job in jobs.values()], [('succeeded', 100)] * 2)
+        self.pdf_doc.refresh_from_db()
+        self.assertGreater(self.pdf_doc.chunk_count, 0)
+        self.assertEqual(self.pdf_doc.extraction_report['pages_extracted'], self.pdf_doc.page_count)
+        self.assertTrue(PDFSummary.objects.filter(pdf_document=self.pdf_doc).exists())
+
+    def test_reextract_reads_the_file_again(self):
+        from .extraction import extract_pages as extract
+        cached = extract(self.pdf_doc.file.path)
+        # As if an earlier extraction of the same file had failed
+        cached.pages, cached.error = [], 'document timeout while opening'
+        self.run_action('reextract')
+        run_pending()
+        job = MaintenanceJob.objects.get()
+        self.assertEqual(job.status, 'succeeded', job.message)
+        self.pdf_doc.refresh_from_db()
+        self.assertGreater(self.pdf_doc.chunk_count, 0)
+
+    def test_failed_rechunk_keeps_chunks_and_store(self):
+        self.run_action('rechunk')
+        with self.captureOnCommitCallbacks(execute=True):
+            run_pending()
+        self.pdf_doc.refresh_from_db()
+        before = (self.pdf_doc.chunk_version, self.pdf_doc.chunk_count)
+        with open(chunk_store_path(self.pdf_doc), 'rb') as fh:
+            store = fh.read()
+        
+        self.run_action('rechunk')
+        with mock.patch('easylearning.ingestion.save_pages', side_effect=RuntimeError('disk full')):
+            with self.captureOnCommitCallbacks(execute=True):
+                run_pending()
+        job = MaintenanceJob.objects.filter(status='failed').get()
+        self.assertEqual(job.message, 'disk full')
+        self.pdf_doc.refresh_from_db()
+        self.assertEqual((self.pdf_doc.chunk_version, self.pdf_doc.chunk_count), before)
+        self.assertEqual(PDFChunk.objects.filter(pdf_document=self.pdf_doc).count(), before[1])
+        with open(chunk_store_path(self.pdf_doc), 'rb') as fh:
+            self.assertEqual(fh.read(), store)
+
+    def test_queued_jobs_resume(self):
+        MaintenanceJob.objects.create(pdf_document=self.pdf_doc, kind='warm')
+        with mock.patch('easylearning.admin.start_worker') as start_worker:
+            self.client.get(reverse('admin:easylearning_maintenancejob_changelist'))
+        start_worker.assert_called_once_with()
+
+    def test_running_limit(self):
+        MaintenanceJob.objects.create(pdf_document=self.pdf_doc, kind='warm', status='running')
+        self.run_action('rechunk')
+        self.assertEqual(run_pending(), 0)
+        self.assertTrue(MaintenanceJob.objects.filter(kind='rechunk', status='queued').exists())
+
+    @override_settings(MAINTENANCE_JOB_TIMEOUT=60)
+    def test_abandoned_job_frees_its_slot(self):
+        stale = MaintenanceJob.objects.create(
+            pdf_document=self.pdf_doc, kind='reindex', status='running', started_at=timezone.now() - timedelta(minutes=5)
+        )
+        self.run_action('warm_caches')
+        self.assertEqual(run_pending(), 1)
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, 'failed')
+        self.assertIn('stopped', stale.message)
+        
+        stale.status = 'running'
+        stale.save()
+        out = io.StringIO()
+        call_command('run_maintenance_jobs', stdout=out)
+        self.assertIn('Failed 1 jobs that stopped running', out.getvalue())
+
+
+class ExtractionTests(SimpleTestCase):
+    """PDF text is extracted in a limited child process, skipping what breaks the limits"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.story = make_pdf(os.path.join(cls.directory, 'story.pdf'), 30, sentences_per_page=10)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_sandbox_matches_in_process(self):
+        with override_settings(PDF_EXTRACTION_SANDBOX=False):
+            expected = extract_pages(self.story)
+        result = extract_pages(self.story)
+        self.assertEqual(result.pages, expected.pages)
+        report = result.report()
+        self.assertEqual((report['pages_extracted'], report['skipped'], report['error']),
+                         (report['page_total'], [], None))
+
+    def test_limits_skip_pages(self):
+        long_story = make_pdf(os.path.join(self.directory, 'long_story.pdf'), 120, sentences_per_page=40)
+        with override_settings(PDF_EXTRACTION_PAGE_TIMEOUT=0.0001, PDF_EXTRACTION_DOCUMENT_TIMEOUT=1):
+            with mock.patch('easylearning.extraction.logger') as logger:
+                result = extract_pages(long_story)
+        self.assertIsNone(result.error)
+        self.assertEqual(len(result.pages) + len(result.skipped), result.page_total)
+        self.assertEqual(result.skipped[-1], {'page': result.page_total, 'reason': 'document timeout'})
+        self.assertEqual(logger.warning.call_count, len(result.skipped))
+
+    def test_result_reuse(self):
+        from .extraction import forget_extraction
+        first = extract_pages(self.story)
+        self.assertIs(extract_pages(self.story), first)
+        self.assertIsNot(extract_pages(self.story, reuse=False), first)
+        second = extract_pages(self.story)
+        forget_extraction(self.story)
+        self.assertIsNot(extract_pages(self.story), second)
+
+    def test_unreadable_file(self):
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as broken:
+            broken.write(b'%PDF-1.4 truncated')
+            broken.flush()
+            result = extract_pages(broken.name)
+        self.assertTrue(result.error)
+        self.assertEqual(result.pages, [])
+
+
+class BenchmarkTests(TestCase):
+    """The benchmark suite runs on synthetic PDFs and flags regressions against a baseline"""
+
+    def test_synthetic_pdf(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            result = extract_pages(make_pdf(os.path.join(workdir, 'synthetic.pdf'), 3), reuse=False)
+        self.assertEqual((result.page_total, len(result.pages), result.error), (3, 3, None))
+        self.assertGreater(len(result.text.split('.')), 30)
+
+    def test_suite_and_regressions(self):
+        results = run_suite(pages=[2], chunk_counts=[20], languages=['hi'], repeat=1)
+        self.assertEqual([name.split('[')[0] for name in results], [
+            'extraction', 'extraction.sandbox', 'chunking', 'summarisation', 'db_write', 'question_analysis', 'scoring', 'translation',
+        ])
+        self.assertTrue(all(result['ops_per_sec'] > 0 for result in results.values()))
+        self.assertFalse(PDFDocument.objects.exists())
+        
+        baseline = {'results': {'scoring[chunks=20]': {'ops_per_sec': 100.0, 'peak_kib': 10.0}}}
+        current = {'scoring[chunks=20]': {'ops_per_sec': 70.0, 'peak_kib': 11.0}}
+        self.assertEqual(compare(current, baseline, 0.5), [])
+        self.assertEqual([r[:2] for r in compare(current, baseline, 0.2)], [('scoring[chunks=20]', 'ops_per_sec')])
+
+
+@override_settings(SINGLE_FLIGHT_CACHE='default')
+class LoadTestTests(TransactionTestCase):
+    """The load test seeds a corpus, drives the endpoints from several threads and cleans up"""
+
+    def test_mix_and_percentiles(self):
+        self.assertEqual(parse_mix('ask=8, thread=1,upload'), {'ask': 8.0, 'thread': 1.0, 'upload': 1.0})
+        with self.assertRaises(ValueError):
+            parse_mix('browse=1')
+        self.assertEqual([percentile(list(range(1, 101)), f) for f in (0.5, 0.99, 1.0)], [50, 99, 100])
+
+    def test_run(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            output = os.path.join(workdir, 'report.json')
+            call_command('loadtest', '--requests', '8', '--concurrency', '1', '--documents', '1', '--pages', '2',
+                         '--mix', 'ask=3,thread=1', '--no-admission', '--output', output, stdout=io.StringIO())
+            with open(output) as fh:
+                report = json.load(fh)
+        self.assertEqual(report['overall']['requests'], 8)
+        self.assertEqual(report['overall']['errors'], 0)
+        self.assertLessEqual(set(report['operations']), {'ask', 'thread'})
+        self.assertFalse(User.objects.filter(username__startswith='loadtest').exists())
+        self.assertFalse(PDFDocument.objects.exists())
+        
+        rows = {label: change for label, _, _, change in compare_reports(report, report)}
+        self.assertEqual(rows['overall throughput_rps'], 0)
+
+    def test_keep(self):
+        stdout = io.StringIO()
+        call_command('loadtest', '--requests', '2', '--concurrency', '1', '--documents', '1', '--pages', '2',
+                     '--mix', 'thread=1', '--no-admission', '--keep', stdout=stdout)
+        media_root = stdout.getvalue().split('Kept the seeded files in ')[1].splitlines()[0]
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.assertTrue(os.path.exists(os.path.join(media_root, PDFDocument.objects.get().file.name)))
+        cleanup()
+        self.assertFalse(PDFDocument.objects.exists())
+
+
+class RetrievalEvaluationTests(TestCase):
+    """Registered engines are scored on recall@k and MRR over a labelled question set"""
+
+    texts = [
+        'Apples ripen in the orchard during autumn. Farmers pick them by hand. The harvest lasts weeks',
+        'The lighthouse keeper climbed the spiral stairs. He lit the lamp at dusk. Ships passed safely',
+        'Volcanoes erupt when magma rises through the crust. Lava cools into basalt. Ash covers the valley',
+        'The orchestra tuned their violins before the concert. The conductor raised his baton. Music filled the hall',
+    ]
+
+    def setUp(self):
+        self.pdf_doc = PDFDocument.objects.create(title='Assorted facts')
+        PDFChunk.objects.bulk_create([
+            PDFChunk(pdf_document=self.pdf_doc, chunk_text=text, chunk_index=i, page_number=i + 1)
+            for i, text in enumerate(self.texts)
+        ])
+        PDFDocument.objects.filter(pk=self.pdf_doc.pk).update(chunk_version=1, chunk_count=len(self.texts))
+        self.pdf_doc.refresh_from_db()
+
+    def test_labelled_set(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as fh:
+            self.addCleanup(os.remove, fh.name)
+            fh.write(json.dumps({'document': 'Assorted facts', 'question': 'When does lava cool into basalt?', 'chunks': [2]}) + '\n')
+            fh.write(json.dumps({'document': str(self.pdf_doc.pk), 'question': 'Who lit the lighthouse lamp?', 'pages': [2]}) + '\n')
+        items = load_question_set(fh.name)
+        self.assertEqual([item['document'] for item in items], [self.pdf_doc] * 2)
+        
+        results = evaluate(items, ['rules', 'fts'], ks=(1, 3))
+        for name in ('rules', 'fts'):
+            self.assertEqual(results[name]['queries'], 2)
+            self.assertEqual(results[name]['recall@3'], 1.0)
+            self.assertGreater(results[name]['mrr'], 0.5)
+            self.assertGreaterEqual(results[name]['latency_ms']['max'], results[name]['latency_ms']['p50'])
+
+    def test_synthetic_set(self):
+        items = synthetic_question_set([self.pdf_doc], per_document=4)
+        self.assertEqual(len(items), 4)
+        self.assertEqual(evaluate(items, ['fts'], ks=(1,))['fts']['recall@1'], 1.0)
+
+
+class ColdStartTests(SimpleTestCase):
+    """Workers boot without loading PDF parsing, answering or translation"""
+
+    def test_lazy_modules_stay_unloaded(self):
+        result = measure_cold_start()
+        self.assertNotIn('PyPDF2', result['modules'])
+        self.assertNotIn('easylearning.translation', result['modules'])
+        self.assertIn('easylearning.views', result['modules'])
+        self.assertGreater(result['urlconf_ms'], 0)
+
+    def test_parse_importtime(self):
+        output = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |     json.decoder\n'
+            'import time:       300 |        420 |   json\n'
+        )
+        self.assertEqual(parse_importtime(output), [('json.decoder', 120, 120, 2), ('json', 300, 420, 1)])
+
+
+class AdmissionControlTests(TestCase):
+    """The question API sheds load with 429/503 and Retry-After"""
+
+    @classmethod
+    def setUpClass(cls):
+        media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        cls.enterClassContext(override_settings(MEDIA_ROOT=media_root))
+        super().setUpClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user('asker', password='pw')
+        self.client.force_login(self.user)
+        pdf_doc = PDFDocument.objects.create(title='Limited', file='pdfs/limited.pdf', uploaded_by=self.user)
+        self.thread = ConversationThread.objects.create(pdf_document=pdf_doc)
+
+    def ask(self):
+        return self.client.post(
+            reverse('easylearning:ask_question_api'),
+            data={'question': 'What is limited?', 'thread_id': str(self.thread.id)},
+            content_type='application/json',
+        )
+
+    @override_settings(QA_USER_BURST=2, QA_USER_RATE=0.1)
+    def test_user_rate_limit(self):
+        self.assertEqual([self.ask().status_code for _ in range(2)], [200, 200])
+        response = self.ask()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '10')
+        self.assertEqual(Question.objects.count(), 2)
+
+    @override_settings(QA_ADMISSION_LOCK_WAIT=0.01)
+    def test_contended_bucket_rejects(self):
+        from .admission import BUCKET_PREFIX
+        key = f'{BUCKET_PREFIX}:user:{self.user.pk}'
+        caches['shared'].set(f'{key}:lock', 'other worker', timeout=5)
+        self.addCleanup(caches['shared'].delete, f'{key}:lock')
+        response = self.ask()
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '1'))
+        self.assertEqual(response.json()['reason'], 'lock_timeout')
+        self.assertFalse(Question.objects.exists())
+
+    @override_settings(QA_GLOBAL_RATE=0.01, QA_GLOBAL_BURST=1)
+    def test_global_rejection_returns_the_user_token(self):
+        from .admission import BUCKET_PREFIX
+        caches['shared'].set(f'{BUCKET_PREFIX}:global', (0, time.time()), timeout=60)
+        self.addCleanup(caches['shared'].delete, f'{BUCKET_PREFIX}:global')
+        response = self.ask()
+        self.assertEqual(response.json()['reason'], 'global_rate')
+        tokens, _ = caches['shared'].get(f'{BUCKET_PREFIX}:user:{self.user.pk}')
+        self.assertAlmostEqual(tokens, 5, places=1)
+
+    def test_lock_wait_follows_the_backend(self):
+        from .admission import DATABASE_LOCK_WAIT, LOCK_WAIT, _lock_wait
+        self.assertEqual(_lock_wait(caches['shared']), DATABASE_LOCK_WAIT)
+        self.assertEqual(_lock_wait(caches['default']), LOCK_WAIT)
+
+    @override_settings(QA_MAX_CONCURRENT=0, QA_MAX_WAITING=0)
+    def test_saturated(self):
+        response = self.ask()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['reason'], 'queue_full')
+        self.assertIn('Retry-After', response)
+
+    @override_settings(QA_MAX_CONCURRENT=0, QA_QUEUE_TIMEOUT=0.05)
+    def test_queue_timeout_on_form(self):
+        response = self.client.post(
+            reverse('easylearning:thread_detail', args=[self.thread.id]),
+            {'question_text': 'Anything?', 'language': 'en'},
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(Question.objects.exists())
+
+
+@override_settings(SINGLE_FLIGHT_CACHE='default')
+class SingleFlightTests(SimpleTestCase):
+    """Identical concurrent questions share one computation"""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        time.sleep(0.2)
+        return ('answer', True, 0.9)
+
+    def test_normalise_question(self):
+        self.assertEqual(normalise_question('  Summarize   Chapter 3? '), 'summarize chapter 3')
+
+    def test_concurrent_callers_in_process(self):
+        results = []
+        workers = [threading.Thread(target=lambda: results.append(single_flight('k1', self.compute))) for _ in range(8)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [('answer', True, 0.9)] * 8)
+
+    def test_waits_for_other_process(self):
+        cache = caches['default']
+        cache.add(f'{KEY_PREFIX}:lock:k2', 1)
+        publisher = threading.Timer(0.1, lambda: cache.set(f'{KEY_PREFIX}:result:k2', ('remote', False, 0.1)))
+        publisher.start()
+        self.assertEqual(single_flight('k2', self.compute), ('remote', False, 0.1))
+        self.assertEqual(self.calls, 0)
+
+    def test_leader_failure_releases_waiters(self):
+        cache = caches['default']
+        cache.add(f'{KEY_PREFIX}:lock:k3', 1)
+        threading.Timer(0.1, lambda: cache.delete(f'{KEY_PREFIX}:lock:k3')).start()
+        self.assertEqual(single_flight('k3', self.compute), ('answer', True, 0.9))
+        self.assertEqual(self.calls, 1)
+
+
+@override_settings(SINGLE_FLIGHT_CACHE='default')
+class WarmupTests(TestCase):
+    """The most-asked documents and their frequent answers are preloaded"""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create_user('warm', password='pw')
+        self.hot, self.cold = [
+            PDFDocument.objects.create(title=title, uploaded_by=self.user, chunk_version=1)
+            for title in ('Seasons', 'Tides')
+        ]
+        PDFChunk.objects.create(pdf_document=self.hot, chunk_text='Apples ripen in autumn in the orchard.', chunk_index=0, page_number=1)
+        self.thread = ConversationThread.objects.create(pdf_document=self.hot)
+        for text in ('When do apples ripen?', 'when do apples ripen', 'Where is the orchard?'):
+            Question.objects.create(thread=self.thread, question_text=text, language='gu', asked_by=self.user)
+        Question.objects.create(thread=ConversationThread.objects.create(pdf_document=self.cold), question_text='Tides?')
+
+    def test_hot_documents(self):
+        self.assertEqual(hot_documents(days=7, limit=5), [(self.hot, 3), (self.cold, 1)])
+        Question.objects.update(asked_at=timezone.now() - timedelta(days=10))
+        self.assertEqual(hot_documents(days=7, limit=5), [])
+
+    def test_warmed_answers_are_served(self):
+        out = io.StringIO()
+        call_command('warm_caches', '--documents', '1', '--answers', '1', stdout=out)
+        self.assertIn('Warmed 1 of 1 documents, 1 answers stored', out.getvalue())
+        
+        # Stored under the coalescing key, so any spelling of the question finds it
+        expected = warmed_answer(question_key(self.hot, 'When do apples ripen', 'gu'))
+        self.assertTrue(expected[1])
+        self.assertIsNone(warmed_answer(question_key(self.hot, 'Where is the orchard?', 'gu')))
+        
+        self.client.force_login(self.user)
+        with mock.patch('easylearning.answering.generate_answer', side_effect=AssertionError):
+            response = self.client.post(
+                reverse('easylearning:ask_question_api'),
+                data={'question': 'When do apples ripen?', 'thread_id': str(self.thread.id), 'language': 'gu'},
+                content_type='application/json',
+            )
+        self.assertEqual(response.json()['answer_text'], expected[0])
+
+    def test_unanswered_questions_are_not_stored(self):
+        # The cold document has no chunks, so its question gets the "cannot find" reply
+        results = warm_caches(days=7, documents=2, answers=5)
+        self.assertEqual([result['document'] for result in results], [self.hot, self.cold])
+        self.assertEqual(results[1]['answers'], 0)
+        self.assertIsNone(warmed_answer(question_key(self.cold, 'Tides?', 'en')))
+
+    def test_answers_follow_chunk_version(self):
+        warm_caches(days=7, documents=1, answers=1)
+        PDFDocument.objects.filter(pk=self.hot.pk).update(chunk_version=2)
+        self.hot.refresh_from_db()
+        self.assertIsNone(warmed_answer(question_key(self.hot, 'When do apples ripen?', 'gu')))
+
+
+class IngestedBookMixin:
+    """A six-page synthetic PDF ingested into a scratch MEDIA_ROOT"""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=self.media, PDF_EXTRACTION_SANDBOX=False)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        os.makedirs(os.path.join(self.media, 'pdfs'))
+        
+        from .ingestion import create_pdf_chunks
+        self.user = User.objects.create_user('editor', password='pw')
+        make_pdf(os.path.join(self.media, 'pdfs', 'book.pdf'), 6, sentences_per_page=8)
+        self.pdf_doc = PDFDocument.objects.create(title='Book', file='pdfs/book.pdf', uploaded_by=self.user)
+        create_pdf_chunks(self.pdf_doc)
+        self.pdf_doc.refresh_from_db()
+        self.thread = ConversationThread.objects.create(pdf_document=self.pdf_doc)
+
+    def revised(self, pages=6, edits=None):
+        path = os.path.join(self.media, 'revised.pdf')
+        make_pdf(path, pages, sentences_per_page=8, edits=edits)
+        with open(path, 'rb') as fh:
+            return SimpleUploadedFile('book.pdf', fh.read(), content_type='application/pdf')
+
+class ReplaceFileTests(IngestedBookMixin, TestCase):
+    """Replacing a document's file re-chunks only the pages whose text changed"""
+
+    def chunk_ids(self):
+        return dict(PDFChunk.objects.filter(pdf_document=self.pdf_doc).values_list('pk', 'page_number'))
+
+    def assert_consistent(self):
+        self.pdf_doc.refresh_from_db()
+        rows = list(PDFChunk.objects.filter(pdf_document=self.pdf_doc).order_by('chunk_index').values_list('chunk_index', 'page_number', 'chunk_text'))
+        self.assertEqual([index for index, _, _ in rows], list(range(len(rows))))
+        self.assertEqual([page for _, page, _ in rows], sorted(page for _, page, _ in rows))
+        self.assertEqual(self.pdf_doc.chunk_count, len(rows))
+        self.assertEqual(self.pdf_doc.text_chars, sum(len(text) for _, _, text in rows))
+        store = get_chunk_store(self.pdf_doc)
+        self.assertEqual([(c.chunk_index, c.page_number, c.chunk_text) for c in store], rows)
+
+    def test_only_changed_pages_are_rechunked(self):
+        from .ingestion import replace_document_file
+        before = self.chunk_ids()
+        old_path = self.pdf_doc.file.path
+        edit = 'A corrected sentence about the river. Another fixed line. The end of the revised page.'
+        
+        report = replace_document_file(self.pdf_doc, self.revised(edits={3: edit}))
+        self.assertEqual(report['changed_pages'], [3])
+        self.assertEqual(report['removed_pages'], [])
+        after = self.chunk_ids()
+        self.assertEqual({pk for pk, page in before.items() if page != 3}, {pk for pk, page in after.items() if page != 3})
+        self.assertFalse({pk for pk, page in before.items() if page == 3} & set(after))
+        self.assertTrue(PDFChunk.objects.filter(pdf_document=self.pdf_doc, page_number=3, chunk_text__startswith='A corrected').exists())
+        self.assertEqual(self.pdf_doc.pages.count(), 6)
+        
+        self.assert_consistent()
+        self.assertEqual(self.pdf_doc.chunk_version, 2)
+        self.assertFalse(os.path.exists(old_path))
+        self.assertEqual(self.pdf_doc.conversations.get(), self.thread)
+        
+        # The same file again changes nothing
+        report = replace_document_file(self.pdf_doc, self.revised(edits={3: edit}))
+        self.assertEqual((report['changed_pages'], report['chunks_created']), ([], 0))
+
+    def test_removed_pages_and_legacy_documents(self):
+        from .ingestion import replace_document_file
+        report = replace_document_file(self.pdf_doc, self.revised(pages=4))
+        self.assertEqual((report['changed_pages'], report['removed_pages']), ([], [5, 6]))
+        self.assert_consistent()
+        self.assertEqual(self.pdf_doc.page_count, 4)
+        
+        # Without page hashes every page is chunked again
+        PDFPage.objects.filter(pdf_document=self.pdf_doc).delete()
+        report = replace_document_file(self.pdf_doc, self.revised(pages=4))
+        self.assertEqual(report['changed_pages'], [1, 2, 3, 4])
+        self.assert_consistent()
+
+    def test_view_checks_owner_and_file(self):
+        url = reverse('easylearning:replace_pdf', args=[self.pdf_doc.id])
+        self.client.force_login(User.objects.create_user('stranger', password='pw'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+        
+        self.client.force_login(self.user)
+        broken = SimpleUploadedFile('book.pdf', b'%PDF-1.4 not really', content_type='application/pdf')
+        response = self.client.post(url, {'file': broken})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.media, 'pdfs'))), ['book.pdf', 'book.pdf.chunks'])
+        
+        response = self.client.post(url, {'file': self.revised(edits={1: 'New opening.'})})
+        self.assertRedirects(response, reverse('easylearning:pdf_detail', args=[self.pdf_doc.id]), fetch_redirect_response=False)
+
+
+
+class CanonicalAnswerTests(IngestedBookMixin, TestCase):
+    """Common questions are answered from rows computed at ingestion"""
+
+    def test_answers_stored_per_language_and_version(self):
+        rows = CanonicalAnswer.objects.filter(pdf_document=self.pdf_doc)
+        self.assertEqual(set(rows.values_list('kind', 'language')), {
+            (kind, language) for kind in ('overview', 'characters', 'setting') for language in ('en', 'gu', 'hi')
+        })
+        self.assertEqual(set(rows.values_list('chunk_version', flat=True)), {self.pdf_doc.chunk_version})
+        
+        from .ingestion import replace_document_file
+        edits = {1: 'Chapter 1 The river runs through the old valley town.', 4: 'Chapter 2 The mountain road climbs above the clouds.'}
+        replace_document_file(self.pdf_doc, self.revised(edits=edits))
+        self.assertEqual(
+            sorted(rows.filter(kind='chapter', language='en').values_list('chapter', flat=True)), [1, 2]
+        )
+        self.assertEqual(set(rows.values_list('chunk_version', flat=True)), {self.pdf_doc.chunk_version})
+
+    def test_mapped_questions_cost_one_query(self):
+        from .answering import generate_answer
+        CanonicalAnswer.objects.filter(pdf_document=self.pdf_doc, kind='characters', language='hi').update(
+            answer_text='Stored characters.', confidence_score=0.7,
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(generate_answer('Who are the characters?', self.pdf_doc, 'hi'), ('Stored characters.', True, 0.7))
+        self.assertEqual(len(queries), 1)
+        
+        # Questions about a name, and answers for an older chunk version, are not used
+        self.assertNotEqual(generate_answer('Who is Haruto?', self.pdf_doc, 'hi')[0], 'Stored characters.')
+        CanonicalAnswer.objects.filter(pdf_document=self.pdf_doc).update(chunk_version=0)
+        self.assertNotEqual(generate_answer('Who are the characters?', self.pdf_doc, 'hi')[0], 'Stored characters.')
+
+    def test_specific_questions_are_not_mapped(self):
+        from .answering import analyze_question, canonical_kind
+        mapped = {
+            'Who are the main characters?': ('characters', 0),
+            'Give me a summary of chapter 2': ('chapter', 2),
+            'Give me an overview of the document': ('overview', 0),
+            'What weapon does Tanjiro use in chapter 2?': None,
+            'Who dies in chapter 3?': None,
+            'Who is the villain?': None,
+            'Who is the strongest character?': None,
+            'Where does it take place?': ('setting', 0),
+            'where was the sword forged?': None,
+            'Where is the sword kept?': None,
+            'tell me about the blood moon': None,
+            'summary of the final battle': None,
+        }
+        for question, expected in mapped.items():
+            with self.subTest(question=question):
+                self.assertEqual(canonical_kind(analyze_question(question)), expected)
+
+
+class PageTextTests(IngestedBookMixin, TestCase):
+    """Stored page text is served in ranges with chunk mappings and strong ETags"""
+
+    def fetch(self, **params):
+        self.client.force_login(self.user)
+        return self.client.get(reverse('easylearning:pdf_pages', args=[self.pdf_doc.id]), params)
+
+    def test_range_with_chunks(self):
+        response = self.fetch(start=2, count=2)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['start'], data['count'], data['next_start'], data['page_count']), (2, 2, 4, 6))
+        self.assertEqual([page['page_number'] for page in data['pages']], [2, 3])
+        for page in data['pages']:
+            stored = PDFPage.objects.get(pdf_document=self.pdf_doc, page_number=page['page_number'])
+            self.assertEqual(page['text'], stored.text)
+            self.assertEqual(page['chunks'], list(
+                self.pdf_doc.chunks.filter(page_number=page['page_number']).order_by('chunk_index').values_list('chunk_index', flat=True)
+            ))
+        
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertIn('public', response['Cache-Control'])
+        self.assertEqual(self.client.get(reverse('easylearning:pdf_pages', args=[self.pdf_doc.id]),
+                                         {'start': 2, 'count': 2}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertNotEqual(self.fetch(start=3, count=2)['ETag'], etag)
+
+    @override_settings(PDF_PAGES_STREAM_THRESHOLD=2)
+    def test_long_ranges_stream(self):
+        response = self.fetch(start=5, count=4)
+        self.assertTrue(response.streaming)
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([page['page_number'] for page in data['pages']], [5, 6])
+        self.assertIsNone(data['next_start'])
+
+    def test_missing_pages_and_bad_ranges(self):
+        PDFPage.objects.filter(pdf_document=self.pdf_doc, page_number=2).delete()
+        pages = self.fetch(start=1, count=3).json()['pages']
+        self.assertIsNone(pages[1]['text'])
+        self.assertTrue(pages[1]['chunks'])
+        self.assertEqual(self.fetch(start=0).status_code, 400)
+        self.assertEqual(self.fetch(count='many').status_code, 400)
+
+
+class SummarisationTests(TestCase):
+    """Sections are condensed independently, then reduced into the document summary"""
+
+    pages = [
+        (1, 'Chapter 1 The river. The river floods the valley every spring. Farmers on the river plant rice in the valley. '
+            'A cat sleeps. The valley river carries silt to the farmers and their rice fields.'),
+        (2, 'Boats carry rice down the river to the market town. The town market sells rice from the valley.'),
+        (3, 'Chapter 2 The mountain. Snow covers the mountain peaks in winter. Climbers cross the mountain passes slowly. '
+            'Tea is hot. The mountain snow melts and feeds the streams below the peaks.'),
+    ]
+
+    def test_sections_follow_chapters(self):
+        sections = split_sections(self.pages)
+        self.assertEqual([(s.title, s.first_page, s.last_page) for s in sections], [('Chapter 1', 1, 2), ('Chapter 2', 3, 3)])
+        numbered = split_sections([(1, 'CHAPTER IV The fourth.'), (2, 'Chapter 05 The fifth.'), (3, 'Chapter ix The ninth.')])
+        self.assertEqual([s.title for s in numbered], ['Chapter 4', 'Chapter 5', 'Chapter 9'])
+        fixed = split_sections([(n, 'No headings here.') for n in range(1, 6)], section_pages=2)
+        self.assertEqual([s.title for s in fixed], ['Pages 1-2', 'Pages 3-4', 'Page 5'])
+
+    def test_central_sentences_are_kept(self):
+        summary, sections = summarise(self.pages, sentences=2, section_sentences=2)
+        first = sections[0][1]
+        self.assertIn('river', first)
+        self.assertNotIn('A cat sleeps', first)
+        self.assertNotIn('Tea is hot', sections[1][1])
+        self.assertEqual(len(select_sentences(['Same sentence here again.'] * 4 + ['Other words entirely here now.'], 3)), 2)
+        self.assertTrue(summary)
+
+    def test_pool_matches_serial(self):
+        from . import summarisation
+        pages = [(n, self.pages[n % 3][1]) for n in range(1, 41)]
+        with mock.patch.object(summarisation, 'PARALLEL_MIN_CHARS', 0):
+            self.assertEqual(summarise(pages, workers=2), summarise(pages))
+
+    def test_summary_questions_use_stored_sections(self):
+        from .answering import generate_answer
+        from .ingestion import save_section_summaries
+        pdf_doc = PDFDocument.objects.create(title='Geography', chunk_version=1)
+        PDFChunk.objects.create(pdf_document=pdf_doc, chunk_text='The river floods the valley.', chunk_index=0, page_number=1)
+        save_section_summaries(pdf_doc, summarise(self.pages)[1])
+        self.assertEqual(SectionSummary.objects.filter(pdf_document=pdf_doc).count(), 2)
+        
+        answer, from_pdf, _ = generate_answer('Give me a summary of chapter 2', pdf_doc)
+        self.assertTrue(from_pdf)
+        self.assertIn('mountain', answer)
+        answer, _, _ = generate_answer('Give me an overview of the document', pdf_doc)
+        self.assertTrue(answer.startswith('Chapter 1: '))
+        self.assertIn('Chapter 2: ', answer)
+        # Questions about a name still search the chunks
+        self.assertNotIn('Chapter 1: ', generate_answer('Tell me about Ravi', pdf_doc)[0])
+        # So do lowercase questions about a topic
+        answer = generate_answer('tell me about the river floods', pdf_doc)[0]
+        self.assertNotIn('Chapter 1: ', answer)
+        self.assertIn('river floods the valley', answer)
+        
+        # Roman-numeral headings are found by the chapter's number
+        roman = PDFDocument.objects.create(title='Roman geography', chunk_version=1)
+        PDFChunk.objects.create(pdf_document=roman, chunk_text='The river floods the valley.', chunk_index=0, page_number=1)
+        pages = [(n, text.replace('Chapter 1', 'CHAPTER I').replace('Chapter 2', 'CHAPTER II')) for n, text in self.pages]
+        save_section_summaries(roman, summarise(pages)[1])
+        self.assertIn('mountain', generate_answer('Give me a summary of chapter 2', roman)[0])
+
+
+class PreflightTests(SimpleTestCase):
+    """Broken uploads are turned away after reading a few KB"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        with open(make_pdf(os.path.join(self.dir, 'doc.pdf'), 3, sentences_per_page=5), 'rb') as fh:
+            self.pdf = fh.read()
+
+    def check(self, data):
+        return preflight(io.BytesIO(data), len(data))
+
+    def reason(self, data):
+        with self.assertRaises(PreflightError) as caught:
+            self.check(data)
+        return caught.exception.reason
+
+    def test_valid_pdf(self):
+        fh = io.BytesIO(self.pdf)
+        self.assertEqual(preflight(fh, len(self.pdf)), {'version': '1.4', 'pages': 3})
+        self.assertEqual(fh.tell(), 0)
+
+    def test_rejections(self):
+        self.assertEqual(self.reason(b'<html><body>Not a PDF</body></html>'), 'header')
+        self.assertEqual(self.reason(self.pdf[:len(self.pdf) // 2]), 'trailer')
+        moved = self.pdf.replace(b'startxref\n', b'startxref\n1')
+        self.assertEqual(self.reason(moved), 'xref')
+        encrypted = self.pdf.replace(b'/Root 1 0 R', b'/Root 1 0 R /Encrypt 9 0 R')
+        self.assertEqual(self.reason(encrypted), 'encrypted')
+        self.assertEqual(self.reason(self.pdf.replace(b'/Count 3', b'/Count 0')), 'pages')
+        with override_settings(PDF_MAX_PAGES=2):
+            self.assertEqual(self.reason(self.pdf), 'pages')
+
+    def test_upload_form_rejects_before_saving(self):
+        from .forms import PDFUploadForm
+        upload = SimpleUploadedFile('doc.pdf', self.pdf[:-100], content_type='application/pdf')
+        form = PDFUploadForm(data={'title': 'Cut off'}, files={'file': upload})
+        self.assertFalse(form.is_valid())
+        self.assertIn('cut off', form.errors['file'][0])
+        upload = SimpleUploadedFile('doc.pdf', self.pdf, content_type='application/pdf')
+        self.assertTrue(PDFUploadForm(data={'title': 'Whole'}, files={'file': upload}).is_valid())
@@ -9,6 +9,9 @@ urlpatterns = [
     path('home/', views.home, name='home'),
     path('upload/', views.upload_pdf, name='upload_pdf'),
     path('pdf/<uuid:pdf_id>/', views.pdf_detail, name='pdf_detail'),
+    path('pdf/<uuid:pdf_id>/file/', views.download_pdf, name='download_pdf'),
+    path('pdf/<uuid:pdf_id>/pages/', views.pdf_pages, name='pdf_pages'),
+    path('pdf/<uuid:pdf_id>/replace/', views.replace_pdf, name='replace_pdf'),
     path('pdf/<uuid:pdf_id>/create-thread/', views.create_thread, name='create_thread'),
     path('thread/<uuid:thread_id>/', views.thread_detail, name='thread_detail'),
     path('api/ask-question/', views.ask_question_api, name='ask_question_api'),
@@ -20,4 +23,7 @@ urlpatterns = [
     path('password-reset/', auth_views.password_reset_view, name='password_reset'),
     path('profile/', views.profile_view, name='profile'),
     path('test-dropdown/', views.test_dropdown_view, name='test_dropdown'),
+    
+    # Monitoring
+    path('metrics', views.metrics_view, name='metrics'),
 ] 
\ No newline at end of file
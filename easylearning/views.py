@@ -1,16 +1,33 @@
 import os
-import PyPDF2
-import io
+import re
+import hashlib
+import logging
+from urllib.parse import quote
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse,
+)
+from django.middleware.csrf import get_token
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.utils.cache import patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.utils.http import content_disposition_header, http_date, parse_etags, quote_etag
+from django.db.models import Max, Prefetch, Sum
 from django.contrib.auth.decorators import login_required
-from django.utils import timezone
-from .models import PDFDocument, PDFSummary, ConversationThread, Question, Answer, PDFChunk
-from .forms import PDFUploadForm, QuestionForm, ThreadTitleForm
+from django.core.exceptions import PermissionDenied
+from django.conf import settings
+from .models import PDFDocument, PDFPage, PDFSummary, ConversationThread, Question, Answer
+from .forms import PDFReplaceForm, PDFUploadForm, QuestionForm, ThreadTitleForm
+from . import admission, coalescing, instrumentation
+from .archive import restore_thread
+from .chunkstore import get_chunk_store
 import json
 
+logger = logging.getLogger(__name__)
+
 
 def landing_view(request):
     """Landing page for non-authenticated users"""
@@ -22,7 +39,11 @@ def landing_view(request):
 @login_required
 def home(request):
     """Home page showing uploaded PDFs"""
-    pdfs = PDFDocument.objects.all().order_by('-uploaded_at')
+    pdfs = (
+        PDFDocument.objects.select_related('summary')
+        .prefetch_related(Prefetch('conversations', queryset=ConversationThread.objects.order_by('pk')))
+        .order_by('-uploaded_at')
+    )
     return render(request, 'easylearning/home.html', {'pdfs': pdfs})
 
 
@@ -30,22 +51,14 @@ def home(request):
 def upload_pdf(request):
     """Handle PDF upload and generate summary"""
     if request.method == 'POST':
-        print("=" * 50)
-        print("UPLOAD REQUEST RECEIVED")
-        print("=" * 50)
-        print(f"Request method: {request.method}")
-        print(f"Request POST data: {request.POST}")
-        print(f"Request FILES: {request.FILES}")
-        print(f"Request FILES keys: {list(request.FILES.keys()) if request.FILES else 'None'}")
+        from .ingestion import create_pdf_chunks, generate_pdf_summary
+        logger.debug("Upload request received: POST=%s FILES=%s", request.POST, list(request.FILES.keys()))
         
-        if request.FILES:
+        if logger.isEnabledFor(logging.DEBUG):
             for key, file_obj in request.FILES.items():
-                print(f"File '{key}': {file_obj.name}, size: {file_obj.size}, type: {file_obj.content_type}")
+                logger.debug("File '%s': %s, size: %s, type: %s", key, file_obj.name, file_obj.size, file_obj.content_type)
         
         form = PDFUploadForm(request.POST, request.FILES)
-        print(f"Form is valid: {form.is_valid()}")
-        print(f"Form errors: {form.errors}")
-        print(f"Form cleaned data: {form.cleaned_data if form.is_valid() else 'Form invalid'}")
         
         if form.is_valid():
             try:
@@ -53,7 +66,7 @@ def upload_pdf(request):
                 pdf_doc.uploaded_by = request.user
                 pdf_doc.save()
                 
-                print(f"PDF saved with ID: {pdf_doc.id}")
+                logger.info("PDF saved with ID: %s", pdf_doc.id)
                 
                 # Force file save to ensure file is accessible
                 pdf_doc.refresh_from_db()
@@ -63,86 +76,82 @@ def upload_pdf(request):
                     raise ValueError("No file was uploaded")
                 
                 file_path = pdf_doc.file.path
-                print(f"File path: {file_path}")
                 
                 if not os.path.exists(file_path):
                     raise ValueError(f"Uploaded file not found at: {file_path}")
                 
-                print(f"File exists: {os.path.exists(file_path)}")
-                print(f"File size: {os.path.getsize(file_path)} bytes")
+                logger.debug("File path: %s (%s bytes)", file_path, os.path.getsize(file_path))
                 
                 success = True
                 error_messages = []
                 
                 # Generate summary
                 try:
-                    print("Attempting to generate summary...")
-                    summary_text = generate_pdf_summary(file_path)
-                    print(f"Summary generated: {summary_text[:100]}...")
+                    summary_text = generate_pdf_summary(file_path, pdf_doc)
+                    logger.debug("Summary generated: %.100s...", summary_text)
                     
                     if summary_text and not summary_text.startswith("Error reading PDF"):
                         PDFSummary.objects.create(
                             pdf_document=pdf_doc,
                             summary_text=summary_text
                         )
-                        print("Summary saved successfully")
                     else:
                         error_messages.append("Could not generate summary from PDF")
-                        print(f"Summary error: {summary_text}")
+                        logger.warning("Summary error for %s: %s", pdf_doc.id, summary_text)
                 except Exception as e:
                     error_messages.append(f"Summary generation failed: {str(e)}")
                     success = False
-                    print(f"Summary exception: {e}")
+                    logger.exception("Summary generation failed for %s", pdf_doc.id)
                 
                 # Create text chunks for better Q&A
                 try:
-                    print("Attempting to create chunks...")
                     create_pdf_chunks(pdf_doc)
-                    print("Chunks created successfully")
                 except Exception as e:
                     error_messages.append(f"Text chunking failed: {str(e)}")
-                    print(f"Chunking exception: {e}")
+                    logger.exception("Chunking failed for %s", pdf_doc.id)
                     # Don't fail the entire upload for chunking errors
                 
                 # Create default conversation thread
                 try:
-                    print("Attempting to create thread...")
                     thread = ConversationThread.objects.create(
                         pdf_document=pdf_doc,
                         title=f"Conversation about {pdf_doc.title}"
                     )
-                    print(f"Thread created with ID: {thread.id}")
+                    logger.debug("Thread created with ID: %s", thread.id)
                 except Exception as e:
                     error_messages.append(f"Thread creation failed: {str(e)}")
-                    print(f"Thread creation exception: {e}")
+                    logger.exception("Thread creation failed for %s", pdf_doc.id)
                     # Don't fail the entire upload for thread creation errors
                 
                 if success:
                     if error_messages:
                         messages.warning(request, f'PDF "{pdf_doc.title}" uploaded with some issues: {"; ".join(error_messages)}')
+                        instrumentation.increment('easylearning_uploads_total', outcome='partial')
                     else:
                         messages.success(request, f'PDF "{pdf_doc.title}" uploaded successfully!')
-                    print("Upload successful, redirecting to PDF detail page")
+                        instrumentation.increment('easylearning_uploads_total', outcome='success')
                     return redirect('easylearning:pdf_detail', pdf_id=pdf_doc.id)
                 else:
                     # Only delete if critical errors occurred
                     if len(error_messages) > 1:  # More than just chunking/thread errors
                         messages.error(request, f'Critical errors occurred: {"; ".join(error_messages)}')
                         pdf_doc.delete()
-                        print("Critical errors, PDF deleted")
+                        logger.warning("Critical errors during upload, PDF deleted: %s", error_messages)
+                        instrumentation.increment('easylearning_uploads_total', outcome='failed')
                         return render(request, 'easylearning/upload.html', {'form': form})
                     else:
                         # Continue with partial success
                         messages.warning(request, f'PDF "{pdf_doc.title}" uploaded with some issues: {"; ".join(error_messages)}')
-                        print("Partial success, redirecting to PDF detail page")
+                        instrumentation.increment('easylearning_uploads_total', outcome='partial')
                         return redirect('easylearning:pdf_detail', pdf_id=pdf_doc.id)
                         
             except Exception as e:
-                print(f"Critical upload error: {e}")
+                logger.exception("Critical upload error")
+                instrumentation.increment('easylearning_uploads_total', outcome='failed')
                 messages.error(request, f'Critical error during upload: {str(e)}')
                 return render(request, 'easylearning/upload.html', {'form': form})
         else:
-            print(f"Form validation failed: {form.errors}")
+            logger.info("Upload form validation failed: %s", form.errors.as_json())
             for field, errors in form.errors.items():
                 for error in errors:
                     messages.error(request, f'{field}: {error}')
@@ -152,6 +161,70 @@ def upload_pdf(request):
     return render(request, 'easylearning/upload.html', {'form': form})
 
 
+# Bump when the detail templates change so browsers drop their cached copies
+PAGE_VALIDATOR_VERSION = '1'
+
+
+def _build_validators(request, parts, timestamps):
+    """Build an (etag, last_modified) pair from the state a page renders"""
+    # Pending flash messages are rendered once, so never answer 304 over them
+    if len(messages.get_messages(request)):
+        return None, None
+    
+    user_id = request.user.pk if request.user.is_authenticated else 'anon'
+    # Pages embed the CSRF token, which rotates on login; a 304 must not keep an old one
+    get_token(request)
+    csrf_secret = request.META.get('CSRF_COOKIE', '')
+    raw = '|'.join(str(part) for part in (PAGE_VALIDATOR_VERSION, user_id, csrf_secret, *parts))
+    etag = hashlib.md5(raw.encode('utf-8'), usedforsecurity=False).hexdigest()
+    last_modified = max((ts for ts in timestamps if ts), default=None)
+    return etag, last_modified
+
+
+def pdf_detail_validators(request, pdf_id):
+    """Validators for pdf_detail, computed from summary timestamps and thread counters"""
+    if not hasattr(request, '_pdf_detail_validators'):
+        doc = PDFDocument.objects.filter(id=pdf_id).values(
+            'title', 'uploaded_at', 'chunk_version', 'thread_count', 'summary__generated_at'
+        ).first()
+        if doc is None:
+            request._pdf_detail_validators = (None, None)
+        else:
+            threads = ConversationThread.objects.filter(pdf_document_id=pdf_id).aggregate(
+                last_updated=Max('updated_at'), questions=Sum('question_count'), answered=Sum('answered_count')
+            )
+            request._pdf_detail_validators = _build_validators(
+                request,
+                (pdf_id, doc['title'], doc['chunk_version'], doc['summary__generated_at'], doc['thread_count'],
+                 threads['last_updated'], threads['questions'], threads['answered']),
+                (doc['uploaded_at'], doc['summary__generated_at'], threads['last_updated']),
+            )
+    return request._pdf_detail_validators
+
+
+def thread_detail_validators(request, thread_id):
+    """Validators for thread_detail, computed from the thread's counters and timestamps"""
+    if not hasattr(request, '_thread_detail_validators'):
+        thread = ConversationThread.objects.filter(id=thread_id).values(
+            'title', 'updated_at', 'question_count', 'answered_count', 'last_question_at', 'pdf_document__title'
+        ).first()
+        if thread is None:
+            request._thread_detail_validators = (None, None)
+        else:
+            request._thread_detail_validators = _build_validators(
+                request,
+                (thread_id, thread['title'], thread['pdf_document__title'], thread['updated_at'],
+                 thread['question_count'], thread['answered_count'], thread['last_question_at']),
+                (thread['updated_at'], thread['last_question_at']),
+            )
+    return request._thread_detail_validators
+
+
+@cache_control(private=True, no_cache=True)
+@condition(
+    etag_func=lambda request, pdf_id: pdf_detail_validators(request, pdf_id)[0],
+    last_modified_func=lambda request, pdf_id: pdf_detail_validators(request, pdf_id)[1],
+)
 def pdf_detail(request, pdf_id):
     """Show PDF details, summary, and conversation threads"""
     pdf_doc = get_object_or_404(PDFDocument, id=pdf_id)
@@ -160,41 +233,56 @@ def pdf_detail(request, pdf_id):
     except PDFSummary.DoesNotExist:
         summary = None
     
-    threads = pdf_doc.conversations.all().order_by('-updated_at')
+    threads = pdf_doc.conversations.order_by('-updated_at')
     
     context = {
         'pdf_doc': pdf_doc,
         'summary': summary,
+        'summary_version': summary.generated_at.timestamp() if summary else None,
         'threads': threads,
     }
     return render(request, 'easylearning/pdf_detail.html', context)
 
 
+@cache_control(private=True, no_cache=True)
+@condition(
+    etag_func=lambda request, thread_id: thread_detail_validators(request, thread_id)[0],
+    last_modified_func=lambda request, thread_id: thread_detail_validators(request, thread_id)[1],
+)
 def thread_detail(request, thread_id):
     """Show conversation thread with questions and answers"""
-    thread = get_object_or_404(ConversationThread, id=thread_id)
-    questions = thread.questions.all().order_by('asked_at')
+    thread = get_object_or_404(ConversationThread.objects.select_related('pdf_document', 'archive'), id=thread_id)
+    if hasattr(thread, 'archive'):
+        restore_thread(thread)
+    questions = thread.questions.select_related('answer', 'asked_by').order_by('asked_at')
+    rejection = None
     
     if request.method == 'POST':
         form = QuestionForm(request.POST)
         if form.is_valid():
-            question = form.save(commit=False)
-            question.thread = thread
-            question.asked_by = request.user if request.user.is_authenticated else None
-            question.save()
-            
-            # Generate answer
-            answer_text, is_from_pdf, confidence = generate_answer(question.question_text, thread.pdf_document, question.language)
-            
-            Answer.objects.create(
-                question=question,
-                answer_text=answer_text,
-                language=question.language,
-                is_from_pdf=is_from_pdf,
-                confidence_score=confidence
-            )
-            
-            return redirect('easylearning:thread_detail', thread_id=thread_id)
+            try:
+                # Generate answer
+                answer_text, is_from_pdf, confidence = answer_question(
+                    request, thread.pdf_document, form.cleaned_data['question_text'], form.cleaned_data['language']
+                )
+            except admission.Rejected as e:
+                rejection = e
+                messages.error(request, e.message)
+            else:
+                question = form.save(commit=False)
+                question.thread = thread
+                question.asked_by = request.user if request.user.is_authenticated else None
+                question.save()
+                
+                Answer.objects.create(
+                    question=question,
+                    answer_text=answer_text,
+                    language=question.language,
+                    is_from_pdf=is_from_pdf,
+                    confidence_score=confidence
+                )
+                
+                return redirect('easylearning:thread_detail', thread_id=thread_id)
     else:
         form = QuestionForm()
     
@@ -203,7 +291,251 @@ def thread_detail(request, thread_id):
         'questions': questions,
         'form': form,
     }
-    return render(request, 'easylearning/thread_detail.html', context)
+    response = render(request, 'easylearning/thread_detail.html', context)
+    if rejection is not None:
+        response.status_code = rejection.status
+        response['Retry-After'] = str(rejection.retry_after)
+    return response
+
+
+RANGE_HEADER_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range_header(header, size):
+    """
+    Parse a single-range ``Range`` header into an inclusive (start, end) pair.
+
+    Returns None when the header is absent, malformed or asks for several
+    ranges (the full file is sent instead), and raises ValueError when the
+    range cannot be satisfied.
+    """
+    match = RANGE_HEADER_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+def iter_file_range(path, start, end, block_size=64 * 1024):
+    """Yield the bytes of ``path`` from ``start`` to ``end`` inclusive"""
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            data = fh.read(min(block_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+def _etag_matches(header, etag):
+    """Weak comparison of ``etag`` against an If-None-Match header, which may list several or be ``*``"""
+    if not header:
+        return False
+    tags = parse_etags(header)
+    return '*' in tags or any(tag.removeprefix('W/') == etag for tag in tags)
+
+
+@login_required
+def download_pdf(request, pdf_id):
+    """Serve the original PDF with byte-range support or proxy offload"""
+    pdf_doc = get_object_or_404(PDFDocument, id=pdf_id)
+    if not pdf_doc.file:
+        raise Http404("No file attached to this document")
+    
+    try:
+        file_path = pdf_doc.file.path
+        stat = os.stat(file_path)
+    except (OSError, NotImplementedError):
+        raise Http404("PDF file not found")
+    
+    size = stat.st_size
+    etag = quote_etag(f'{pdf_doc.id.hex}-{int(stat.st_mtime)}-{size}')
+    last_modified = http_date(stat.st_mtime)
+    filename = os.path.basename(pdf_doc.file.name)
+    disposition = 'attachment' if request.GET.get('download') == '1' else 'inline'
+    
+    if _etag_matches(request.headers.get('If-None-Match'), etag):
+        response = HttpResponseNotModified()
+    else:
+        backend = getattr(settings, 'PDF_SENDFILE_BACKEND', None)
+        if backend == 'nginx':
+            # nginx serves the bytes (including ranges) from an internal location
+            response = HttpResponse(content_type='application/pdf')
+            response['X-Accel-Redirect'] = settings.PDF_SENDFILE_URL_PREFIX.rstrip('/') + '/' + quote(pdf_doc.file.name)
+        elif backend == 'xsendfile':
+            # Apache mod_xsendfile / lighttpd read the file by absolute path
+            response = HttpResponse(content_type='application/pdf')
+            response['X-Sendfile'] = file_path
+        else:
+            response = _ranged_file_response(request, file_path, size, etag, last_modified)
+        response['Content-Disposition'] = content_disposition_header(disposition == 'attachment', filename)
+    
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    response['Accept-Ranges'] = 'bytes'
+    patch_cache_control(response, private=True, max_age=getattr(settings, 'PDF_DOWNLOAD_MAX_AGE', 86400))
+    return response
+
+
+def _ranged_file_response(request, file_path, size, etag, last_modified):
+    """Build a 200, 206 or 416 response for a locally served PDF"""
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if range_header and if_range and if_range not in (etag, last_modified):
+        # The client's partial copy is stale, send the whole file
+        range_header = None
+    
+    try:
+        byte_range = parse_range_header(range_header, size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    
+    if byte_range is None:
+        return FileResponse(open(file_path, 'rb'), content_type='application/pdf')
+    
+    start, end = byte_range
+    response = StreamingHttpResponse(
+        iter_file_range(file_path, start, end), status=206, content_type='application/pdf'
+    )
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = str(end - start + 1)
+    return response
+
+
+def _page_range(request):
+    """``(start, count)`` from the query string; raises ValueError when invalid"""
+    limit = getattr(settings, 'PDF_PAGES_MAX_COUNT', 50)
+    try:
+        start = int(request.GET.get('start', 1))
+        count = int(request.GET.get('count', 10))
+    except ValueError:
+        raise ValueError("start and count must be integers")
+    if start < 1 or not 1 <= count <= limit:
+        raise ValueError(f"start must be at least 1 and count between 1 and {limit}")
+    return start, count
+
+
+def pdf_pages_etag(request, pdf_id):
+    """Strong ETag over the requested range, from the chunk version and the stored page hashes"""
+    try:
+        start, count = _page_range(request)
+    except ValueError:
+        return None
+    version = PDFDocument.objects.filter(id=pdf_id).values_list('chunk_version', flat=True).first()
+    if version is None:
+        return None
+    digest = hashlib.sha1(f'{pdf_id}:{version}:{start}:{count}'.encode())
+    hashes = PDFPage.objects.filter(
+        pdf_document_id=pdf_id, page_number__range=(start, start + count - 1)
+    ).order_by('page_number').values_list('page_number', 'text_hash')
+    for number, text_hash in hashes:
+        digest.update(f':{number}={text_hash}'.encode())
+    return digest.hexdigest()
+
+
+def _page_entries(pages, chunks, start, end):
+    """One entry per page from ``start`` to ``end``; pages without stored text have ``text`` None"""
+    expected = start
+    for number, text in pages:
+        for missing in range(expected, number):
+            yield {'page_number': missing, 'text': None, 'chunks': chunks.get(missing, [])}
+        yield {'page_number': number, 'text': text, 'chunks': chunks.get(number, [])}
+        expected = number + 1
+    for missing in range(expected, end + 1):
+        yield {'page_number': missing, 'text': None, 'chunks': chunks.get(missing, [])}
+
+
+def _stream_json(head, entries):
+    """Stream ``head`` as a JSON object with ``entries`` appended as its "pages" list"""
+    yield json.dumps(head)[:-1] + ', "pages": ['
+    for position, entry in enumerate(entries):
+        yield (', ' if position else '') + json.dumps(entry)
+    yield ']}'
+
+
+@login_required
+@cache_control(public=True, no_cache=True)
+@condition(etag_func=pdf_pages_etag)
+def pdf_pages(request, pdf_id):
+    """
+    Stored text of a range of pages, with the chunk indexes taken from each page.
+    
+    Responses carry a strong ETag and may be stored by shared caches, which
+    revalidate them on every use. Ranges longer than PDF_PAGES_STREAM_THRESHOLD
+    pages are streamed.
+    """
+    pdf_doc = get_object_or_404(PDFDocument, id=pdf_id)
+    try:
+        start, count = _page_range(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    end = min(start + count - 1, pdf_doc.page_count)
+    chunks = {}
+    store = get_chunk_store(pdf_doc)
+    for position, page in enumerate(store.page_numbers):
+        if start <= page <= end:
+            chunks.setdefault(page, []).append(store.chunk_indexes[position])
+    pages = PDFPage.objects.filter(
+        pdf_document=pdf_doc, page_number__range=(start, end)
+    ).order_by('page_number').values_list('page_number', 'text')
+    
+    head = {
+        'document': str(pdf_doc.id),
+        'chunk_version': pdf_doc.chunk_version,
+        'page_count': pdf_doc.page_count,
+        'start': start,
+        'count': max(end - start + 1, 0),
+        'next_start': end + 1 if end < pdf_doc.page_count else None,
+    }
+    if count > getattr(settings, 'PDF_PAGES_STREAM_THRESHOLD', 10):
+        entries = _page_entries(pages.iterator(chunk_size=20), chunks, start, end)
+        return StreamingHttpResponse(_stream_json(head, entries), content_type='application/json')
+    return JsonResponse({**head, 'pages': list(_page_entries(pages, chunks, start, end))})
+
+
+@login_required
+def replace_pdf(request, pdf_id):
+    """Replace a PDF's file with a revised edition, re-processing only the pages that changed"""
+    pdf_doc = get_object_or_404(PDFDocument, id=pdf_id)
+    if not (request.user.is_staff or pdf_doc.uploaded_by_id == request.user.id):
+        raise PermissionDenied
+    
+    if request.method == 'POST':
+        from .ingestion import IngestionError, replace_document_file
+        form = PDFReplaceForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                report = replace_document_file(pdf_doc, form.cleaned_data['file'])
+            except IngestionError as e:
+                form.add_error('file', str(e))
+            else:
+                messages.success(
+                    request,
+                    f'"{pdf_doc.title}" updated: {len(report["changed_pages"])} of {report["pages"]} pages changed, '
+                    f'{len(report["removed_pages"])} removed.'
+                )
+                return redirect('easylearning:pdf_detail', pdf_id=pdf_doc.id)
+    else:
+        form = PDFReplaceForm()
+    
+    return render(request, 'easylearning/replace_pdf.html', {'form': form, 'pdf_doc': pdf_doc})
 
 
 @login_required
@@ -238,7 +570,12 @@ def ask_question_api(request):
             if not question_text or not thread_id:
                 return JsonResponse({'error': 'Missing question or thread_id'}, status=400)
             
-            thread = get_object_or_404(ConversationThread, id=thread_id)
+            thread = get_object_or_404(ConversationThread.objects.select_related('archive'), id=thread_id)
+            if hasattr(thread, 'archive'):
+                restore_thread(thread)
+            
+            # Generate answer
+            answer_text, is_from_pdf, confidence = answer_question(request, thread.pdf_document, question_text, language)
             
             # Create question
             question = Question.objects.create(
@@ -248,9 +585,6 @@ def ask_question_api(request):
                 asked_by=request.user if request.user.is_authenticated else None
             )
             
-            # Generate answer
-            answer_text, is_from_pdf, confidence = generate_answer(question_text, thread.pdf_document, language)
-            
             answer = Answer.objects.create(
                 question=question,
                 answer_text=answer_text,
@@ -267,411 +601,36 @@ def ask_question_api(request):
                 'language': language
             })
             
+        except admission.Rejected as e:
+            response = JsonResponse({'error': e.message, 'reason': e.reason}, status=e.status)
+            response['Retry-After'] = str(e.retry_after)
+            return response
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
     
     return JsonResponse({'error': 'Invalid request method'}, status=405)
 
 
-def generate_pdf_summary(pdf_path):
-    """Generate summary from PDF text"""
-    try:
-        # Check if file exists and is accessible
-        if not os.path.exists(pdf_path):
-            return "Error reading PDF: File not found"
-        
-        file_size = os.path.getsize(pdf_path)
-        if file_size == 0:
-            return "Error reading PDF: File is empty"
-        
-        print(f"Processing PDF: {pdf_path} (size: {file_size} bytes)")
-        
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            
-            if len(pdf_reader.pages) == 0:
-                return "Error reading PDF: No pages found"
-            
-            text = ""
-            for page in pdf_reader.pages:
-                try:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + " "
-                except Exception as e:
-                    print(f"Error extracting text from page: {e}")
-                    continue
-            
-            if not text.strip():
-                return "Error reading PDF: No text content found"
-            
-            print(f"Extracted {len(text)} characters of text")
-            
-            # Simple summary generation (in production, use AI models)
-            sentences = [s.strip() for s in text.split('.') if s.strip()]
-            if len(sentences) < 3:
-                summary = text[:300] + "..." if len(text) > 300 else text
-            else:
-                summary = '. '.join(sentences[:5]) + '.'
-            
-            return summary if summary else "Summary could not be generated."
-            
-    except Exception as e:
-        print(f"PDF summary generation error: {e}")
-        return f"Error reading PDF: {str(e)}"
-
-
-def create_pdf_chunks(pdf_doc):
-    """Create text chunks from PDF for better search"""
-    try:
-        # Check if file exists and is accessible
-        if not pdf_doc.file:
-            print(f"No file associated with PDF document: {pdf_doc.title}")
-            return
-        
-        file_path = pdf_doc.file.path
-        if not os.path.exists(file_path):
-            print(f"PDF file not found: {file_path}")
-            return
-        
-        print(f"Creating chunks for PDF: {pdf_doc.title} at {file_path}")
-        
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            
-            if len(pdf_reader.pages) == 0:
-                print("No pages found in PDF")
-                return
-            
-            chunk_count = 0
-            for page_num, page in enumerate(pdf_reader.pages):
-                try:
-                    text = page.extract_text()
-                    if not text.strip():
-                        continue
-                    
-                    # Clean the text
-                    text = text.strip()
-                    # Remove excessive whitespace
-                    text = ' '.join(text.split())
-                    
-                    # Split into sentences for better chunking
-                    sentences = text.split('. ')
-                    
-                    current_chunk = ""
-                    sentence_count = 0
-                    
-                    for sentence in sentences:
-                        sentence = sentence.strip()
-                        if not sentence:
-                            continue
-                        
-                        # Add sentence to current chunk
-                        if current_chunk:
-                            current_chunk += ". " + sentence
-                        else:
-                            current_chunk = sentence
-                        
-                        sentence_count += 1
-                        
-                        # Create chunk when we have enough sentences or reach character limit
-                        if sentence_count >= 3 or len(current_chunk) >= 300:
-                            if current_chunk.strip():
-                                PDFChunk.objects.create(
-                                    pdf_document=pdf_doc,
-                                    chunk_text=current_chunk.strip(),
-                                    chunk_index=chunk_count,
-                                    page_number=page_num + 1
-                                )
-                                chunk_count += 1
-                            
-                            # Reset for next chunk
-                            current_chunk = ""
-                            sentence_count = 0
-                    
-                    # Don't forget the last chunk if it has content
-                    if current_chunk.strip():
-                        PDFChunk.objects.create(
-                            pdf_document=pdf_doc,
-                            chunk_text=current_chunk.strip(),
-                            chunk_index=chunk_count,
-                            page_number=page_num + 1
-                        )
-                        chunk_count += 1
-                            
-                except Exception as e:
-                    print(f"Error processing page {page_num + 1}: {e}")
-                    continue
-            
-            print(f"Created {chunk_count} chunks for PDF {pdf_doc.title}")
-            
-    except Exception as e:
-        print(f"Error creating chunks for PDF {pdf_doc.title}: {e}")
-        # Don't raise the exception - just log it
-
-
-def analyze_question(question):
-    """Analyze the question to understand its type and extract key information"""
-    question_lower = question.lower().strip()
-    
-    # Question type classification
-    question_types = {
-        'summary': ['summary', 'brief', 'overview', 'general', 'about', 'what is this'],
-        'chapter_specific': ['chapter', 'section', 'part'],
-        'character': ['character', 'who', 'person', 'name', 'protagonist', 'hero', 'villain'],
-        'plot': ['plot', 'story', 'narrative', 'what happens', 'events', 'action'],
-        'setting': ['where', 'place', 'location', 'world', 'realm', 'setting'],
-        'time': ['when', 'time', 'period', 'era', 'century', 'year'],
-        'comparison': ['compare', 'difference', 'similar', 'versus', 'vs', 'better', 'worse'],
-        'definition': ['what is', 'define', 'meaning', 'explain', 'describe'],
-        'list': ['list', 'all', 'every', 'each', 'names', 'types', 'kinds'],
-        'how': ['how', 'method', 'process', 'way', 'technique'],
-        'why': ['why', 'reason', 'cause', 'because', 'purpose'],
-        'quantity': ['how many', 'count', 'number', 'amount', 'size', 'length', 'longest', 'shortest']
-    }
-    
-    # Determine question type
-    detected_types = []
-    for qtype, keywords in question_types.items():
-        if any(keyword in question_lower for keyword in keywords):
-            detected_types.append(qtype)
-    
-    # Extract specific entities
-    entities = {
-        'chapter_numbers': [],
-        'character_names': [],
-        'locations': [],
-        'dates': [],
-        'numbers': []
-    }
-    
-    import re
-    
-    # Extract chapter numbers
-    chapter_matches = re.findall(r'chapter\s+(\d+)', question_lower)
-    entities['chapter_numbers'] = [int(num) for num in chapter_matches]
-    
-    # Extract numbers
-    number_matches = re.findall(r'\b(\d+)\b', question_lower)
-    entities['numbers'] = [int(num) for num in number_matches]
-    
-    # Extract potential character names (words starting with capital letters)
-    name_matches = re.findall(r'\b[A-Z][a-z]+\b', question)
-    entities['character_names'] = name_matches
-    
-    # Extract potential locations
-    location_keywords = ['in', 'at', 'from', 'to', 'near', 'around']
-    words = question_lower.split()
-    for i, word in enumerate(words):
-        if word in location_keywords and i + 1 < len(words):
-            entities['locations'].append(words[i + 1])
-    
-    # Determine primary question type
-    primary_type = 'general'
-    if detected_types:
-        # Prioritize more specific types
-        priority_order = ['chapter_specific', 'character', 'quantity', 'comparison', 'definition', 'plot', 'setting', 'time', 'how', 'why', 'summary']
-        for ptype in priority_order:
-            if ptype in detected_types:
-                primary_type = ptype
-                break
-    
-    return {
-        'original_question': question,
-        'question_lower': question_lower,
-        'detected_types': detected_types,
-        'primary_type': primary_type,
-        'entities': entities,
-        'keywords': extract_keywords(question_lower)
-    }
-
-def extract_keywords(question_lower):
-    """Extract meaningful keywords from the question"""
-    # Remove common stop words
-    stop_words = {
-        'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 
-        'is', 'are', 'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 
-        'will', 'would', 'could', 'should', 'may', 'might', 'can', 'this', 'that', 'these', 
-        'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them', 
-        'my', 'your', 'his', 'her', 'its', 'our', 'their', 'mine', 'yours', 'his', 'hers', 
-        'ours', 'theirs'
-    }
-    
-    # Extract meaningful keywords
-    keywords = [word for word in question_lower.split() if word not in stop_words and len(word) > 2]
-    
-    # If no meaningful keywords, include shorter words
-    if not keywords:
-        keywords = [word for word in question_lower.split() if len(word) > 1]
-    
-    # For general questions, add common content words
-    general_words = ['give', 'me', 'tell', 'about', 'what', 'how', 'why', 'when', 'where', 'brief', 'detail', 'summary']
-    if any(word in question_lower for word in general_words):
-        keywords.extend(['story', 'content', 'information', 'text', 'document', 'pdf'])
-    
-    return keywords
-
-def score_chunk_for_question(chunk, question_analysis):
-    """Score a chunk based on question analysis"""
-    chunk_text_lower = chunk.chunk_text.lower()
-    score = 0
-    
-    # Basic keyword matching
-    for keyword in question_analysis['keywords']:
-        if keyword in chunk_text_lower:
-            score += 1
-    
-    # For general questions, give base score to all chunks
-    if question_analysis['primary_type'] == 'summary' or question_analysis['primary_type'] == 'general':
-        score += 1  # Base score for all chunks in general questions
-    
-    # For plot questions, give base score to story-related chunks
-    if question_analysis['primary_type'] == 'plot':
-        if any(word in chunk_text_lower for word in ['story', 'plot', 'narrative', 'events', 'action', 'happens']):
-            score += 2
-        else:
-            score += 1  # Base score for all chunks in plot questions
-    
-    # Question type specific scoring
-    primary_type = question_analysis['primary_type']
-    entities = question_analysis['entities']
-    
-    if primary_type == 'chapter_specific':
-        # High score for exact chapter matches
-        for chapter_num in entities['chapter_numbers']:
-            if f'chapter {chapter_num}' in chunk_text_lower or f'chapter {chapter_num}:' in chunk_text_lower:
-                score += 50
-        # Lower score for general chapter content
-        if 'chapter' in chunk_text_lower:
-            score += 10
-    
-    elif primary_type == 'character':
-        # High score for character name mentions
-        for name in entities['character_names']:
-            if name.lower() in chunk_text_lower:
-                score += 30
-        # Score for character-related content
-        if any(word in chunk_text_lower for word in ['character', 'person', 'protagonist', 'hero', 'villain', 'main']):
-            score += 15
-        # Score for character names in the story
-        if any(word in chunk_text_lower for word in ['haruto', 'akebane', 'kurogami']):
-            score += 20
-        # Base score for character questions
-        score += 1
-    
-    elif primary_type == 'quantity':
-        # Score for content about numbers, sizes, lengths
-        if any(word in chunk_text_lower for word in ['longest', 'shortest', 'biggest', 'smallest', 'number', 'count', 'size']):
-            score += 20
-        # Score for numerical content
-        if any(word in chunk_text_lower for word in ['pages', 'length', 'size', 'amount']):
-            score += 15
-    
-    elif primary_type == 'comparison':
-        # Score for comparative content
-        if any(word in chunk_text_lower for word in ['compare', 'difference', 'similar', 'versus', 'better', 'worse']):
-            score += 20
-    
-    elif primary_type == 'plot':
-        # Score for story/plot content
-        if any(word in chunk_text_lower for word in ['story', 'plot', 'narrative', 'events', 'action', 'happens']):
-            score += 15
-    
-    elif primary_type == 'setting':
-        # Score for location/setting content
-        if any(word in chunk_text_lower for word in ['place', 'location', 'world', 'realm', 'setting', 'where']):
-            score += 15
-    
-    elif primary_type == 'summary':
-        # Score for introductory/summary content
-        if any(word in chunk_text_lower for word in ['introduction', 'beginning', 'start', 'overview', 'summary']):
-            score += 20
-        # Score for main story elements
-        if any(word in chunk_text_lower for word in ['main', 'primary', 'central', 'key']):
-            score += 10
-    
-    # Exact phrase matching (high bonus)
-    if question_analysis['question_lower'] in chunk_text_lower:
-        score += 25
-    
-    # Context-specific scoring
-    if 'about' in question_analysis['question_lower']:
-        if any(word in chunk_text_lower for word in ['about', 'concerning', 'regarding']):
-            score += 10
-    
-    if 'happens' in question_analysis['question_lower']:
-        if any(word in chunk_text_lower for word in ['happens', 'occurs', 'events', 'action']):
-            score += 10
-    
-    return score
-
-def select_best_chunks(chunk_scores, question_analysis):
-    """Select the best chunks based on question type and content diversity"""
-    best_chunks = []
-    primary_type = question_analysis['primary_type']
-    
-    if primary_type == 'chapter_specific':
-        # For chapter questions, ensure we get the specific chapter
-        seen_chapters = set()
-        for chunk, score in chunk_scores:
-            chunk_text_lower = chunk.chunk_text.lower()
-            import re
-            chapter_match = re.search(r'chapter\s+(\d+)', chunk_text_lower)
-            if chapter_match:
-                chapter_num = chapter_match.group(1)
-                if chapter_num not in seen_chapters:
-                    best_chunks.append((chunk, score))
-                    seen_chapters.add(chapter_num)
-                if len(best_chunks) >= 2:
-                    break
-            elif len(best_chunks) < 2:
-                best_chunks.append((chunk, score))
-    
-    elif primary_type == 'summary':
-        # For summary questions, get more comprehensive content
-        for chunk, score in chunk_scores[:3]:  # Take top 3 for summaries
-            best_chunks.append((chunk, score))
-    
-    elif primary_type == 'character':
-        # For character questions, focus on character-specific content
-        for chunk, score in chunk_scores[:2]:
-            best_chunks.append((chunk, score))
-    
-    else:
-        # For other question types, take top 2 chunks
-        for chunk, score in chunk_scores[:2]:
-            best_chunks.append((chunk, score))
-    
-    return best_chunks
-
-def generate_answer_from_chunks(best_chunks, question_analysis):
-    """Generate a coherent answer from selected chunks"""
-    # Combine chunk content
-    answer_parts = []
-    for chunk, score in best_chunks:
-        clean_text = chunk.chunk_text.strip()
-        clean_text = ' '.join(clean_text.split())
-        answer_parts.append(clean_text)
-    
-    answer_text = ' '.join(answer_parts)
-    
-    # Limit answer length based on question type
-    max_length = 1000 if question_analysis['primary_type'] == 'summary' else 600
-    
-    if len(answer_text) > max_length:
-        # Try to find a good breaking point
-        sentences = answer_text.split('. ')
-        truncated_answer = ''
-        for sentence in sentences:
-            if len(truncated_answer + sentence) < max_length:
-                truncated_answer += sentence + '. '
-            else:
-                break
-        answer_text = truncated_answer.strip()
-        if not answer_text.endswith('.'):
-            answer_text += '...'
-    
-    return answer_text
+def answer_question(request, pdf_document, question_text, language):
+    """
+    Answer a question under admission control.
+    
+    Identical questions already being answered share that computation, and
+    only the request doing the work takes an answer slot. Answers stored by
+    a cache warm-up are returned without either.
+    """
+    from .answering import generate_answer
+    admission.check_rate(request)
+    key = coalescing.question_key(pdf_document, question_text, language)
+    warmed = coalescing.warmed_answer(key)
+    if warmed is not None:
+        return warmed
+    
+    def compute():
+        with admission.answer_slot():
+            return generate_answer(question_text, pdf_document, language)
+    
+    return coalescing.single_flight(key, compute)
 
 
 @login_required
@@ -710,15 +669,15 @@ def profile_view(request):
             'time': thread.created_at
         })
     
-            # Add questions
-        for question in questions.order_by('-asked_at')[:3]:
-            question_text = question.question_text
-            truncated_text = question_text[:50] + "..." if len(question_text) > 50 else question_text
-            recent_activities.append({
-                'icon': 'question-circle',
-                'title': f'Asked: "{truncated_text}"',
-                'time': question.asked_at
-            })
+    # Add questions
+    for question in questions.order_by('-asked_at')[:3]:
+        question_text = question.question_text
+        truncated_text = question_text[:50] + "..." if len(question_text) > 50 else question_text
+        recent_activities.append({
+            'icon': 'question-circle',
+            'title': f'Asked: "{truncated_text}"',
+            'time': question.asked_at
+        })
     
     # Sort by time and take top 8
     recent_activities.sort(key=lambda x: x['time'], reverse=True)
@@ -734,422 +693,24 @@ def profile_view(request):
     
     return render(request, 'easylearning/profile.html', context)
 
+def metrics_view(request):
+    """Expose pipeline metrics in the Prometheus text format"""
+    if not instrumentation.metrics_enabled():
+        return HttpResponse(status=404)
+    
+    token = getattr(settings, 'METRICS_AUTH_TOKEN', None)
+    if not token:
+        # Without a token the endpoint is only open in development
+        if not settings.DEBUG:
+            return HttpResponse(status=403)
+    elif not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    
+    return HttpResponse(
+        instrumentation.render_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
 def test_dropdown_view(request):
     """Test page for dropdown functionality"""
     return render(request, 'test_dropdown.html')
-
-def translate_answer(answer_text, target_language):
-    """Translate answer text to the target language"""
-    if target_language == 'en':
-        return answer_text
-    
-    # Translation dictionaries for common phrases and responses
-    translations = {
-        'gu': {  # Gujarati translations
-            'I cannot find specific information about this question in the PDF. The question may not be directly addressed in the document content.': 
-                'હું આ પ્રશ્ન વિશે PDF માં ચોક્કસ માહિતી શોધી શકતો નથી. પ્રશ્ન સીધો દસ્તાવેજની સામગ્રીમાં સંબોધવામાં આવ્યો નથી.',
-            'I cannot find any content in this PDF to answer your question.': 
-                'હું તમારા પ્રશ્નનો જવાબ આપવા માટે આ PDF માં કોઈ સામગ્રી શોધી શકતો નથી.',
-            'Error generating answer:': 
-                'જવાબ જનરેટ કરવામાં ભૂલ:',
-            'Chapter': 'અધ્યાય',
-            'The Blades of Dawn': 'ડોનની તવારો',
-            'In the realm of': 'રાજ્યમાં',
-            'land draped in mist': 'ધુમ્મસમાં લપેટાયેલી જમીન',
-            'steeped in legends': 'કથાઓમાં ડૂબેલું',
-            'monsters known as': 'રાક્ષસો તરીકે ઓળખાય છે',
-            'have plagued villages': 'ગામડાંમાં ત્રાસ ફેલાવ્યો છે',
-            'for centuries': 'સદીઓથી',
-            'These creatures': 'આ જીવો',
-            'born from shadows': 'છાયાઓમાંથી જન્મ્યા',
-            'and c': 'અને',
-            'Kurogami': 'કુરોગામી',
-            'Tsukihara': 'ત્સુકિહારા',
-            'Haruto': 'હારુતો',
-            'Ake': 'એકે',
-            'blade': 'તલવાર',
-            'sword': 'તલવાર',
-            'warrior': 'યોદ્ધા',
-            'village': 'ગામ',
-            'villages': 'ગામડાં',
-            'story': 'કહાણી',
-            'tale': 'કથા',
-            'legend': 'કથા',
-            'legends': 'કથાઓ',
-            'monster': 'રાક્ષસ',
-            'monsters': 'રાક્ષસો',
-            'shadow': 'છાયા',
-            'shadows': 'છાયાઓ',
-            'moonlight': 'ચાંદની',
-            'blood': 'રક્ત',
-            'trial': 'પરીક્ષા',
-            'test': 'પરીક્ષા',
-            'battle': 'લડાઈ',
-            'fight': 'લડાઈ',
-            'power': 'શક્તિ',
-            'strength': 'શક્તિ',
-            'magic': 'જાદુ',
-            'spirit': 'આત્મા',
-            'soul': 'આત્મા',
-            'darkness': 'અંધારું',
-            'light': 'પ્રકાશ',
-            'dawn': 'ભોર',
-            'night': 'રાત',
-            'day': 'દિવસ',
-            'morning': 'સવાર',
-            'evening': 'સાંજ',
-            'forest': 'જંગલ',
-            'mountain': 'પર્વત',
-            'river': 'નદી',
-            'lake': 'એરણ',
-            'castle': 'કિલ્લો',
-            'temple': 'મંદિર',
-            'school': 'શાળા',
-            'training': 'તાલીમ',
-            'master': 'ગુરુ',
-            'student': 'વિદ્યાર્થી',
-            'teacher': 'શિક્ષક',
-            'family': 'પરિવાર',
-            'father': 'પિતા',
-            'mother': 'માતા',
-            'son': 'પુત્ર',
-            'daughter': 'પુત્રી',
-            'brother': 'ભાઈ',
-            'sister': 'બહેન',
-            'friend': 'મિત્ર',
-            'enemy': 'દુશ્મન',
-            'hero': 'નાયક',
-            'heroine': 'નાયિકા',
-            'villain': 'ખલનાયક',
-            'protagonist': 'મુખ્ય પાત્ર',
-            'character': 'પાત્ર',
-            'characters': 'પાત્રો',
-            # Additional comprehensive translations for better Gujarati conversion
-            'footsteps': 'પગલાં',
-            'echoed': 'ગુંજ્યા',
-            'along': 'સાથે',
-            'worn': 'ઘસાયેલા',
-            'cobblestone': 'ગોળાકાર પથ્થર',
-            'path': 'પાથ',
-            'weight': 'ભાર',
-            'constant': 'સતત',
-            'reminder': 'યાદ',
-            'oath': 'શપથ',
-            'sworn': 'લીધો',
-            'step': 'પગલું',
-            'brought': 'લાવ્યા',
-            'closer': 'નજીક',
-            'unknown': 'અજાણ્યું',
-            'veil': 'ઘૂમટો',
-            'between': 'વચ્ચે',
-            'life': 'જીવન',
-            'death': 'મૃત્યુ',
-            'thinned': 'પાતળું',
-            'under': 'નીચે',
-            'pale': 'ફિક્કું',
-            'glow': 'ચમક',
-            'moon': 'ચંદ્ર',
-            'soft': 'મૃદુ',
-            'silence': 'શાંતિ',
-            'lie': 'ખોટું',
-            'rustle': 'સરસરાટ',
-            'carried': 'લાવ્યું',
-            'promise': 'વચન',
-            'danger': 'ભય',
-            'whispers': 'ફુસફુસાટ',
-            'mist': 'ધુમ્મસ',
-            'his': 'તેનો',
-            'her': 'તેની',
-            'their': 'તેમનું',
-            'the': 'આ',
-            'a': 'એક',
-            'an': 'એક',
-            'and': 'અને',
-            'or': 'અથવા',
-            'but': 'પરંતુ',
-            'in': 'માં',
-            'on': 'પર',
-            'at': 'પર',
-            'to': 'ને',
-            'for': 'માટે',
-            'of': 'નું',
-            'with': 'સાથે',
-            'by': 'દ્વારા',
-            'is': 'છે',
-            'are': 'છે',
-            'was': 'હતું',
-            'were': 'હતા',
-            'be': 'હોવું',
-            'been': 'હતું',
-            'have': 'છે',
-            'has': 'છે',
-            'had': 'હતું',
-            'do': 'કરવું',
-            'does': 'કરે છે',
-            'did': 'કર્યું',
-            'will': 'હશે',
-            'would': 'હશે',
-            'could': 'કરી શકે',
-            'should': 'કરવું જોઈએ',
-            'may': 'કરી શકે',
-            'might': 'કરી શકે',
-            'can': 'કરી શકે',
-            'this': 'આ',
-            'that': 'તે',
-            'these': 'આ',
-            'those': 'તે',
-            'i': 'હું',
-            'you': 'તમે',
-            'he': 'તે',
-            'she': 'તે',
-            'it': 'તે',
-            'we': 'આપણે',
-            'they': 'તેઓ',
-            'me': 'મને',
-            'him': 'તેને',
-            'her': 'તેને',
-            'us': 'આપણને',
-            'them': 'તેમને',
-            'my': 'મારું',
-            'your': 'તમારું',
-            'his': 'તેનું',
-            'her': 'તેનું',
-            'its': 'તેનું',
-            'our': 'આપણું',
-            'their': 'તેમનું',
-            'mine': 'મારું',
-            'yours': 'તમારું',
-            'hers': 'તેનું',
-            'ours': 'આપણું',
-            'theirs': 'તેમનું',
-        },
-        'hi': {  # Hindi translations
-            'I cannot find specific information about this question in the PDF. The question may not be directly addressed in the document content.': 
-                'मैं इस प्रश्न के बारे में PDF में विशिष्ट जानकारी नहीं ढूंढ सकता। प्रश्न सीधे दस्तावेज़ की सामग्री में संबोधित नहीं किया गया हो सकता है।',
-            'I cannot find any content in this PDF to answer your question.': 
-                'मैं आपके प्रश्न का उत्तर देने के लिए इस PDF में कोई सामग्री नहीं ढूंढ सकता।',
-            'Error generating answer:': 
-                'उत्तर जनरेट करने में त्रुटि:',
-            'Chapter': 'अध्याय',
-            'The Blades of Dawn': 'भोर की तलवारें',
-            'In the realm of': 'राज्य में',
-            'land draped in mist': 'धुंध में लिपटी भूमि',
-            'steeped in legends': 'किंवदंतियों में डूबा',
-            'monsters known as': 'राक्षस जिन्हें कहा जाता है',
-            'have plagued villages': 'गांवों में तबाही मचाई है',
-            'for centuries': 'सदियों से',
-            'These creatures': 'ये जीव',
-            'born from shadows': 'छायाओं से जन्मे',
-            'and c': 'और',
-            'Kurogami': 'कुरोगामी',
-            'Tsukihara': 'त्सुकिहारा',
-            'Haruto': 'हारुतो',
-            'Ake': 'एके',
-            'blade': 'तलवार',
-            'sword': 'तलवार',
-            'warrior': 'योद्धा',
-            'village': 'गांव',
-            'villages': 'गांवों',
-            'story': 'कहानी',
-            'tale': 'कथा',
-            'legend': 'कथा',
-            'legends': 'कथाएं',
-            'monster': 'राक्षस',
-            'monsters': 'राक्षसों',
-            'shadow': 'छाया',
-            'shadows': 'छायाएं',
-            'moonlight': 'चांदनी',
-            'blood': 'रक्त',
-            'trial': 'परीक्षा',
-            'test': 'परीक्षा',
-            'battle': 'युद्ध',
-            'fight': 'लड़ाई',
-            'power': 'शक्ति',
-            'strength': 'बल',
-            'magic': 'जादू',
-            'spirit': 'आत्मा',
-            'soul': 'आत्मा',
-            'darkness': 'अंधकार',
-            'light': 'प्रकाश',
-            'dawn': 'भोर',
-            'night': 'रात',
-            'day': 'दिन',
-            'morning': 'सुबह',
-            'evening': 'शाम',
-            'forest': 'जंगल',
-            'mountain': 'पहाड़',
-            'river': 'नदी',
-            'lake': 'झील',
-            'castle': 'किला',
-            'temple': 'मंदिर',
-            'school': 'स्कूल',
-            'training': 'प्रशिक्षण',
-            'master': 'गुरु',
-            'student': 'छात्र',
-            'teacher': 'शिक्षक',
-            'family': 'परिवार',
-            'father': 'पिता',
-            'mother': 'माता',
-            'son': 'बेटा',
-            'daughter': 'बेटी',
-            'brother': 'भाई',
-            'sister': 'बहन',
-            'friend': 'दोस्त',
-            'enemy': 'दुश्मन',
-            'hero': 'नायक',
-            'heroine': 'नायिका',
-            'villain': 'खलनायक',
-            'protagonist': 'मुख्य पात्र',
-            'character': 'पात्र',
-            'characters': 'पात्रों',
-        }
-    }
-    
-    # Get translations for the target language
-    lang_translations = translations.get(target_language, {})
-    
-    # For Gujarati, do more comprehensive translation
-    if target_language == 'gu':
-        translated_text = answer_text
-        
-        # First, translate longer phrases and proper nouns
-        for english, translated in lang_translations.items():
-            if len(english) > 3:  # Only translate longer phrases first
-                translated_text = translated_text.replace(english, translated)
-        
-        # Then translate common words and articles
-        for english, translated in lang_translations.items():
-            if len(english) <= 3:  # Translate shorter words
-                # Use word boundaries to avoid partial matches
-                import re
-                pattern = r'\b' + re.escape(english) + r'\b'
-                translated_text = re.sub(pattern, translated, translated_text, flags=re.IGNORECASE)
-        
-        # Special handling for sentence structure
-        translated_text = translated_text.replace("'s", "નું")
-        translated_text = translated_text.replace("'", "")
-        
-        # Fix common Gujarati grammar patterns
-        translated_text = translated_text.replace("આ the", "આ")
-        translated_text = translated_text.replace("આ a", "એક")
-        translated_text = translated_text.replace("આ an", "એક")
-        
-        # Additional Gujarati grammar fixes
-        translated_text = translated_text.replace("આ Blade", "બ્લેડ")
-        translated_text = translated_text.replace("આ Trial", "પરીક્ષા")
-        translated_text = translated_text.replace("આ Whispers", "ફુસફુસાટ")
-        translated_text = translated_text.replace("આ Mist", "ધુમ્મસ")
-        translated_text = translated_text.replace("આ Blood", "રક્ત")
-        translated_text = translated_text.replace("આ Moon", "ચંદ્ર")
-        
-        # Fix common English words that might remain
-        translated_text = translated_text.replace("Each", "દરેક")
-        translated_text = translated_text.replace("where", "જ્યાં")
-        translated_text = translated_text.replace("under", "નીચે")
-        translated_text = translated_text.replace("the", "આ")
-        translated_text = translated_text.replace("a", "એક")
-        translated_text = translated_text.replace("an", "એક")
-        translated_text = translated_text.replace("and", "અને")
-        translated_text = translated_text.replace("of", "નું")
-        translated_text = translated_text.replace("in", "માં")
-        translated_text = translated_text.replace("to", "ને")
-        translated_text = translated_text.replace("for", "માટે")
-        translated_text = translated_text.replace("with", "સાથે")
-        translated_text = translated_text.replace("by", "દ્વારા")
-        translated_text = translated_text.replace("is", "છે")
-        translated_text = translated_text.replace("are", "છે")
-        translated_text = translated_text.replace("was", "હતું")
-        translated_text = translated_text.replace("were", "હતા")
-        translated_text = translated_text.replace("have", "છે")
-        translated_text = translated_text.replace("has", "છે")
-        translated_text = translated_text.replace("had", "હતું")
-        translated_text = translated_text.replace("his", "તેનો")
-        translated_text = translated_text.replace("her", "તેની")
-        translated_text = translated_text.replace("their", "તેમનું")
-        translated_text = translated_text.replace("this", "આ")
-        translated_text = translated_text.replace("that", "તે")
-        translated_text = translated_text.replace("these", "આ")
-        translated_text = translated_text.replace("those", "તે")
-        
-        # Clean up any remaining English words and improve Gujarati grammar
-        translated_text = translated_text.replace("Triએકl", "પરીક્ષા")
-        translated_text = translated_text.replace("Whછેpers", "ફુસફુસાટ")
-        translated_text = translated_text.replace("every", "દરેક")
-        translated_text = translated_text.replace("sઘસાયેલા", "ઘસાયેલા")
-        translated_text = translated_text.replace("જંગલs", "જંગલ")
-        translated_text = translated_text.replace("એક ખોટું", "એક ખોટું વચન")
-        
-        # Improve sentence structure
-        translated_text = translated_text.replace("નું આ", "નો")
-        translated_text = translated_text.replace("નું તે", "નો")
-        translated_text = translated_text.replace("આ શપથ તે હતું", "શપથ લીધો હતો")
-        translated_text = translated_text.replace("શાંતિ હતું એક ખોટું", "શાંતિ એક ખોટું વચન હતું")
-        
-        return translated_text
-    else:
-        # For other languages, use simple replacement
-        translated_text = answer_text
-        for english, translated in lang_translations.items():
-            translated_text = translated_text.replace(english, translated)
-        
-        return translated_text
-
-def generate_answer(question, pdf_document, language='en'):
-    """Generate answer to question based on PDF content using dynamic analysis"""
-    try:
-        # Search through PDF chunks for relevant information
-        chunks = pdf_document.chunks.all()
-        
-        if not chunks.exists():
-            error_msg = "I cannot find any content in this PDF to answer your question."
-            return translate_answer(error_msg, language), False, 0.0
-        
-        # Analyze the question
-        question_analysis = analyze_question(question)
-        
-        print(f"Question: '{question}'")
-        print(f"Question Type: {question_analysis['primary_type']}")
-        print(f"Keywords: {question_analysis['keywords']}")
-        print(f"Entities: {question_analysis['entities']}")
-        print(f"Language: {language}")
-        
-        # Score all chunks based on question analysis
-        chunk_scores = []
-        for chunk in chunks:
-            score = score_chunk_for_question(chunk, question_analysis)
-            if score > 0:
-                chunk_scores.append((chunk, score))
-        
-        # Sort by score (highest first)
-        chunk_scores.sort(key=lambda x: x[1], reverse=True)
-        
-        print(f"Found {len(chunk_scores)} relevant chunks")
-        
-        if chunk_scores:
-            # Select best chunks based on question type
-            best_chunks = select_best_chunks(chunk_scores, question_analysis)
-            
-            # Generate answer from selected chunks
-            answer_text = generate_answer_from_chunks(best_chunks, question_analysis)
-            
-            # Translate the answer to the target language
-            translated_answer = translate_answer(answer_text, language)
-            
-            # Calculate confidence
-            max_score = max(score for _, score in best_chunks)
-            confidence = min(0.95, max_score / 50.0)  # Normalize based on max possible score
-            
-            print(f"Generated answer with confidence: {confidence}")
-            print(f"Original: {answer_text[:100]}...")
-            print(f"Translated: {translated_answer[:100]}...")
-            
-            return translated_answer, True, confidence
-        else:
-            # No relevant chunks found
-            error_msg = "I cannot find specific information about this question in the PDF. The question may not be directly addressed in the document content."
-            return translate_answer(error_msg, language), False, 0.0
-            
-    except Exception as e:
-        print(f"Error generating answer: {str(e)}")
-        error_msg = f"Error generating answer: {str(e)}"
-        return translate_answer(error_msg, language), False, 0.0
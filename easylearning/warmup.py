@@ -0,0 +1,169 @@
+"""
+Cache warm-up for the most-asked documents.
+
+``hot_documents`` ranks documents by the questions asked about them in the
+last WARM_CACHES_DAYS days. Warming a document maps its chunk store into this
+process and reads it into the OS page cache, then answers its most frequent
+questions and stores the results in the shared cache, where
+``views.answer_question`` finds them before taking an answer slot. The
+translation tables are compiled once per process.
+
+Run by ``manage.py warm_caches`` and, with WARM_CACHES_ON_STARTUP, in a
+background thread of every web worker. Only the first worker to start in a
+WARM_CACHES_ANSWER_TTL period computes answers; the others load their own
+chunk stores and translation tables.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, connections
+from django.db.models import Count
+from django.utils import timezone
+
+from .chunkstore import get_chunk_store
+from .coalescing import normalise_question, question_key, store_warmed_answer
+from .models import PDFDocument, Question
+from .search import ensure_search_index
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = 'easylearning:warmup:answers'
+# Most recent questions per document considered when picking frequent ones
+QUESTION_SAMPLE = 1000
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def hot_documents(days, limit):
+    """``[(pdf_document, questions_asked)]`` for the most-asked documents, busiest first"""
+    since = timezone.now() - timedelta(days=days)
+    counts = list(
+        Question.objects.filter(asked_at__gte=since)
+        .values('thread__pdf_document')
+        .annotate(asked=Count('pk'))
+        .order_by('-asked')[:limit]
+    )
+    documents = PDFDocument.objects.in_bulk([row['thread__pdf_document'] for row in counts])
+    return [
+        (documents[row['thread__pdf_document']], row['asked'])
+        for row in counts if row['thread__pdf_document'] in documents
+    ]
+
+
+def frequent_questions(pdf_document, days, limit):
+    """
+    The ``limit`` most asked ``(question_text, language, times)`` about ``pdf_document``.
+
+    Questions are grouped the way answers are coalesced, by language and
+    normalised text.
+    """
+    since = timezone.now() - timedelta(days=days)
+    recent = (
+        Question.objects.filter(thread__pdf_document=pdf_document, asked_at__gte=since)
+        .order_by('-asked_at')
+        .values_list('question_text', 'language')[:QUESTION_SAMPLE]
+    )
+    counts = Counter()
+    texts = {}
+    for text, language in recent:
+        key = (normalise_question(text), language)
+        counts[key] += 1
+        texts.setdefault(key, text)
+    return [(texts[key], key[1], times) for key, times in counts.most_common(limit)]
+
+
+def warm_translations():
+    """Compile the translation table of every language; returns the languages compiled"""
+    from .translation import compiled_table
+    languages = [code for code, _ in Question.LANGUAGE_CHOICES if code != 'en']
+    for language in languages:
+        compiled_table(language)
+    return languages
+
+
+def warm_document(pdf_document, days, answers, timeout):
+    """Load the document's chunk store and store the answers to its frequent questions it can answer"""
+    store = get_chunk_store(pdf_document)
+    store.touch()
+    stored = 0
+    if answers:
+        from .answering import generate_answer
+        for text, language, _ in frequent_questions(pdf_document, days, answers):
+            result = generate_answer(text, pdf_document, language)
+            if not result[1]:
+                # Not answered from the document; the request path retries it
+                continue
+            store_warmed_answer(question_key(pdf_document, text, language), result, timeout)
+            stored += 1
+    return {'chunks': len(store), 'bytes': len(store.buffer), 'answers': stored}
+
+
+def warm_caches(days=None, documents=None, answers=None, timeout=None, progress=None):
+    """
+    Warm the caches for the most-asked documents.
+
+    Arguments default to the WARM_CACHES_* settings; ``answers=0`` only loads
+    chunk stores. Returns one dict per document, with an ``error`` instead of
+    the counts for documents that could not be warmed.
+    """
+    days = _setting('WARM_CACHES_DAYS', 7) if days is None else days
+    documents = _setting('WARM_CACHES_DOCUMENTS', 10) if documents is None else documents
+    answers = _setting('WARM_CACHES_ANSWERS', 20) if answers is None else answers
+    timeout = _setting('WARM_CACHES_ANSWER_TTL', 3600) if timeout is None else timeout
+
+    warm_translations()
+    ensure_search_index()
+    results = []
+    for pdf_document, asked in hot_documents(days, documents):
+        start = time.perf_counter()
+        try:
+            stats = warm_document(pdf_document, days, answers, timeout)
+        except Exception as e:
+            logger.exception("Could not warm caches for %s", pdf_document.pk)
+            stats = {'error': str(e)}
+        stats.update(document=pdf_document, questions=asked, seconds=round(time.perf_counter() - start, 3))
+        results.append(stats)
+        if progress is not None:
+            progress(stats)
+    return results
+
+
+def is_serving():
+    """Whether this process will serve requests, rather than run a management command"""
+    if os.path.basename(sys.argv[0]) in ('manage.py', 'django-admin', '__main__.py'):
+        # runserver's autoreloader serves from a child process
+        return sys.argv[1:2] == ['runserver'] and os.environ.get('RUN_MAIN') == 'true'
+    return True
+
+
+def start_background_warmup():
+    """Warm the caches in a daemon thread once WARM_CACHES_STARTUP_DELAY seconds have passed"""
+    def run():
+        time.sleep(_setting('WARM_CACHES_STARTUP_DELAY', 5.0))
+        close_old_connections()
+        try:
+            timeout = _setting('WARM_CACHES_ANSWER_TTL', 3600)
+            try:
+                first = caches[_setting('SINGLE_FLIGHT_CACHE', 'shared')].add(LOCK_KEY, os.getpid(), timeout=timeout // 2)
+            except Exception:
+                logger.warning("Shared cache unavailable; warming without answers", exc_info=True)
+                first = False
+            results = warm_caches(answers=None if first else 0, timeout=timeout)
+            logger.info("Warmed caches for %d documents", len(results))
+        except Exception:
+            logger.exception("Cache warm-up failed")
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=run, name='warm-caches', daemon=True)
+    thread.start()
+    return thread
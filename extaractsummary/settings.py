@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,6 +51,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'easylearning.middleware.AdminAccessMiddleware',
+    'easylearning.middleware.RequestProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'extaractsummary.urls'
@@ -83,6 +86,25 @@ DATABASES = {
 }
 
 
+# Caches
+# 'default' is per process. 'shared' must be visible to every worker process
+# (rate limits, request coalescing): Redis when REDIS_URL is set, otherwise a
+# database table created with 'python manage.py createcachetable'.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    } if os.environ.get('REDIS_URL') else {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'easylearning_shared_cache',
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -135,3 +157,156 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
+
+# Logging
+# Application code logs through the 'easylearning' logger; raise the level with
+# EASYLEARNING_LOG_LEVEL=DEBUG to see per-request pipeline details.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {
+            'format': '{asctime} {levelname} {name}: {message}',
+            'style': '{',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'simple',
+        },
+    },
+    'loggers': {
+        'easylearning': {
+            'handlers': ['console'],
+            'level': os.environ.get('EASYLEARNING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# Metrics
+# Stage timings and counters are aggregated across worker processes in a
+# shared SQLite file and exposed at /metrics in Prometheus text format.
+# Off under 'manage.py test' unless METRICS_ENABLED=1, so the suite never
+# writes to the real store.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0' if sys.argv[1:2] == ['test'] else '1') == '1'
+METRICS_STORE_PATH = BASE_DIR / 'metrics.sqlite3'
+METRICS_FLUSH_INTERVAL = 5.0  # seconds between flushes of in-process deltas
+METRICS_AUTH_TOKEN = os.environ.get('METRICS_AUTH_TOKEN')  # bearer token for scrapers; without one /metrics is only served with DEBUG
+
+# Request profiling
+# Superusers can profile a single request by sending 'X-Profile: 1' or adding
+# '?profile=1'. Results are browsable under Request profiles in the admin.
+REQUEST_PROFILING_ENABLED = True
+REQUEST_PROFILING_SUMMARY_LINES = 40  # functions listed in the ranked text summary
+
+# PDF file serving
+# Set PDF_SENDFILE_BACKEND to 'nginx' (X-Accel-Redirect) or 'xsendfile'
+# (X-Sendfile) to let the front proxy stream uploaded PDFs. For nginx, map
+# PDF_SENDFILE_URL_PREFIX to MEDIA_ROOT in an 'internal' location block.
+PDF_SENDFILE_BACKEND = os.environ.get('PDF_SENDFILE_BACKEND') or None
+PDF_SENDFILE_URL_PREFIX = '/protected-media/'
+PDF_DOWNLOAD_MAX_AGE = 86400  # seconds browsers may reuse a downloaded PDF
+PDF_PAGES_MAX_COUNT = 50  # pages per request to pdf/<id>/pages/
+PDF_PAGES_STREAM_THRESHOLD = 10  # longer page ranges are streamed
+
+# Chunk stores
+# Each document's chunks are also kept in a memory-mapped '.chunks' file next
+# to its PDF; this many open stores are cached per worker process.
+CHUNK_STORE_CACHE_SIZE = 32
+
+# Thread archival
+# 'manage.py archive_threads' moves the questions and answers of threads idle
+# for this many days into compressed archives; opening a thread restores it.
+THREAD_ARCHIVE_AFTER_DAYS = 90
+
+# Maintenance jobs
+# Admin actions on documents queue background jobs. They run in a small
+# thread pool inside the web process unless MAINTENANCE_JOBS_IN_PROCESS is
+# off, in which case 'manage.py run_maintenance_jobs' must process them.
+MAINTENANCE_JOBS_IN_PROCESS = True
+MAINTENANCE_JOB_WORKERS = 1  # worker threads per process
+MAINTENANCE_JOB_MAX_RUNNING = 1  # jobs running at once across all processes
+MAINTENANCE_JOB_TIMEOUT = 3600  # seconds before a running job is failed as abandoned
+
+# Question admission control
+# Limits on answer generation, shared by all workers through the 'shared'
+# cache. Rate-limited callers get 429, an overloaded server 503, both with
+# Retry-After.
+QA_ADMISSION_ENABLED = True
+QA_USER_RATE = 0.5  # questions per second per user (or client address)
+QA_USER_BURST = 5
+QA_GLOBAL_RATE = 10.0  # questions per second across all users
+QA_GLOBAL_BURST = 20
+QA_MAX_CONCURRENT = 4  # answers computed at once
+QA_MAX_WAITING = 16  # requests allowed to queue for a slot
+QA_QUEUE_TIMEOUT = 5.0  # seconds a queued request waits before a 503
+QA_SLOT_TIMEOUT = 120  # seconds before a slot held by a dead worker expires
+QA_ADMISSION_LOCK_WAIT = None  # seconds to wait for a rate bucket's lock; None sizes it to the cache backend
+
+# Question coalescing
+# Identical questions (same document, chunk version, language and normalised
+# text) asked at the same time share one answer computation.
+SINGLE_FLIGHT_ENABLED = True
+SINGLE_FLIGHT_WAIT = 30.0  # seconds a duplicate waits before computing itself
+SINGLE_FLIGHT_RESULT_TTL = 10  # seconds a finished answer is shared between processes
+
+# Upload preflight
+# Uploads are checked for a PDF header, trailer, cross-reference table and
+# encryption by reading only these many bytes at the start, the end and the
+# xref offset, before anything is saved. The page count is checked when the
+# page tree root is in those windows. python-magic is used when installed.
+PDF_PREFLIGHT_WINDOW = 8192
+PDF_MAX_PAGES = 2000
+
+# PDF extraction
+# PyPDF2 runs in a child process under these limits. Pages that exceed them
+# are skipped and listed in the document's extraction report.
+PDF_EXTRACTION_SANDBOX = True  # off: extract in-process, without limits
+PDF_EXTRACTION_PAGE_TIMEOUT = 10.0  # seconds per page
+PDF_EXTRACTION_DOCUMENT_TIMEOUT = 120.0  # seconds per document
+PDF_EXTRACTION_MEMORY_LIMIT_MB = 1024  # address space of the extraction process
+
+# Retrieval engines
+# Extra engines for 'manage.py evaluate_retrieval', as dotted paths to
+# easylearning.retrieval.RetrievalEngine subclasses. 'rules' (production) and
+# 'fts' (SQLite full-text BM25) are always available.
+RETRIEVAL_ENGINES = []
+
+# Cold start
+# 'manage.py check --deploy' fails when importing the URLconf in a fresh
+# worker (after django.setup()) takes longer than this; None disables it.
+STARTUP_URLCONF_BUDGET_MS = 150
+
+# Cache warm-up
+# 'manage.py warm_caches' loads the chunk stores of the documents with the
+# most questions in the last WARM_CACHES_DAYS days and stores answers to their
+# most frequent questions in the 'shared' cache. With WARM_CACHES_ON_STARTUP
+# every web worker also does this in the background shortly after it starts.
+WARM_CACHES_ON_STARTUP = False
+WARM_CACHES_STARTUP_DELAY = 5.0  # seconds after startup
+WARM_CACHES_DAYS = 7
+WARM_CACHES_DOCUMENTS = 10  # keep at or below CHUNK_STORE_CACHE_SIZE
+WARM_CACHES_ANSWERS = 20  # frequent questions answered per document
+WARM_CACHES_ANSWER_TTL = 3600  # seconds a stored answer is served
+
+# Summaries
+# Each section (a chapter, or SUMMARY_SECTION_PAGES pages when the document
+# has no chapter headings) is condensed to its most central sentences by
+# TF-IDF, and those are condensed again into the document summary. Section
+# summaries answer summary questions directly. With SUMMARY_WORKERS the
+# sections of large documents are summarised on a pool of that many processes.
+SUMMARY_SENTENCES = 5
+SUMMARY_SECTION_SENTENCES = 3
+SUMMARY_SECTION_PAGES = 10
+SUMMARY_WORKERS = 0
+
+# Canonical answers
+# Answers to the commonest questions (overview, main characters, setting and
+# each chapter) are computed at ingestion in every language and stored for
+# the document's chunk version; matching questions are answered with a single
+# indexed lookup. Documents ingested earlier get them from a re-extract,
+# re-chunk or re-summarise job.
+CANONICAL_ANSWERS = True
+CANONICAL_ANSWERS_MAX_CHAPTERS = 100